@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""Benchmarks the whole sampling loop on an emulated MMC5983MA: driver, scheduler, detector and publishing.
+
+The sensor, the scheduler and the publishers run on a simulated clock, so hours of sampling take seconds and the wall
+time is the cost of the python code alone. Run from the retrometer directory:
+    python -m benchmarks.benchmark_end_to_end [--output end_to_end.json]
+"""
+import json
+import logging
+import sys
+import time
+from types import SimpleNamespace
+import numpy as np
+import measure_gas
+from src.fake_smbus import FakeMMC5983MABus, SimulatedClock, create_sine_waveform
+from src.magnetometer import MMC5983MA
+from src.mqtt_publisher import CoalescingPublisher, MQTT_ERR_SUCCESS
+from src.retro_meter import RetroMeter
+from src.sampling_scheduler import SamplingScheduler
+from src.volume_reporter import VolumeReporter
+
+MEASUREMENT_FREQUENCIES = [10, 20, 50, 100]
+ERROR_RATES = [0.0, 0.01]
+TICK_PERIOD = 2.0
+# Duration of one i2c transaction at 400 kHz
+I2C_LATENCY = 2e-4
+
+
+class CountingClient:
+    def __init__(self):
+        self.publish_count = 0
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.publish_count += 1
+        return SimpleNamespace(rc=MQTT_ERR_SUCCESS, mid=self.publish_count)
+
+
+def run_configuration(measurement_frequency, error_rate, duration):
+    """Runs the loop for a simulated duration and returns the speed, the cost per sample and the count error.
+    """
+    clock = SimulatedClock()
+    bus = FakeMMC5983MABus(create_sine_waveform(300.0, TICK_PERIOD, noise_std=2.0, seed=0), latency=I2C_LATENCY,
+                           seed=1, clock=clock.monotonic, sleep=clock.sleep)
+    sample_time = 1.0 / measurement_frequency
+    meter = RetroMeter(MMC5983MA(bus, measurement_frequency=measurement_frequency), "x", int(3.0 / sample_time),
+                       20.0, 8000, 3.0, calibration_mode="adaptive")
+    # The setup of the sensor is not retried, so the bus is only disturbed afterwards
+    bus.set_error_rate(error_rate)
+    setup_transactions = bus.get_statistics()["transactions"]
+    scheduler = SamplingScheduler(sample_time, clock=clock.monotonic, sleep=clock.sleep)
+    client = CountingClient()
+    reporter = VolumeReporter([CoalescingPublisher(client, "meter/gas_volume", clock=clock.monotonic)], [0.01],
+                              clock=clock.monotonic)
+
+    # is_running() is called once per loop iteration, so the wall time between two calls is the cost of one sample
+    iteration_times = []
+    start_time = clock.monotonic()
+
+    def is_running():
+        iteration_times.append(time.perf_counter())
+        return clock.monotonic() - start_time < duration
+
+    wall_start = time.perf_counter()
+    measure_gas.run_loop(meter, scheduler, reporter, is_running=is_running)
+    wall_time = time.perf_counter() - wall_start
+
+    sample_count = scheduler.get_statistics()["samples"]
+    latencies_us = np.diff(iteration_times) * 1e6
+    expected_count = int(duration / TICK_PERIOD)
+    return {
+        "samples": sample_count,
+        "samples_per_s": sample_count / wall_time,
+        "speedup": duration / wall_time,
+        "latency_p50_us": float(np.percentile(latencies_us, 50)),
+        "latency_p99_us": float(np.percentile(latencies_us, 99)),
+        "latency_max_us": float(np.max(latencies_us)),
+        "count_error": meter.get_readings()[0]["count"] - expected_count,
+        "transactions_per_sample": (bus.get_statistics()["transactions"] - setup_transactions) / sample_count,
+        "i2c_errors": bus.get_statistics()["errors"],
+        "publishes": client.publish_count,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the whole sampling loop on an emulated magnetometer with a simulated clock.')
+    parser.add_argument('--output', help='json file to save the results to')
+    parser.add_argument('--duration', type=float, default=3600.0, help='simulated time per configuration in seconds')
+    args = parser.parse_args()
+    # The first failed transaction of each configuration would be logged
+    logging.basicConfig(level=logging.ERROR)
+
+    results = {}
+    for measurement_frequency in MEASUREMENT_FREQUENCIES:
+        for error_rate in ERROR_RATES:
+            key = "{}hz_errors{}".format(measurement_frequency, error_rate)
+            results[key] = run_configuration(measurement_frequency, error_rate, args.duration)
+            print("{}: {}".format(key, json.dumps(results[key])))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+                       "results": results}, file, indent=2)
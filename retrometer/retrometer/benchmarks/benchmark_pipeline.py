@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+"""Benchmarks the per sample cost of the tick detection pipeline.
+
+Run from the retrometer directory:
+    python -m benchmarks.benchmark_pipeline --output results.json [--baseline previous.json]
+"""
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from src.metrics import MetricsRegistry
+from src.retro_meter import RetroMeter
+from src.tick_detector import MinMaxCalibrator, ScalarPeriodCounter
+from src.tick_detector_array import ScalarPeriodCounterArray
+from tests.test_tick_detector import TestScalarPeriodCounter
+
+SAMPLE_TIME = 0.05
+MIN_AMPLITUDE = 20
+MAX_AMPLITUDE = 8000
+MIN_STD = 20
+MAX_PERIOD_LENGTHS = [20, 100, 400]
+METER_COUNTS = [1, 4, 16]
+# Metrics where a higher value is worse, used to flag regressions against a baseline
+LATENCY_METRICS = ["latency_p50_us", "latency_p90_us",
+                   "latency_p99_us", "peak_memory_kib"]
+
+
+class MockMagnetometer:
+    def __init__(self, values):
+        """Magnetometer that returns the given values on the x axis, one per read.
+        """
+        self._values = values
+        self._index = 0
+
+    def is_new_meas_available(self):
+        return True
+
+    def read_magnetometer(self):
+        value = self._values[self._index % len(self._values)]
+        self._index += 1
+        return (value, 0.0, 0.0)
+
+
+def generate_signal():
+    """Returns the sine, noise and outlier test signal of the tick detector tests.
+    """
+    np.random.seed(0)
+    _, values = TestScalarPeriodCounter().helper_generate_sines_with_noise_and_outliers()
+    return [float(value) for value in values]
+
+
+def measure_latencies(step, values):
+    """Calls step(value) for every value and returns the latency of each call in seconds.
+    """
+    latencies = np.empty(len(values))
+    perf_counter = time.perf_counter
+    gc.collect()
+    for index, value in enumerate(values):
+        start = perf_counter()
+        step(value)
+        latencies[index] = perf_counter() - start
+    return latencies
+
+
+def measure_peak_memory(create_step, values):
+    """Returns the peak traced memory in KiB of creating a step function and calling it for every value.
+    """
+    gc.collect()
+    tracemalloc.start()
+    step = create_step()
+    for value in values:
+        step(value)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024.0
+
+
+def summarize(latencies, peak_memory_kib):
+    return {
+        "samples": len(latencies),
+        "latency_p50_us": float(np.percentile(latencies, 50) * 1e6),
+        "latency_p90_us": float(np.percentile(latencies, 90) * 1e6),
+        "latency_p99_us": float(np.percentile(latencies, 99) * 1e6),
+        "latency_max_us": float(np.max(latencies) * 1e6),
+        "throughput_per_s": float(len(latencies) / np.sum(latencies)),
+        "over_budget_samples": int(np.sum(latencies > SAMPLE_TIME)),
+        "peak_memory_kib": float(peak_memory_kib),
+    }
+
+
+def benchmark_calibrator(values, max_period_length):
+    def create_step():
+        return MinMaxCalibrator(10*max_period_length, MIN_AMPLITUDE, MAX_AMPLITUDE, MIN_STD, 24*3600.0).input
+    return summarize(measure_latencies(create_step(), values), measure_peak_memory(create_step, values))
+
+
+def benchmark_counter(values, max_period_length):
+    def create_step():
+        return ScalarPeriodCounter(max_period_length, MIN_AMPLITUDE, MAX_AMPLITUDE, MIN_STD).record_scalar
+    return summarize(measure_latencies(create_step(), values), measure_peak_memory(create_step, values))
+
+
+def benchmark_retro_meter(values, max_period_length, metrics=False):
+    def create_step():
+        meter = RetroMeter(MockMagnetometer(values), "x", max_period_length, MIN_AMPLITUDE, MAX_AMPLITUDE,
+                           MIN_STD, metrics=MetricsRegistry() if metrics else None)
+        return lambda value: meter.update_and_get_meter_ticks()
+    return summarize(measure_latencies(create_step(), values), measure_peak_memory(create_step, values))
+
+
+def benchmark_retro_meter_with_metrics(values, max_period_length):
+    return benchmark_retro_meter(values, max_period_length, metrics=True)
+
+
+def benchmark_counter_batch(values, max_period_length):
+    counter = ScalarPeriodCounter(
+        max_period_length, MIN_AMPLITUDE, MAX_AMPLITUDE, MIN_STD)
+    gc.collect()
+    start = time.perf_counter()
+    counter.record_batch(np.asarray(values))
+    duration = time.perf_counter() - start
+    return {"samples": len(values), "throughput_per_s": len(values) / duration}
+
+
+def create_meter_signals(values, meter_count):
+    # Every meter gets the signal with a different phase
+    return np.stack([np.roll(values, 7*meter) for meter in range(meter_count)], axis=1)
+
+
+def create_counter_array_benchmark(meter_count):
+    def benchmark_counter_array(values, max_period_length):
+        signals = create_meter_signals(values, meter_count)
+
+        def create_step():
+            return ScalarPeriodCounterArray(meter_count, max_period_length, MIN_AMPLITUDE, MAX_AMPLITUDE,
+                                            MIN_STD).record_scalars
+        return summarize(measure_latencies(create_step(), signals), measure_peak_memory(create_step, signals))
+    return benchmark_counter_array
+
+
+def create_counters_benchmark(meter_count):
+    def benchmark_counters(values, max_period_length):
+        # The same meters with one scalar counter each, the cost that the array counter is compared with
+        signals = create_meter_signals(values, meter_count).tolist()
+
+        def create_step():
+            counters = [ScalarPeriodCounter(max_period_length, MIN_AMPLITUDE, MAX_AMPLITUDE, MIN_STD)
+                        for meter in range(meter_count)]
+
+            def step(scalars):
+                for counter, scalar in zip(counters, scalars):
+                    counter.record_scalar(scalar)
+            return step
+        return summarize(measure_latencies(create_step(), signals), measure_peak_memory(create_step, signals))
+    return benchmark_counters
+
+
+BENCHMARKS = {
+    "MinMaxCalibrator.input": benchmark_calibrator,
+    "ScalarPeriodCounter.record_scalar": benchmark_counter,
+    "RetroMeter.update_and_get_meter_ticks": benchmark_retro_meter,
+    "RetroMeter.update_and_get_meter_ticks[metrics]": benchmark_retro_meter_with_metrics,
+    "ScalarPeriodCounter.record_batch": benchmark_counter_batch,
+}
+# The cost per sample of several meters should grow sub-linearly with the number of meters, unlike the cost of one
+# scalar counter per meter
+for meter_count in METER_COUNTS:
+    BENCHMARKS["ScalarPeriodCounterArray.record_scalars[meters={}]".format(
+        meter_count)] = create_counter_array_benchmark(meter_count)
+    BENCHMARKS["ScalarPeriodCounter.record_scalar[meters={}]".format(
+        meter_count)] = create_counters_benchmark(meter_count)
+
+
+def run_benchmarks(values, max_period_lengths, benchmark_names):
+    results = {}
+    for name in benchmark_names:
+        for max_period_length in max_period_lengths:
+            key = "{}[max_period_length={}]".format(name, max_period_length)
+            results[key] = BENCHMARKS[name](values, max_period_length)
+            print("{}: {}".format(key, json.dumps(results[key])))
+    return results
+
+
+def find_regressions(results, baseline, tolerance):
+    """Returns a list of descriptions of all metrics that got worse than the baseline by more than the tolerance ratio.
+    """
+    regressions = []
+    for key, result in results.items():
+        baseline_result = baseline.get("results", {}).get(key)
+        if baseline_result is None:
+            continue
+        for metric in LATENCY_METRICS:
+            if metric in result and metric in baseline_result and \
+                    result[metric] > baseline_result[metric] * (1.0 + tolerance):
+                regressions.append("{} {}: {:.1f} -> {:.1f}".format(
+                    key, metric, baseline_result[metric], result[metric]))
+        if "throughput_per_s" in baseline_result and \
+                result["throughput_per_s"] < baseline_result["throughput_per_s"] / (1.0 + tolerance):
+            regressions.append("{} throughput_per_s: {:.1f} -> {:.1f}".format(
+                key, baseline_result["throughput_per_s"], result["throughput_per_s"]))
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the tick detection pipeline and optionally compares the results with a baseline.')
+    parser.add_argument('--output', help='json file to save the results to')
+    parser.add_argument(
+        '--baseline', help='json results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative slowdown that is flagged as a regression')
+    parser.add_argument('--maxperiodlengths', type=int, nargs='+', default=MAX_PERIOD_LENGTHS,
+                        help='max period lengths (window sizes) to benchmark')
+    parser.add_argument('--benchmarks', nargs='+', choices=sorted(BENCHMARKS), default=list(BENCHMARKS),
+                        help='benchmarks to run')
+    args = parser.parse_args()
+
+    results = run_benchmarks(generate_signal(), args.maxperiodlengths, args.benchmarks)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "machine": platform.machine(),
+        "numpy": np.__version__,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = find_regressions(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print("Regression: " + regression)
+        sys.exit(1 if regressions else 0)
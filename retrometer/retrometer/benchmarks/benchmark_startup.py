@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""Benchmarks the startup time and resident memory of the tick detector with each detector backend.
+
+Every measurement runs in a fresh interpreter, so that the import costs are included. Run from the retrometer directory:
+    python -m benchmarks.benchmark_startup [--output startup.json]
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+
+BACKENDS = ["python", "numpy"]
+
+# Imports the detector, creates a counter and records a few seconds of samples like the add-on after its start
+CHILD_CODE = """
+import json, math, resource, sys, time
+start = time.perf_counter()
+from src.tick_detector import ScalarPeriodCounter
+counter = ScalarPeriodCounter(20, 20, 8000, 50, backend=sys.argv[1])
+for index in range(400):
+    counter.record_scalar(300.0 * math.sin(2.0 * math.pi * index / 20.0))
+print(json.dumps({"startup_s": time.perf_counter() - start,
+                  "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  "numpy_imported": "numpy" in sys.modules}))
+"""
+
+
+def measure_backend(backend, repetitions):
+    """Returns the medians of the detector startup time, the process startup time and the peak RSS of a backend.
+    """
+    measurements = []
+    process_times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", CHILD_CODE, backend], check=True, capture_output=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+        process_times.append(time.perf_counter() - start)
+        measurements.append(json.loads(output))
+    return {
+        "detector_startup_ms": float(np.median([measurement["startup_s"] for measurement in measurements]) * 1e3),
+        "process_time_ms": float(np.median(process_times) * 1e3),
+        "max_rss_kib": float(np.median([measurement["max_rss_kib"] for measurement in measurements])),
+        "numpy_imported": measurements[0]["numpy_imported"],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the startup time and resident memory of each tick detector backend.')
+    parser.add_argument('--output', help='json file to save the results to')
+    parser.add_argument('--repetitions', type=int, default=5,
+                        help='number of fresh interpreters per backend, the median is reported')
+    args = parser.parse_args()
+
+    results = {}
+    for backend in BACKENDS:
+        results[backend] = measure_backend(backend, args.repetitions)
+        print("{}: {}".format(backend, json.dumps(results[backend])))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+                       "results": results}, file, indent=2)
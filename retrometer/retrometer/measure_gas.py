@@ -1,23 +1,237 @@
 #!/usr/bin/env python
-from smbus import SMBus
 import time
+import asyncio
+import functools
+import logging
+import signal
+import sys
 from src.magnetometer import MMC5983MA
 from src.retro_meter import RetroMeter
-import paho.mqtt.client as mqtt
+from src.sample_recorder import SampleRecorder
+from src.sampling_scheduler import SamplingScheduler
+from src.telemetry import Telemetry
+from src.mqtt_publisher import CoalescingPublisher
+from src.checkpoint import Checkpointer
+from src.i2c_multiplexer import TCA9548A
+from src.async_runtime import AsyncRuntime, AsyncioMqttLoop
+from src.split_runtime import SplitProcessRuntime
+from src.adaptive_rate import AdaptiveRateController
+from src.metrics import MetricsRegistry, MetricsServer, InstrumentedBus, DiagnosticsPublisher
+from src.volume_reporter import VolumeReporter
+from src.tick_store import TickStore, TickStoreServer
 import json
 
+logger = logging.getLogger("retrometer")
 
 # The callback for when the client receives a CONNACK response from the server.
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
-        print("Successfully connected to mqtt broker")
+        logger.info("Successfully connected to mqtt broker")
     else:
-        print("Connection to mqtt broker failed with result code "+str(rc))
+        logger.error("Connection to mqtt broker failed with result code %s", rc)
 
 
 # The callback for when a PUBLISH message is received from the server.
 def on_message(client, userdata, msg):
-    print(msg.topic+" "+str(msg.payload))
+    logger.info("%s %s", msg.topic, msg.payload)
+
+
+def report_scheduler_statistics(statistics, last_statistics):
+    # Only report when samples were late or missed or i2c transactions failed since the last report
+    if statistics["overruns"] != last_statistics["overruns"] or \
+            statistics["missed_samples"] != last_statistics["missed_samples"] or \
+            statistics.get("i2c_errors") != last_statistics.get("i2c_errors"):
+        logger.warning("Sampling statistics: %s", json.dumps(statistics))
+
+
+def register_scheduler_metrics(metrics, get_statistics):
+    # The scheduler counts anyway, so its statistics are only copied to the metrics when they are scraped
+    gauges = {name: metrics.counter("retrometer_{}_total".format(name), help_text) for name, help_text in [
+        ("samples", "Processed samples"), ("overruns", "Deadlines that were missed by the previous work"),
+        ("missed_samples", "Samples that were skipped or where the sensor data was not ready in time"),
+        ("data_not_ready", "Deadlines at which the sensor data was not ready yet")]}
+    max_lateness = metrics.gauge("retrometer_max_lateness_seconds", "Maximum lateness after a deadline")
+
+    def collect():
+        statistics = get_statistics()
+        for name, gauge in gauges.items():
+            gauge.set(statistics[name])
+        max_lateness.set(statistics["max_lateness"])
+    metrics.add_collector(collect)
+
+
+def register_split_runtime_metrics(metrics, get_statistics):
+    # The overflow and lag counters of the ring buffer between the acquisition and the processing process
+    overflows = metrics.counter("retrometer_ring_buffer_overflows_total",
+                                "Samples dropped because the ring buffer was full")
+    pending_samples = metrics.gauge("retrometer_ring_buffer_pending_samples", "Samples waiting in the ring buffer")
+    max_lag = metrics.gauge("retrometer_ring_buffer_max_lag_seconds",
+                            "Maximum time between the acquisition and the processing of a sample")
+    # The bus is only opened in the acquisition process, which counts the failed transactions instead of the bus
+    i2c_errors = metrics.counter("retrometer_i2c_errors_total", "Failed i2c transactions")
+
+    def collect():
+        statistics = get_statistics()
+        overflows.set(statistics["overflows"])
+        pending_samples.set(statistics["pending_samples"])
+        max_lag.set(statistics["max_lag"])
+        i2c_errors.set(statistics["i2c_errors"])
+    metrics.add_collector(collect)
+
+
+def check_meter_sensors(meter_configs):
+    """Raise a ValueError if two meter configs address the same sensor. All MMC5983MA have the same i2c address, so
+    there can be one sensor directly on a bus, or one multiplexer with one sensor per channel.
+    """
+    direct_meters = {}
+    multiplexed_meters = {}
+    for meter_config in meter_configs:
+        name = meter_config.get("name")
+        bus_number = meter_config.get("bus", 1)
+        if meter_config.get("mux_channel") is None:
+            direct_meters.setdefault(bus_number, []).append(name)
+            continue
+        mux_address = meter_config.get("mux_address")
+        sensor = (bus_number, TCA9548A.i2caddress if mux_address is None else mux_address,
+                  meter_config["mux_channel"])
+        for other_name, other_sensor in multiplexed_meters.get(bus_number, []):
+            if other_sensor == sensor:
+                raise ValueError("Meters {} and {} both use channel {} of the multiplexer at address {:#04x} on i2c bus "
+                                 "{}".format(other_name, name, sensor[2], sensor[1], bus_number))
+            if other_sensor[1] != sensor[1]:
+                raise ValueError("Meters {} and {} use multiplexers at different addresses on i2c bus {}, only one "
+                                 "multiplexer per bus is supported".format(other_name, name, bus_number))
+        multiplexed_meters.setdefault(bus_number, []).append((name, sensor))
+    for bus_number, names in direct_meters.items():
+        if len(names) > 1:
+            raise ValueError("Meters {} are all connected directly to i2c bus {}, sensors on one bus need a multiplexer "
+                             "channel each".format(", ".join(str(name) for name in names), bus_number))
+        if bus_number in multiplexed_meters:
+            raise ValueError("Meter {} is connected directly to i2c bus {}, where meter {} has a sensor at the same "
+                             "address behind a multiplexer, give it a multiplexer channel too".format(
+                                 names[0], bus_number, multiplexed_meters[bus_number][0][0]))
+
+
+def create_magnetometers(meter_configs, metrics=None, **sensor_settings):
+    """Create one magnetometer per meter config. Meters on the same bus number share one bus object and, if they have a
+    multiplexer channel, one multiplexer. The buses are instrumented if a metrics registry is given. The sensor settings,
+    e.g. the measurement frequency, are passed to every magnetometer. Raises a ValueError if two meter configs address
+    the same sensor.
+    """
+    check_meter_sensors(meter_configs)
+    # Only imported here, so that the loop can run on emulated sensors without the smbus package
+    from smbus import SMBus
+    buses = {}
+    multiplexers = {}
+    magnetometers = []
+    for meter_config in meter_configs:
+        bus_number = meter_config.get("bus", 1)
+        if bus_number not in buses:
+            buses[bus_number] = SMBus(bus_number)
+            if metrics is not None:
+                buses[bus_number] = InstrumentedBus(buses[bus_number], metrics, str(bus_number))
+        bus = buses[bus_number]
+        if meter_config.get("mux_channel") is not None:
+            if bus_number not in multiplexers:
+                multiplexers[bus_number] = TCA9548A(
+                    bus, meter_config.get("mux_address"))
+            bus = multiplexers[bus_number].get_channel_bus(
+                meter_config["mux_channel"])
+        magnetometers.append(MMC5983MA(bus, **sensor_settings))
+    return magnetometers
+
+
+def run_loop(meter, scheduler, reporter, checkpointer=None, diagnostics_publisher=None, report_interval=60.0,
+             is_running=lambda: True):
+    """Sample, count and publish in one blocking loop until is_running() returns false or the loop is interrupted, e.g.
+    by sys.exit() in a signal handler. A sample whose i2c transaction failed is skipped and counted. Saves the checkpoint
+    and flushes the publishers before returning.
+
+    Args:
+        meter (RetroMeter): Meter to sample, a MultiRetroMeter for several meters.
+        scheduler (SamplingScheduler): Scheduler that paces the sampling.
+        reporter (VolumeReporter): Reporter that publishes the readings of all meters.
+        checkpointer (Checkpointer): Optional checkpointer that stores the detector state.
+        diagnostics_publisher (DiagnosticsPublisher): Optional publisher of the metrics.
+        report_interval (float): Minimum time between two reports of timing problems and i2c errors in seconds.
+        is_running (callable): Returns false to stop the loop, checked once per sample.
+    """
+    # The polls are chosen once, so that disabled diagnostics cost nothing per sample
+    poll = reporter.poll
+    if diagnostics_publisher is not None:
+        def poll():
+            reporter.poll()
+            diagnostics_publisher.poll()
+
+    # Report timing problems and i2c errors at most once per report interval
+    last_report_time = time.monotonic()
+    i2c_error_count = 0
+    last_statistics = dict(scheduler.get_statistics(), i2c_errors=i2c_error_count)
+
+    try:
+        while is_running():
+            try:
+                # Wait for the next measurement
+                timestamp = scheduler.wait_for_next_sample(meter.is_count_updated)
+                if timestamp is not None:
+                    meter.update_and_get_meter_ticks(timestamp)
+            except OSError as error:
+                # A disturbed i2c transaction only loses this sample, further errors are counted in the statistics
+                if i2c_error_count == 0:
+                    logger.warning("i2c transaction failed, skipping the sample: %s", error)
+                i2c_error_count += 1
+                timestamp = None
+            if timestamp is not None:
+                # if a count changed or the fractional volume is due, publish an mqtt message
+                readings = meter.get_readings()
+                reporter.update(readings)
+
+                # Store the detector state from time to time, more often while the counts change
+                if checkpointer is not None and checkpointer.is_due(readings):
+                    checkpointer.save(meter.get_state(timestamp), readings)
+
+            # Publish coalesced updates and retry unacknowledged ones
+            poll()
+
+            if time.monotonic() - last_report_time > report_interval:
+                statistics = dict(scheduler.get_statistics(), i2c_errors=i2c_error_count)
+                report_scheduler_statistics(statistics, last_statistics)
+                last_statistics = statistics
+                last_report_time = time.monotonic()
+    finally:
+        if checkpointer is not None:
+            checkpointer.save(meter.get_state())
+        reporter.flush()
+
+
+def create_meter(args, meter_configs, magnetometers, max_period_length, min_amplitude, max_amplitude, min_std,
+                 telemetries, sample_recorders, tick_stores, metrics=None, rate_controller=None):
+    """Create a RetroMeter for a single meter config and a MultiRetroMeter for several. The detector options are taken
+    from the parsed args, the lists have one entry per meter config.
+    """
+    if len(meter_configs) > 1:
+        # The array backed detector of several meters needs numpy, only import it if it is used
+        from src.multi_retro_meter import MultiRetroMeter
+        return MultiRetroMeter(magnetometers, [meter_config["axis"] for meter_config in meter_configs],
+                               max_period_length, min_amplitude, max_amplitude, min_std,
+                               telemetries=telemetries, sample_recorders=sample_recorders, metrics=metrics,
+                               names=[meter_config["name"] for meter_config in meter_configs], tick_stores=tick_stores,
+                               activation_threshold_ratio=args.activationratio,
+                               deactivation_threshold_ratio=args.deactivationratio,
+                               calibration_mode=args.calibrationmode)
+    return RetroMeter(magnetometers[0], meter_configs[0]["axis"], max_period_length, min_amplitude, max_amplitude,
+                      min_std, telemetry=telemetries[0], sample_recorder=sample_recorders[0],
+                      rate_controller=rate_controller, backend=args.detectorbackend or "python", metrics=metrics,
+                      name=meter_configs[0]["name"], tick_store=tick_stores[0],
+                      activation_threshold_ratio=args.activationratio,
+                      deactivation_threshold_ratio=args.deactivationratio,
+                      calibration_mode=args.calibrationmode)
+
+
+def create_magnetometer(meter_config, **sensor_settings):
+    """Create the magnetometer of one meter, e.g. in the acquisition process of the split process runtime.
+    """
+    return create_magnetometers([meter_config], **sensor_settings)[0]
 
 
 if __name__ == "__main__":
@@ -31,42 +245,332 @@ if __name__ == "__main__":
         '--mqtttopic', help='mqtt topic name to publish measurements to')
     parser.add_argument(
         '--m3pertick', help='The volume of gas per meter tick', type=float)
-    parser.add_argument('-v', action='store_true')
+    parser.add_argument(
+        '--meters', help='Json list of meters to drive from one process instead of the single meter given by --mqtttopic '
+        'and --m3pertick. Each meter has a name, an axis, m3pertick, mqtttopic and optionally a bus number, '
+        'mux_channel and mux_address of a TCA9548A i2c multiplexer')
+    parser.add_argument(
+        '--publishinterval', help='Minimum time between two mqtt publishes in seconds', type=float, default=1.0)
+    parser.add_argument(
+        '--fractionalinterval', help='Minimum time between two publishes of the fractional volume and the flow rate in '
+        'seconds while the count does not change', type=float, default=10.0)
+    parser.add_argument(
+        '--publishqueue', help='File to buffer unacknowledged mqtt updates in across broker outages and restarts')
+    parser.add_argument(
+        '--checkpointpath', help='File to periodically store the count and calibration in to resume after restarts')
+    parser.add_argument(
+        '--checkpointinterval', help='Minimum time between two checkpoint writes in seconds', type=float, default=300.0)
+    parser.add_argument(
+        '--checkpointcountinterval', help='Minimum time between two checkpoint writes in seconds while the count changes. '
+        'An idle meter causes no writes', type=float, default=60.0)
+    parser.add_argument(
+        '--recorddir', help='Directory to record the raw magnetometer samples to. Nothing is recorded if not given')
+    parser.add_argument(
+        '--recordfilesize', help='Maximum size of one recording file in bytes', type=int, default=64*1024*1024)
+    parser.add_argument(
+        '--recordfilecount', help='Maximum number of recording files to keep', type=int, default=16)
+    parser.add_argument(
+        '--tickstore', help='File to log the time of every tick in for consumption queries. Nothing is logged if not given')
+    parser.add_argument(
+        '--tickstoreport', help='Serve consumption queries of the tick log as json on this port', type=int)
+    parser.add_argument(
+        '--tickstorehost', help='Address to serve the consumption queries on', default='127.0.0.1')
+    parser.add_argument(
+        '--telemetrysummaryinterval', help='Seconds between two telemetry summary log messages', type=float, default=600.0)
+    parser.add_argument(
+        '--telemetrybufferlength', help='Number of recent samples that are kept in memory for dumping them with SIGUSR1',
+        type=int, default=1200)
+    parser.add_argument(
+        '--measurementfrequency', help='Continuous measurement frequency of the magnetometer in Hz. One sample is read '
+        'per measurement', type=int, choices=[10, 20, 50, 100, 200, 1000], default=20)
+    parser.add_argument(
+        '--bandwidth', help='Magnetometer bandwidth in Hz. Higher bandwidths measure faster with more noise and are '
+        'needed for 200 Hz and above', type=int, choices=sorted(MMC5983MA.bandwidths), default=100)
+    parser.add_argument(
+        '--setresetinterval', help='Number of measurements between two automatic set/reset operations of the '
+        'magnetometer, 0 disables them', type=int, choices=[0, 1] + sorted(MMC5983MA.setResetIntervals), default=1)
+    parser.add_argument(
+        '--maxperiodtime', help='Shortest time of one tick at the maximum flow in seconds', type=float, default=1.0)
+    parser.add_argument(
+        '--minamplitude', help='Minimum amplitude of the magnetic signal for the calibration', type=float, default=20.0)
+    parser.add_argument(
+        '--minstd', help='Minimum standard deviation of the magnetic signal for the calibration', type=float,
+        default=50.0)
+    parser.add_argument(
+        '--activationratio', help='Part of the calibrated range at which a tick is counted', type=float, default=0.8)
+    parser.add_argument(
+        '--deactivationratio', help='Part of the calibrated range below which the next tick can start', type=float,
+        default=0.7)
+    parser.add_argument(
+        '--calibrationmode', help='window calibrates on ten times the maximum period time of values. adaptive calibrates '
+        'after a few oscillations and confirms the calibration once the oscillations are stable',
+        choices=['window', 'adaptive'], default='window')
+    parser.add_argument(
+        '--adaptiverate', help='Lower the sample rate while the meter is idle', action='store_true')
+    parser.add_argument(
+        '--idledelay', help='Time without motion in seconds after which the idle sample rate is used', type=float,
+        default=60.0)
+    parser.add_argument(
+        '--detectorbackend', help='Window statistics of the tick detector. python starts faster and needs less memory '
+        'because numpy is not imported. Defaults to python. The detector of several meters always uses numpy',
+        choices=['python', 'numpy'])
+    parser.add_argument(
+        '--runtime', help='Run acquisition, detection and publishing in one blocking loop, concurrently with asyncio, '
+        'so that slow publishes can not delay the sampling, or read the sensor in a separate process that hands the '
+        'samples over through shared memory', choices=['loop', 'asyncio', 'splitprocess'], default='loop')
+    parser.add_argument(
+        '--metricsport', help='Serve Prometheus metrics of the hot paths on this port. No metrics are collected if '
+        'neither a port nor a diagnostics topic is given', type=int)
+    parser.add_argument(
+        '--metricshost', help='Address to serve the metrics on', default='127.0.0.1')
+    parser.add_argument(
+        '--diagnosticstopic', help='mqtt topic to periodically publish the metrics to')
+    parser.add_argument(
+        '--diagnosticsinterval', help='Time between two diagnostics publishes in seconds', type=float, default=60.0)
+    parser.add_argument('-v', action='store_true', help='log every count change')
     args = parser.parse_args()
+    if not MMC5983MA.is_frequency_supported(args.measurementfrequency, args.bandwidth):
+        parser.error("a measurement frequency of {} Hz needs a higher bandwidth than {} Hz".format(
+            args.measurementfrequency, args.bandwidth))
+    if not 0.0 <= args.deactivationratio < args.activationratio <= 1.0:
+        parser.error("the activation ratio has to be above the deactivation ratio, both between 0 and 1")
+
+    logging.basicConfig(level=logging.DEBUG if args.v else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    # Every meter has its own sensor, axis, volume per tick and topic
+    meter_configs = json.loads(args.meters) if args.meters else []
+    if len(meter_configs) == 0:
+        meter_configs = [{"name": "gas", "bus": 1, "axis": "x",
+                          "m3pertick": args.m3pertick, "mqtttopic": args.mqtttopic}]
+    try:
+        check_meter_sensors(meter_configs)
+    except ValueError as error:
+        parser.error(str(error))
+    is_multi_meter = len(meter_configs) > 1
+    if is_multi_meter and args.runtime == "splitprocess":
+        parser.error("the split process runtime supports a single meter")
+    if is_multi_meter and args.adaptiverate:
+        parser.error("the adaptive sample rate supports a single meter, the sample rate of several meters is shared")
+    if is_multi_meter and args.detectorbackend == "python":
+        parser.error("the detector of several meters always uses numpy")
 
-    # Setup mqtt connection
+    # Optional instrumentation of the hot paths, it costs nothing per sample if disabled
+    metrics = None
+    if args.metricsport is not None or args.diagnosticstopic:
+        metrics = MetricsRegistry()
+
+    # Setup mqtt connection. Only imported here, so that the functions above can be used without the paho package
+    import paho.mqtt.client as mqtt
     client = mqtt.Client()
     client.on_connect = on_connect
     client.on_message = on_message
     client.username_pw_set(args.mqttuser, args.mqttpasswd)
-    client.connect("homeassistant", 1883, 60)
-    client.loop_start()
+    publishers = []
+    for meter_config in meter_configs:
+        queue_path = args.publishqueue
+        if queue_path and is_multi_meter:
+            queue_path = "{}.{}".format(queue_path, meter_config["name"])
+        publishers.append(CoalescingPublisher(client, meter_config["mqtttopic"], coalesce_interval=args.publishinterval,
+                                              queue_path=queue_path, metrics=metrics))
+    # Count changes are published immediately, the fractional volume and the flow rate at most every fractional interval
+    reporter = VolumeReporter(publishers, [meter_config["m3pertick"] for meter_config in meter_configs],
+                              fractional_interval=args.fractionalinterval)
+    diagnostics_publisher = None
+    if args.diagnosticstopic and metrics is not None:
+        diagnostics_publisher = DiagnosticsPublisher(client, args.diagnosticstopic, metrics,
+                                                     interval=args.diagnosticsinterval)
+
+    def on_publish(client, userdata, mid):
+        for publisher in publishers:
+            publisher.on_publish(client, userdata, mid)
+    client.on_publish = on_publish
+    if args.runtime == "asyncio":
+        # The connection is established by the event loop
+        client.connect_async("homeassistant", 1883, 60)
+    else:
+        client.connect("homeassistant", 1883, 60)
+        client.loop_start()
 
     # Setup meter
-    i2cbus = SMBus(1)
-    magnetometer = MMC5983MA(i2cbus)
-    sample_time = 0.05
-    max_period_time = 1.0  # seconds
+    sensor_settings = {"measurement_frequency": args.measurementfrequency, "bandwidth": args.bandwidth,
+                       "set_reset_interval": args.setresetinterval}
+    if args.runtime == "splitprocess":
+        # The sensor is only opened in the acquisition process
+        magnetometers = [None]
+    else:
+        magnetometers = create_magnetometers(meter_configs, metrics, **sensor_settings)
+    # The scheduler follows the data ready flag of the sensor, so every measurement is read exactly once
+    sample_time = 1.0 / args.measurementfrequency
+    max_period_time = args.maxperiodtime  # seconds
     max_period_length = int(max_period_time/sample_time)
-    min_amplitude = 20
+    min_amplitude = args.minamplitude
     max_amplitude = 8000
-    min_std = 50
-    meter = RetroMeter(magnetometer, "x", max_period_length,
-                       min_amplitude, max_amplitude, min_std, is_verbose=args.v)
-
-    last_count = -1
-    while(True):
-        # Read measurements
-        if meter.is_count_updated():
-            count = meter.update_and_get_meter_ticks()
-
-            # if count changed, publish an mqtt message
-            if last_count != count:
-                last_count = count  # store new value
-                volume = count * args.m3pertick
-
-                # publish value over mqtt
-                client.publish(args.mqtttopic, json.dumps(
-                    {"volume": volume, "count": count}))
-
-            time.sleep(sample_time)
+    min_std = args.minstd
+    mag_axes = [meter_config["axis"] for meter_config in meter_configs]
+    sensor_config = {"sensor": "MMC5983MA", "mag_axis": mag_axes[0], "sample_time": sample_time,
+                     "max_period_time": max_period_time, "min_amplitude": min_amplitude,
+                     "max_amplitude": max_amplitude, "min_std": min_std,
+                     "activation_threshold_ratio": args.activationratio,
+                     "deactivation_threshold_ratio": args.deactivationratio}
+    if is_multi_meter:
+        sensor_config["meters"] = [[meter_config["name"], meter_config["axis"]]
+                                   for meter_config in meter_configs]
+
+    # Setup optional raw sample recording, in one sub directory per meter if there are several meters
+    sample_recorders = [None] * len(meter_configs)
+    if args.recorddir:
+        for index, meter_config in enumerate(meter_configs):
+            record_dir = args.recorddir
+            if is_multi_meter:
+                record_dir = "{}/{}".format(args.recorddir, meter_config["name"])
+            meter_sensor_config = dict(sensor_config, mag_axis=mag_axes[index])
+            meter_sensor_config.pop("meters", None)
+            sample_recorders[index] = SampleRecorder(
+                record_dir, sample_time, meter_sensor_config, max_file_size=args.recordfilesize,
+                max_file_count=args.recordfilecount)
+
+    # Setup the optional log of tick times, in one file per meter if there are several meters
+    tick_stores = [None] * len(meter_configs)
+    if args.tickstore:
+        for index, meter_config in enumerate(meter_configs):
+            tick_store_path = args.tickstore
+            if is_multi_meter:
+                tick_store_path = "{}.{}".format(args.tickstore, meter_config["name"])
+            tick_stores[index] = TickStore(tick_store_path)
+        if args.tickstoreport is not None:
+            TickStoreServer({meter_config["name"]: (tick_store, meter_config["m3pertick"])
+                             for meter_config, tick_store in zip(meter_configs, tick_stores)},
+                            args.tickstoreport, args.tickstorehost).start()
+
+    # Keep the recent samples in memory and dump them on request with "kill -USR1"
+    telemetries = [Telemetry(args.telemetrybufferlength, args.telemetrysummaryinterval,
+                             logging.getLogger("retrometer." + meter_config["name"]))
+                   for meter_config in meter_configs]
+
+    def dump_telemetries(signum, frame):
+        for telemetry in telemetries:
+            telemetry.dump()
+    signal.signal(signal.SIGUSR1, dump_telemetries)
+
+    # Sample on fixed rate deadlines, optionally with a lower rate while the meter is idle
+    scheduler = SamplingScheduler(sample_time)
+    rate_controller = None
+    if args.adaptiverate:
+        if args.runtime == "splitprocess":
+            logger.warning("The adaptive sample rate is not supported by the split process runtime")
+        else:
+            rate_controller = AdaptiveRateController(sample_time, max_period_time, min_amplitude, idle_delay=args.idledelay,
+                                                     scheduler=scheduler, magnetometer=magnetometers[0],
+                                                     oversampling=1.0, activation_threshold_ratio=args.activationratio,
+                                                     deactivation_threshold_ratio=args.deactivationratio)
+
+    meter = create_meter(args, meter_configs, magnetometers, max_period_length, min_amplitude, max_amplitude, min_std,
+                         telemetries, sample_recorders, tick_stores, metrics=metrics, rate_controller=rate_controller)
+
+    # Resume counting from the last checkpoint. The calibration is only restored if the detector config is unchanged.
+    checkpointer = None
+    if args.checkpointpath:
+        checkpointer = Checkpointer(
+            args.checkpointpath, sensor_config, min_interval=args.checkpointinterval,
+            count_interval=args.checkpointcountinterval)
+        checkpoint = checkpointer.load()
+        if checkpoint is not None:
+            state, is_config_matching = checkpoint
+            if is_multi_meter and not is_config_matching:
+                # The counts can not be assigned to the meters reliably if the meters changed
+                logger.warning("Ignoring checkpoint because the meter config changed")
+            else:
+                meter.restore_state(state, restore_calibration=is_config_matching)
+                logger.info("Resuming from checkpoint%s", "" if is_config_matching else
+                            " without calibration because the config changed")
+
+    scheduler_report_interval = 60.0  # seconds
+
+    split_runtime = None
+    if args.runtime == "splitprocess":
+        split_runtime = SplitProcessRuntime(meter, reporter, functools.partial(create_magnetometer, meter_configs[0],
+                                                                               **sensor_settings),
+                                            sample_time, checkpointer=checkpointer, sample_recorder=sample_recorders[0],
+                                            diagnostics_publisher=diagnostics_publisher)
+
+    if metrics is not None:
+        if split_runtime is not None:
+            register_split_runtime_metrics(metrics, split_runtime.get_statistics)
+        else:
+            register_scheduler_metrics(metrics, scheduler.get_statistics)
+        if args.metricsport is not None:
+            MetricsServer(metrics, args.metricsport, args.metricshost).start()
+
+    if split_runtime is not None:
+        # Save the checkpoint and pending updates when the supervisor stops the add-on
+        signal.signal(signal.SIGTERM, lambda signum, frame: split_runtime.stop())
+        try:
+            split_runtime.run()
+        finally:
+            for sample_recorder in sample_recorders:
+                if sample_recorder is not None:
+                    sample_recorder.close()
+            for tick_store in tick_stores:
+                if tick_store is not None:
+                    tick_store.close()
+            logger.info("Split process statistics: %s", json.dumps(split_runtime.get_statistics()))
+        sys.exit(0)
+
+    if args.runtime == "asyncio":
+        runtime = AsyncRuntime(meter, scheduler, reporter, checkpointer=checkpointer)
+
+        async def report_statistics():
+            last_statistics = runtime.get_statistics()
+            while True:
+                await asyncio.sleep(scheduler_report_interval)
+                statistics = runtime.get_statistics()
+                report_scheduler_statistics(statistics, last_statistics)
+                last_statistics = statistics
+
+        async def publish_diagnostics():
+            while True:
+                await asyncio.sleep(args.diagnosticsinterval)
+                await asyncio.get_running_loop().run_in_executor(None, diagnostics_publisher.poll)
+
+        async def run_runtime():
+            # Save the checkpoint and pending updates when the supervisor stops the add-on
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, runtime.stop)
+            mqtt_loop = AsyncioMqttLoop(client)
+            mqtt_task = asyncio.ensure_future(mqtt_loop.run())
+            report_task = asyncio.ensure_future(report_statistics())
+            diagnostics_task = None
+            if diagnostics_publisher is not None:
+                diagnostics_task = asyncio.ensure_future(publish_diagnostics())
+            try:
+                await runtime.run()
+            finally:
+                report_task.cancel()
+                if diagnostics_task is not None:
+                    diagnostics_task.cancel()
+                mqtt_loop.stop()
+                await mqtt_task
+
+        try:
+            asyncio.run(run_runtime())
+        finally:
+            for sample_recorder in sample_recorders:
+                if sample_recorder is not None:
+                    sample_recorder.close()
+            for tick_store in tick_stores:
+                if tick_store is not None:
+                    tick_store.close()
+        sys.exit(0)
+
+    # Save the checkpoint and pending updates when the supervisor stops the add-on
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        run_loop(meter, scheduler, reporter, checkpointer=checkpointer, diagnostics_publisher=diagnostics_publisher,
+                 report_interval=scheduler_report_interval)
+    finally:
+        for sample_recorder in sample_recorders:
+            if sample_recorder is not None:
+                sample_recorder.close()
+        for tick_store in tick_stores:
+            if tick_store is not None:
+                tick_store.close()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+import os
+from src.retro_meter import RetroMeter
+from src.sample_recorder import open_recording, list_recordings
+
+
+def replay_recordings(paths, mag_axis=None, max_period_time=None, min_amplitude=None, max_amplitude=None, min_std=None,
+                      activation_threshold_ratio=None, deactivation_threshold_ratio=None, calibration_mode="window",
+                      chunk_length=1 << 20):
+    """Push recorded samples through a retro meter as fast as possible and return the final count.
+
+    Detector parameters that are not given are taken from the sensor config in the header of the first recording.
+    The recordings are memory mapped and processed in chunks, so archives larger than the RAM can be replayed.
+    """
+    meter = None
+    count = 0
+    for path in paths:
+        sample_time, sensor_config, samples = open_recording(path)
+        if meter is None:
+            def choose(value, key, default):
+                return sensor_config.get(key, default) if value is None else value
+            max_period_time = choose(max_period_time, "max_period_time", 1.0)
+            meter = RetroMeter(None, choose(mag_axis, "mag_axis", "x"), int(max_period_time/sample_time),
+                               choose(min_amplitude, "min_amplitude", 20),
+                               choose(max_amplitude, "max_amplitude", 8000),
+                               choose(min_std, "min_std", 50),
+                               activation_threshold_ratio=choose(
+                                   activation_threshold_ratio, "activation_threshold_ratio", 0.8),
+                               deactivation_threshold_ratio=choose(
+                                   deactivation_threshold_ratio, "deactivation_threshold_ratio", 0.7),
+                               calibration_mode=calibration_mode)
+        for chunk_start in range(0, len(samples), chunk_length):
+            counts = meter.replay_samples(
+                samples[chunk_start:chunk_start + chunk_length])
+            if len(counts) > 0:
+                count = int(counts[-1])
+        print("{}: {} samples, count {}".format(path, len(samples), count))
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Replays raw magnetometer recordings through the tick detection without hardware.')
+    parser.add_argument(
+        'recordings', nargs='+', help='recording files or directories with recording files')
+    parser.add_argument('--axis', choices=['x', 'y', 'z'],
+                        help='magnetometer axis to count on')
+    parser.add_argument('--maxperiodtime', type=float,
+                        help='maximum period time of one tick in seconds')
+    parser.add_argument('--minamplitude', type=float)
+    parser.add_argument('--maxamplitude', type=float)
+    parser.add_argument('--minstd', type=float)
+    parser.add_argument('--activationratio', type=float)
+    parser.add_argument('--deactivationratio', type=float)
+    parser.add_argument('--calibrationmode', choices=['window', 'adaptive'], default='window')
+    args = parser.parse_args()
+
+    paths = []
+    for recording in args.recordings:
+        if os.path.isdir(recording):
+            paths.extend(list_recordings(recording))
+        else:
+            paths.append(recording)
+
+    count = replay_recordings(paths, args.axis, args.maxperiodtime,
+                              args.minamplitude, args.maxamplitude, args.minstd, args.activationratio,
+                              args.deactivationratio, args.calibrationmode)
+    print("Count: {}".format(count))
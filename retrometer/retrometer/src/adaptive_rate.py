@@ -0,0 +1,101 @@
+import collections
+import logging
+import math
+
+_logger = logging.getLogger(__name__)
+
+# Part of the time above the activation threshold or below the deactivation threshold that the idle sample time may use,
+# the rest is left for noise and jitter of the sample times
+IDLE_SAMPLE_TIME_MARGIN = 0.85
+
+
+class AdaptiveRateController:
+    def __init__(self, active_sample_time, max_period_time, activity_threshold, idle_sample_time=None, idle_delay=60.0,
+                 scheduler=None, magnetometer=None, oversampling=2.0, activation_threshold_ratio=0.8,
+                 deactivation_threshold_ratio=0.7):
+        """Create a controller that lowers the sample rate while the meter is idle and returns to the full rate as soon
+        as the signal moves.
+
+        The idle sample time is limited to a quarter of the shortest period, and further to the shorter of the times a
+        sine spends above the activation threshold and below the deactivation threshold of the hysteresis trigger in
+        each period. So even periods at the maximum flow that start while sampling at the idle rate are counted.
+
+        Args:
+            active_sample_time (float): Sample time while the meter moves in seconds.
+            max_period_time (float): Shortest period of the meter at the maximum flow in seconds.
+            activity_threshold (float): Deviation of a value from the mean of the recent values that counts as motion.
+            idle_sample_time (float): Sample time while the meter is idle in seconds. Defaults to the longest safe value.
+            idle_delay (float): Time without motion in seconds after which the idle rate is used.
+            scheduler (SamplingScheduler): Optional scheduler whose sample time is changed by apply().
+            magnetometer (MMC5983MA): Optional magnetometer whose measurement frequency is changed by apply().
+            oversampling (float): Number of sensor measurements per sample time. 1 is enough if the scheduler follows the
+                data ready flag of the sensor.
+            activation_threshold_ratio (float): Activation threshold ratio of the trigger that counts the periods.
+            deactivation_threshold_ratio (float): Deactivation threshold ratio of the trigger that counts the periods.
+        """
+        # A sine min + (max-min)*(1-cos(phase))/2 is above the activation and below the deactivation threshold for these
+        # parts of each period. For the default 0.8 and 0.7 both are above a quarter period.
+        activated_part = 1.0 - math.acos(1.0 - 2.0*activation_threshold_ratio) / math.pi
+        deactivated_part = math.acos(1.0 - 2.0*deactivation_threshold_ratio) / math.pi
+        max_idle_sample_time = max_period_time * min(0.25, IDLE_SAMPLE_TIME_MARGIN * min(activated_part, deactivated_part))
+        if idle_sample_time is None or idle_sample_time > max_idle_sample_time:
+            idle_sample_time = max_idle_sample_time
+        self._active_sample_time = active_sample_time
+        self._idle_sample_time = max(idle_sample_time, active_sample_time)
+        self._activity_threshold = activity_threshold
+        self._idle_delay = idle_delay
+        self._scheduler = scheduler
+        self._magnetometer = magnetometer
+        self._oversampling = oversampling
+
+        # The recent values cover one period at the active sample rate and a longer time at the idle rate
+        self._values = collections.deque(
+            maxlen=max(2, int(math.ceil(max_period_time / active_sample_time))))
+        self._values_sum = 0.0
+        self._is_idle = False
+        self._last_activity_timestamp = None
+        self._applied_sample_time = None
+
+    def input(self, value, timestamp):
+        """Update the activity with a new value. Cheap enough to be called for every sample.
+
+        Args:
+            value (float): Scalar that is used for counting.
+            timestamp (float): Monotonic time of the value in seconds.
+        """
+        if len(self._values) > 0 and \
+                abs(value - self._values_sum / len(self._values)) > self._activity_threshold:
+            self._last_activity_timestamp = timestamp
+            if self._is_idle:
+                self._is_idle = False
+                _logger.info("Motion detected, sampling every %.3f s", self._active_sample_time)
+        elif self._last_activity_timestamp is None:
+            self._last_activity_timestamp = timestamp
+        elif not self._is_idle and timestamp - self._last_activity_timestamp >= self._idle_delay:
+            self._is_idle = True
+            _logger.info("No motion for %.0f s, sampling every %.3f s", self._idle_delay, self._idle_sample_time)
+
+        if len(self._values) == self._values.maxlen:
+            self._values_sum -= self._values[0]
+        self._values.append(value)
+        self._values_sum += value
+
+    def is_idle(self):
+        return self._is_idle
+
+    def get_sample_time(self):
+        return self._idle_sample_time if self._is_idle else self._active_sample_time
+
+    def apply(self):
+        """Apply the sample time of the current activity to the scheduler and the sensor. Has to be called from the thread
+        that reads the sensor, so that the i2c transactions do not interleave.
+        """
+        sample_time = self.get_sample_time()
+        if sample_time == self._applied_sample_time:
+            return
+        if self._magnetometer is not None:
+            # Measure at least once per sample time, so that a new measurement is ready at every deadline
+            self._magnetometer.set_continuous_measurement_frequency(self._oversampling / sample_time)
+        if self._scheduler is not None:
+            self._scheduler.set_sample_time(sample_time)
+        self._applied_sample_time = sample_time
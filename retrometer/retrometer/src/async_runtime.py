@@ -0,0 +1,236 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+class AsyncioMqttLoop:
+    def __init__(self, client, misc_interval=1.0, reconnect_interval=5.0):
+        """Drive the network traffic of a paho mqtt client with the asyncio event loop instead of the thread of
+        loop_start(). The client has to be configured with connect_async(), the connection is established and
+        re-established by run().
+
+        Args:
+            client (mqtt.Client): Paho mqtt client.
+            misc_interval (float): Time between two keep alive and retry checks of the client in seconds.
+            reconnect_interval (float): Minimum time between two connection attempts in seconds.
+        """
+        self._client = client
+        self._misc_interval = misc_interval
+        self._reconnect_interval = reconnect_interval
+        self._loop = None
+        self._loop_thread_id = None
+        self._stop_event = None
+        self._is_stopping = False
+
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    async def run(self):
+        """Connect and serve the client until stop() is called.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop_event = asyncio.Event()
+        if self._is_stopping:
+            return
+        last_connect_time = None
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            if not self._client.is_connected() and \
+                    (last_connect_time is None or now - last_connect_time >= self._reconnect_interval):
+                last_connect_time = now
+                try:
+                    # Name resolution and the tcp handshake block, so they must not run in the event loop
+                    await self._loop.run_in_executor(None, self._client.reconnect)
+                except OSError as error:
+                    _logger.warning("Connecting to the mqtt broker failed: %s", error)
+            self._client.loop_misc()
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), self._misc_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        self._is_stopping = True
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    def _call_in_loop(self, callback, *args):
+        # Paho calls the socket callbacks from the thread that publishes or connects
+        if threading.get_ident() == self._loop_thread_id:
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._call_in_loop(self._loop.add_reader, sock, client.loop_read)
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._call_in_loop(self._loop.remove_reader, sock)
+        self._call_in_loop(self._loop.remove_writer, sock)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._call_in_loop(self._loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._call_in_loop(self._loop.remove_writer, sock)
+
+
+class AsyncRuntime:
+    def __init__(self, meter, scheduler, reporter, checkpointer=None, max_queue_length=64,
+                 publish_poll_interval=0.1):
+        """Create a runtime that runs acquisition, detection and publishing concurrently, so that slow publishes and
+        broker reconnects never delay the sampling.
+
+        The acquisition runs in its own thread on the deadlines of the scheduler and hands the samples to the detection
+        coroutine through a bounded queue. A sample whose i2c transaction failed is skipped and counted. Publishing and checkpoint writes run in a second thread. At most one publish
+        round is in flight, readings in the meantime are coalesced to the latest ones.
+
+        Args:
+            meter (RetroMeter): Meter with read_sample(), process_sample() and get_readings(), a MultiRetroMeter for
+                several meters.
+            scheduler (SamplingScheduler): Scheduler that paces the acquisition.
+            reporter (VolumeReporter): Reporter that publishes the readings of all meters.
+            checkpointer (Checkpointer): Optional checkpointer that stores the detector state.
+            max_queue_length (int): Maximum number of samples waiting for detection. Newer samples are dropped when full.
+            publish_poll_interval (float): Time between two publish rounds in seconds.
+        """
+        self._meter = meter
+        self._scheduler = scheduler
+        self._reporter = reporter
+        self._checkpointer = checkpointer
+        self._max_queue_length = max_queue_length
+        self._publish_poll_interval = publish_poll_interval
+
+        self._acquisition_executor = concurrent.futures.ThreadPoolExecutor(
+            1, thread_name_prefix="acquisition")
+        self._io_executor = concurrent.futures.ThreadPoolExecutor(
+            1, thread_name_prefix="publishing")
+        self._stop_acquisition = threading.Event()
+        self._stop_event = None
+        self._sample_queue = None
+        self._readings = None
+        self._checkpoint_future = None
+
+        # Statistics
+        self._dropped_sample_count = 0
+        self._max_queue_fill = 0
+        self._i2c_error_count = 0
+
+    async def run(self):
+        """Run until stop() is called or the acquisition fails. Saves the checkpoint and flushes the publishers before
+        returning.
+        """
+        loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self._sample_queue = asyncio.Queue(self._max_queue_length)
+        if self._stop_acquisition.is_set():
+            self._stop_event.set()
+
+        acquisition = loop.run_in_executor(
+            self._acquisition_executor, self._acquire, loop)
+        detection = asyncio.ensure_future(self._detect())
+        publishing = asyncio.ensure_future(self._publish())
+        stop = asyncio.ensure_future(self._stop_event.wait())
+        try:
+            await asyncio.wait([acquisition, detection, stop], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # Stop in the order of the data flow, so that all acquired samples are counted and published
+            self.stop()
+            try:
+                await acquisition
+            finally:
+                await self._sample_queue.put(None)
+                await detection
+                await publishing
+                stop.cancel()
+                state = None if self._checkpointer is None or self._readings is None else self._meter.get_state()
+                await loop.run_in_executor(self._io_executor, self._shutdown_io, state)
+                self._acquisition_executor.shutdown()
+                self._io_executor.shutdown()
+
+    def stop(self):
+        """Request a clean shutdown, e.g. from a SIGTERM handler.
+        """
+        self._stop_acquisition.set()
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    def get_statistics(self):
+        statistics = self._scheduler.get_statistics()
+        statistics["dropped_samples"] = self._dropped_sample_count
+        statistics["max_queue_fill"] = self._max_queue_fill
+        statistics["i2c_errors"] = self._i2c_error_count
+        return statistics
+
+    def _acquire(self, loop):
+        # Runs in the acquisition thread, only the i2c transactions and the sample recording happen here
+        while not self._stop_acquisition.is_set():
+            try:
+                timestamp = self._scheduler.wait_for_next_sample(
+                    self._meter.is_count_updated)
+                if timestamp is None:
+                    continue
+                sample = self._meter.read_sample()
+            except OSError as error:
+                # A disturbed i2c transaction only loses this sample, further errors are counted in the statistics
+                if self._i2c_error_count == 0:
+                    _logger.warning("i2c transaction failed, skipping the sample: %s", error)
+                self._i2c_error_count += 1
+                continue
+            loop.call_soon_threadsafe(
+                self._enqueue_sample, timestamp, sample)
+
+    def _enqueue_sample(self, timestamp, sample):
+        if self._sample_queue.full():
+            # The detection can not keep up, blocking the acquisition instead would shift the sampling
+            if self._dropped_sample_count == 0:
+                _logger.warning("Detection queue full, dropping samples")
+            self._dropped_sample_count += 1
+            return
+        self._sample_queue.put_nowait((timestamp, sample))
+        self._max_queue_fill = max(
+            self._max_queue_fill, self._sample_queue.qsize())
+
+    async def _detect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._sample_queue.get()
+            if item is None:
+                return
+            timestamp, sample = item
+            self._meter.process_sample(sample, timestamp)
+            self._readings = self._meter.get_readings()
+
+            # Skip the checkpoint while the previous one still waits for a slow publish round
+            if self._checkpointer is not None and self._checkpointer.is_due(self._readings) and \
+                    (self._checkpoint_future is None or self._checkpoint_future.done()):
+                self._checkpoint_future = loop.run_in_executor(self._io_executor, self._checkpointer.save,
+                                                               self._meter.get_state(timestamp), self._readings)
+
+    async def _publish(self):
+        loop = asyncio.get_running_loop()
+        while not self._stop_event.is_set():
+            await loop.run_in_executor(self._io_executor, self._publish_readings, self._readings)
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), self._publish_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _publish_readings(self, readings):
+        # Runs in the publishing thread, publishes block while the network buffers are full
+        if readings is not None:
+            self._reporter.update(readings)
+        self._reporter.poll()
+
+    def _shutdown_io(self, state):
+        self._publish_readings(self._readings)
+        if state is not None:
+            self._checkpointer.save(state)
+        self._reporter.flush()
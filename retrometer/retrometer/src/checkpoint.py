@@ -0,0 +1,86 @@
+import json
+import logging
+import os
+import time
+from src.file_utils import write_file_atomically
+
+_logger = logging.getLogger(__name__)
+
+
+class Checkpointer:
+    checkpoint_version = 1
+
+    def __init__(self, path, config, min_interval=300.0, clock=time.monotonic, count_interval=60.0):
+        """Create a checkpointer that periodically and atomically stores the detector state in a file. While the counts
+        change, the state is stored more often, so that a crash loses at most the ticks of the count interval. An idle
+        meter does not change its state and causes no writes.
+
+        Args:
+            path (str): Checkpoint file, e.g. on the /data volume of the add-on.
+            config (dict): Detector configuration the state belongs to. It is stored with the state, so that a state
+                of a different configuration can be recognized when loading.
+            min_interval (float): Minimum time between two checkpoint writes in seconds, to limit the wear of the storage.
+            clock (callable): Monotonic clock returning seconds.
+            count_interval (float): Minimum time between two checkpoint writes in seconds if a count changed since the
+                last write.
+        """
+        self._path = path
+        self._config = config
+        self._min_interval = min_interval
+        self._count_interval = min(count_interval, min_interval)
+        self._clock = clock
+        self._last_save_time = clock()
+        self._last_saved_state = None
+        self._last_saved_counts = None
+
+    def load(self):
+        """Returns a tuple (state, is_config_matching) of the stored checkpoint, or None if there is no valid checkpoint.
+        """
+        if not os.path.exists(self._path):
+            return None
+        try:
+            with open(self._path, "rb") as file:
+                checkpoint = json.loads(file.read().decode("utf-8"))
+            if checkpoint["version"] != self.checkpoint_version:
+                _logger.warning("Ignoring checkpoint %s with version %s", self._path, checkpoint["version"])
+                return None
+            self._last_saved_state = checkpoint["state"]
+            return checkpoint["state"], checkpoint["config"] == self._config
+        except (OSError, ValueError, KeyError) as error:
+            _logger.warning("Ignoring unreadable checkpoint %s: %s", self._path, error)
+            return None
+
+    def is_due(self, readings=None):
+        """Returns true if the minimum interval since the last save has passed, or the count interval and a count changed
+        since the last save. Cheap enough to check on every sample.
+
+        Args:
+            readings (list): Optional current readings of the meters, see RetroMeter.get_readings().
+        """
+        elapsed_time = self._clock() - self._last_save_time
+        if elapsed_time >= self._min_interval:
+            return True
+        # The counts are only compared once the count interval passed
+        return readings is not None and elapsed_time >= self._count_interval and \
+            self._get_counts(readings) != self._last_saved_counts
+
+    def save(self, state, readings=None):
+        """Write the state to the checkpoint file, unless it did not change since the last save.
+
+        Args:
+            state (dict): Json serializable detector state.
+            readings (list): Optional readings of the meters with the counts of the state, see is_due().
+        """
+        self._last_save_time = self._clock()
+        if readings is not None:
+            self._last_saved_counts = self._get_counts(readings)
+        if state == self._last_saved_state:
+            return
+        checkpoint = {"version": self.checkpoint_version,
+                      "config": self._config, "state": state}
+        write_file_atomically(self._path, json.dumps(checkpoint).encode("utf-8"))
+        self._last_saved_state = state
+
+    @staticmethod
+    def _get_counts(readings):
+        return [reading["count"] for reading in readings]
@@ -0,0 +1,212 @@
+import errno
+import math
+import random
+import time
+from src.magnetometer import MMC5983MA
+
+
+class SimulatedClock:
+    def __init__(self, start_time=0.0):
+        """Create a clock that only advances when something sleeps on it, so that hours of sampling run in seconds.
+
+        Pass monotonic() and sleep() as the clock and sleep functions of the SamplingScheduler and the fake bus.
+        """
+        self._time = start_time
+
+    def monotonic(self):
+        return self._time
+
+    def sleep(self, duration):
+        if duration > 0.0:
+            self._time += duration
+
+
+def create_sine_waveform(amplitude, period, axis="x", offset=(0.0, 0.0, 0.0), noise_std=0.0, seed=None):
+    """Returns a waveform for FakeMMC5983MABus: a sine with noise on one axis on top of a constant field, e.g. the magnet
+    of a meter wheel that turns once per period.
+
+    Args:
+        amplitude (float): Amplitude of the sine in mG.
+        period (float): Period of the sine in seconds, the time of one meter tick.
+        axis (str): One of "x", "y", "z".
+        offset (tuple): Constant field (x, y, z) in mG.
+        noise_std (float): Standard deviation of gaussian noise on all axes in mG.
+        seed (int): Optional seed for reproducible noise.
+    """
+    axis_index = "xyz".index(axis)
+    generator = random.Random(seed)
+
+    def waveform(timestamp):
+        field = [value + (generator.gauss(0.0, noise_std) if noise_std > 0.0 else 0.0) for value in offset]
+        field[axis_index] += amplitude * math.sin(2.0 * math.pi * timestamp / period)
+        return tuple(field)
+    return waveform
+
+
+class FakeMMC5983MABus:
+    # Status register bits
+    measurementDone = 0b00000001
+    temperatureDone = 0b00000010
+    otpReadDone = 0b00010000
+    productIdReg = 0x2f
+    productId = 0x30
+
+    def __init__(self, waveform=None, temperature=25.0, latency=0.0, error_rate=0.0, seed=None, clock=time.monotonic,
+                 sleep=time.sleep):
+        """Create a stand-in for an SMBus with a MMC5983MA on it that emulates the register map of the sensor, so that
+        MMC5983MA, RetroMeter and the sampling loop can run without hardware.
+
+        Continuous measurements complete at the frequency in controlReg2, each one measurement duration of the bandwidth
+        in controlReg1 after its start. A measurement samples the waveform at its completion time and is encoded into the
+        18 bit output registers. Meas_M_Done in the status register is set when a measurement completes and cleared
+        when Xout0 is read or 1 is written to it. Writing TM_M or TM_T to controlReg0 takes a single magnetic or
+        temperature measurement. Meas_T_Done is cleared when the temperature register is read.
+
+        Args:
+            waveform (callable): Returns the magnetic field (x, y, z) in mG at a clock time. Defaults to no field.
+            temperature (float): Temperature in degrees Celsius.
+            latency (float): Duration of every transaction in seconds, spent with sleep(). With a SimulatedClock, the
+                latency lets the time advance while the driver polls the status register.
+            error_rate (float): Probability of a transaction to fail with a remote I/O error like a disturbed bus.
+            seed (int): Optional seed for reproducible errors.
+            clock (callable): Monotonic clock returning seconds, e.g. SimulatedClock.monotonic.
+            sleep (callable): Function that sleeps for the given number of seconds, e.g. SimulatedClock.sleep.
+        """
+        self._waveform = waveform if waveform is not None else lambda timestamp: (0.0, 0.0, 0.0)
+        self._temperature = temperature
+        self._latency = latency
+        self._error_rate = error_rate
+        self._random = random.Random(seed)
+        self._clock = clock
+        self._sleep = sleep
+
+        self._bandwidth_bits = 0b00
+        self._control_reg2 = 0
+        self._is_auto_set_reset = False
+        # Start time of the continuous measurements, None while they are disabled
+        self._continuous_start_time = None
+        self._single_measurement_time = None
+        # Completion time of the measurement in the output registers
+        self._measurement_time = None
+        self._output = [0] * 7
+        self._status = self.otpReadDone
+        self._temperature_out = 0
+
+        # Statistics
+        self._transaction_count = 0
+        self._error_count = 0
+
+    def read_byte_data(self, i2caddress, register):
+        self._begin_transaction(i2caddress)
+        return self._read_registers(register, 1)[0]
+
+    def read_i2c_block_data(self, i2caddress, register, length):
+        self._begin_transaction(i2caddress)
+        return self._read_registers(register, length)
+
+    def write_byte_data(self, i2caddress, register, value):
+        self._begin_transaction(i2caddress)
+        now = self._clock()
+        self._update_measurements(now)
+        if register == MMC5983MA.statusReg:
+            # Writing 1 clears the done bits
+            self._status &= ~(value & (self.measurementDone | self.temperatureDone))
+        elif register == MMC5983MA.controlReg0:
+            if value & 0b00000001:
+                self._single_measurement_time = now + self.get_measurement_duration()
+            if value & 0b00000010:
+                self._temperature_out = min(max(int(round((self._temperature + 75.0) / 0.8)), 0), 255)
+                self._status |= self.temperatureDone
+            self._is_auto_set_reset = bool(value & 0b00100000)
+        elif register == MMC5983MA.controlReg1:
+            if value & 0b10000000:
+                # Software reset
+                self._control_reg2 = 0
+                self._continuous_start_time = None
+            self._bandwidth_bits = value & 0b00000011
+        elif register == MMC5983MA.controlReg2:
+            self._control_reg2 = value
+            # Changing the frequency restarts the continuous measurements
+            self._continuous_start_time = now if self.get_measurement_frequency() > 0 else None
+
+    def get_measurement_frequency(self):
+        """Returns the continuous measurement frequency in Hz that was written to controlReg2, 0 if the continuous
+        measurements are disabled.
+        """
+        if not self._control_reg2 & 0b00001000:
+            return 0
+        frequency_bits = self._control_reg2 & 0b00000111
+        for frequency, bits in MMC5983MA.continuousMeasurementFrequencies.items():
+            if bits == frequency_bits:
+                return frequency
+        return 0
+
+    def get_measurement_duration(self):
+        """Returns the duration of one measurement in seconds for the bandwidth that was written to controlReg1.
+        """
+        for bits, duration in MMC5983MA.bandwidths.values():
+            if bits == self._bandwidth_bits:
+                return duration
+
+    def set_error_rate(self, error_rate):
+        """Change the probability of a transaction to fail, e.g. to only disturb the bus after the sensor was set up.
+        """
+        self._error_rate = error_rate
+
+    def is_auto_set_reset_enabled(self):
+        return self._is_auto_set_reset
+
+    def get_statistics(self):
+        return {"transactions": self._transaction_count, "errors": self._error_count}
+
+    def _begin_transaction(self, i2caddress):
+        self._transaction_count += 1
+        if self._latency > 0.0:
+            self._sleep(self._latency)
+        if i2caddress != MMC5983MA.i2caddress or \
+                (self._error_rate > 0.0 and self._random.random() < self._error_rate):
+            self._error_count += 1
+            raise OSError(errno.EREMOTEIO, "Remote I/O error")
+
+    def _read_registers(self, register, length):
+        self._update_measurements(self._clock())
+        registers = self._output + [self._temperature_out, self._status, 0, 0, 0]
+        values = [registers[index] if index < len(registers) else
+                  (self.productId if index == self.productIdReg else 0)
+                  for index in range(register, register + length)]
+        # Reading the output clears the done bit, a burst read still returns the status from before
+        if register <= MMC5983MA.Xout0Reg < register + length:
+            self._status &= ~self.measurementDone
+        if register <= MMC5983MA.tempOutReg < register + length:
+            self._status &= ~self.temperatureDone
+        return values
+
+    def _update_measurements(self, now):
+        # Find the last measurement that completed until now
+        measurement_time = None
+        frequency = self.get_measurement_frequency()
+        if self._continuous_start_time is not None and frequency > 0:
+            first_time = self._continuous_start_time + self.get_measurement_duration()
+            if now >= first_time:
+                measurement_time = first_time + math.floor((now - first_time) * frequency) / frequency
+        if self._single_measurement_time is not None and now >= self._single_measurement_time:
+            if measurement_time is None or self._single_measurement_time > measurement_time:
+                measurement_time = self._single_measurement_time
+            self._single_measurement_time = None
+        if measurement_time is None or measurement_time == self._measurement_time:
+            return
+        self._measurement_time = measurement_time
+        self._output = self.encode_magnetometer(*self._waveform(measurement_time))
+        self._status |= self.measurementDone
+
+    @staticmethod
+    def encode_magnetometer(x, y, z):
+        """Encode a field in mG into the 18 bit output registers Xout0 to XYZout2, the inverse of
+        MMC5983MA.decode_magnetometer().
+        """
+        counts = [min(max(int(round((value + 8000.0) / 0.0625)), 0), (1 << 18) - 1) for value in (x, y, z)]
+        output = []
+        for value in counts:
+            output.extend([(value >> 10) & 0xff, (value >> 2) & 0xff])
+        output.append(((counts[0] & 0b11) << 6) | ((counts[1] & 0b11) << 4) | ((counts[2] & 0b11) << 2))
+        return output
@@ -0,0 +1,18 @@
+import os
+
+
+def write_file_atomically(path, data):
+    """Write data to a file so that readers and a power loss either see the old or the new content, never a mix.
+
+    The data is written to a temporary file next to the target file, synced to disk and renamed to the target path.
+
+    Args:
+        path (str): Path of the file to write.
+        data (bytes): New file content.
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
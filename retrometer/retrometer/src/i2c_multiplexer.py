@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+
+class TCA9548A:
+    i2caddress = 0x70
+
+    def __init__(self, i2c_bus, i2caddress=None):
+        """Create a TCA9548A i2c multiplexer object, which connects one of its eight channels to the bus at a time.
+
+        Args:
+            i2c_bus (SMBus): The i2c bus the multiplexer is connected to.
+            i2caddress (int): Address of the multiplexer if it differs from the default 0x70.
+        """
+        self._i2c_bus = i2c_bus
+        if i2caddress is not None:
+            self.i2caddress = i2caddress
+        self._selected_channel = None
+
+    def select_channel(self, channel):
+        '''
+        Connect the given channel to the bus. Does nothing if the channel is already selected.
+        '''
+        if channel != self._selected_channel:
+            self._i2c_bus.write_byte(self.i2caddress, 1 << channel)
+            self._selected_channel = channel
+
+    def get_channel_bus(self, channel):
+        '''
+        Returns a bus object for the devices on one channel, e.g. to pass it to MMC5983MA.
+        '''
+        return MultiplexedBus(self._i2c_bus, self, channel)
+
+
+class MultiplexedBus:
+    def __init__(self, i2c_bus, multiplexer, channel):
+        """Bus that selects its multiplexer channel before each transaction, so that several sensors with the same
+        address can be used on one bus.
+        """
+        self._i2c_bus = i2c_bus
+        self._multiplexer = multiplexer
+        self._channel = channel
+
+    def read_byte_data(self, i2caddress, register):
+        self._multiplexer.select_channel(self._channel)
+        return self._i2c_bus.read_byte_data(i2caddress, register)
+
+    def write_byte_data(self, i2caddress, register, value):
+        self._multiplexer.select_channel(self._channel)
+        return self._i2c_bus.write_byte_data(i2caddress, register, value)
+
+    def read_i2c_block_data(self, i2caddress, register, length):
+        self._multiplexer.select_channel(self._channel)
+        return self._i2c_bus.read_i2c_block_data(i2caddress, register, length)
@@ -1,12 +1,15 @@
 #!/usr/bin/env python
-from smbus import SMBus
+import errno
+import logging
 import time
 
+_logger = logging.getLogger(__name__)
 
 
 class MMC5983MA:
     i2caddress = 0x30
     controlReg0 = 0x09
+    controlReg1 = 0x0a
     controlReg2 = 0x0b
     statusReg = 0x08
     tempOutReg = 0x07
@@ -17,15 +20,86 @@ class MMC5983MA:
     Zout0Reg = 0x04
     Zout1Reg = 0x05
     XYZout2Reg = 0x06
+    # Number of registers from Xout0Reg up to and including statusReg that are read in one burst transaction
+    burstReadLength = 9
+    # Continuous measurement frequencies in Hz and their CM_Freq bits in controlReg2
+    continuousMeasurementFrequencies = {1: 0b001, 10: 0b010, 20: 0b011, 50: 0b100, 100: 0b101, 200: 0b110, 1000: 0b111}
+    # Bandwidths in Hz and their BW bits in controlReg1 and measurement durations in seconds
+    bandwidths = {100: (0b00, 8e-3), 200: (0b01, 4e-3), 400: (0b10, 2e-3), 800: (0b11, 0.5e-3)}
+    # Number of measurements between two automatic set operations and their Prd_set bits in controlReg2
+    setResetIntervals = {25: 0b001, 75: 0b010, 100: 0b011, 250: 0b100, 500: 0b101, 1000: 0b110, 2000: 0b111}
 
-    def __init__(self, i2c_bus):
+    def __init__(self, i2c_bus, use_burst_read=True, measurement_frequency=100, bandwidth=100, set_reset_interval=1):
+        """Create a MMC5983MA magnetometer object and setup the sensor.
+
+        Args:
+            i2c_bus (SMBus): The i2c bus the sensor is connected to.
+            use_burst_read (bool): Read the status and all output registers in one block transaction. Falls back to
+                single byte reads if the bus does not support block reads.
+            measurement_frequency (int): Continuous measurement frequency in Hz, one of continuousMeasurementFrequencies.
+            bandwidth (int): Filter bandwidth in Hz, one of bandwidths. Higher bandwidths measure faster with more noise.
+            set_reset_interval (int): Number of measurements between two automatic set/reset operations that remove the
+                offset after strong magnetic fields. 1 sets/resets at every measurement, 0 disables it. Other values
+                have to be one of setResetIntervals.
+        """
+        if measurement_frequency not in self.continuousMeasurementFrequencies:
+            raise ValueError("Measurement frequency {} Hz is not supported".format(measurement_frequency))
+        if bandwidth not in self.bandwidths:
+            raise ValueError("Bandwidth {} Hz is not supported".format(bandwidth))
+        if set_reset_interval not in (0, 1) and set_reset_interval not in self.setResetIntervals:
+            raise ValueError("Set/reset interval {} is not supported".format(set_reset_interval))
+        if not self.is_frequency_supported(measurement_frequency, bandwidth):
+            raise ValueError("Measurement frequency {} Hz needs a higher bandwidth than {} Hz".format(
+                measurement_frequency, bandwidth))
         self._i2c_bus = i2c_bus
+        self._use_burst_read = use_burst_read
+        self._measurement_frequency = measurement_frequency
+        self._bandwidth = bandwidth
+        self._set_reset_interval = set_reset_interval
+        # Values of a burst read that were fetched together with the status and have not been returned yet
+        self._pending_burst_values = None
         self.setup_sensor()
 
     def read_magnetometer(self):
         '''
         Read the magnetometer values and return them as a tuple (x,y,z).
         '''
+        if self._pending_burst_values is not None:
+            # The values were already read together with the status in is_new_meas_available()
+            values = self._pending_burst_values
+            self._pending_burst_values = None
+            return values
+        if self._use_burst_read:
+            burst_data = self._read_burst()
+            if burst_data is not None:
+                return self._decode_burst(burst_data)
+        return self._read_magnetometer_bytewise()
+
+    def _read_burst(self):
+        '''
+        Read all output registers and the status register in one block transaction. Returns None and switches to single
+        byte reads if the bus does not support block reads.
+        '''
+        try:
+            return self._i2c_bus.read_i2c_block_data(self.i2caddress, self.Xout0Reg, self.burstReadLength)
+        except OSError as error:
+            if error.errno not in (errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL):
+                raise
+        except (AttributeError, NotImplementedError):
+            pass
+        # The bus does not support block reads, use single byte reads from now on
+        self._use_burst_read = False
+        return None
+
+    def _decode_burst(self, data):
+        return self.decode_magnetometer(data[self.Xout0Reg], data[self.Xout1Reg], data[self.Yout0Reg],
+                                        data[self.Yout1Reg], data[self.Zout0Reg], data[self.Zout1Reg],
+                                        data[self.XYZout2Reg])
+
+    def _read_magnetometer_bytewise(self):
+        '''
+        Read the output registers with one transaction per register and decode the magnetometer values.
+        '''
         xout0 = self._i2c_bus.read_byte_data(self.i2caddress, self.Xout0Reg)
         xout1 = self._i2c_bus.read_byte_data(self.i2caddress, self.Xout1Reg)
         xyzout2 = self._i2c_bus.read_byte_data(self.i2caddress, self.XYZout2Reg)
@@ -35,7 +109,13 @@ class MMC5983MA:
         
         zout0 = self._i2c_bus.read_byte_data(self.i2caddress, self.Zout0Reg)
         zout1 = self._i2c_bus.read_byte_data(self.i2caddress, self.Zout1Reg)
-        
+        return self.decode_magnetometer(xout0, xout1, yout0, yout1, zout0, zout1, xyzout2)
+
+    @staticmethod
+    def decode_magnetometer(xout0, xout1, yout0, yout1, zout0, zout1, xyzout2):
+        '''
+        Decode the 18 bit output register values of all three axes and return them as a tuple (x,y,z).
+        '''
         x = ((xout0 << 10) + (xout1 << 2) + ((xyzout2 >> 6) & 0b00000011)) * 0.0625 - 8000.0
         y = ((yout0 << 10) + (yout1 << 2) + ((xyzout2 >> 4) & 0b00000011)) * 0.0625 - 8000.0
         z = ((zout0 << 10) + (zout1 << 2) + ((xyzout2 >> 2) & 0b00000011))* 0.0625 - 8000.0
@@ -51,14 +131,74 @@ class MMC5983MA:
 
     def setup_sensor(self):
         """
-        Setup the sensor to automatically calibrate and to continuously output data
+        Setup the sensor to automatically calibrate and to continuously output data, and wait until the first measurement
+        is ready.
         """
-        controlReg0Data = 0b00100110 # automatic set/reset
+        bandwidth_bits, _ = self.bandwidths[self._bandwidth]
+        self._i2c_bus.write_byte_data(self.i2caddress, self.controlReg1, bandwidth_bits)
+        controlReg0Data = 0b00000110 # measurement done interrupt, temperature measurement
+        if self._set_reset_interval != 0:
+            controlReg0Data |= 0b00100000 # automatic set/reset
         self._i2c_bus.write_byte_data(self.i2caddress, self.controlReg0, controlReg0Data)
-        controlReg2Data = 0b00001101 # no set reset 
-        self._i2c_bus.write_byte_data(self.i2caddress, self.controlReg2, controlReg2Data) 
-        time.sleep(1.0)
+        controlReg2Data = 0b00001000 | self.continuousMeasurementFrequencies[self._measurement_frequency] # continuous measurement
+        if self._set_reset_interval in self.setResetIntervals:
+            controlReg2Data |= 0b10000000 | (self.setResetIntervals[self._set_reset_interval] << 4) # periodic set
+        self._i2c_bus.write_byte_data(self.i2caddress, self.controlReg2, controlReg2Data)
+        # The control registers are write only, keep a copy to change single bits later
+        self._control_reg2 = controlReg2Data
+        self._wait_for_first_measurement()
+
+    def _wait_for_first_measurement(self):
+        '''
+        Poll the status register until the first measurement of the continuous mode is ready, which takes about one
+        measurement period instead of a fixed startup time.
+        '''
+        timeout = 2.0 / self._measurement_frequency + 0.1
+        start = time.monotonic()
+        while not self._i2c_bus.read_byte_data(self.i2caddress, self.statusReg) & 0b00000001:
+            if time.monotonic() - start > timeout:
+                _logger.warning("No measurement ready %.2f s after the magnetometer setup", timeout)
+                return
+            time.sleep(1e-3)
+
+    def set_continuous_measurement_frequency(self, frequency):
+        '''
+        Set the continuous measurement frequency to the lowest supported frequency that is at least the given frequency
+        and return it. Lower frequencies reduce the power consumption of the sensor.
+
+        Args:
+            frequency (float): Minimum measurement frequency in Hz.
+        '''
+        supported_frequencies = [supported_frequency for supported_frequency in sorted(self.continuousMeasurementFrequencies)
+                                 if supported_frequency >= frequency and
+                                 self.is_frequency_supported(supported_frequency, self._bandwidth)]
+        if len(supported_frequencies) == 0:
+            raise ValueError("Measurement frequency {} Hz is not supported".format(frequency))
+        # Replace the CM_Freq bits and keep continuous measurements and the set/reset settings enabled
+        control_reg2 = (self._control_reg2 & ~0b00000111) | self.continuousMeasurementFrequencies[supported_frequencies[0]]
+        if control_reg2 != self._control_reg2:
+            self._i2c_bus.write_byte_data(self.i2caddress, self.controlReg2, control_reg2)
+            self._control_reg2 = control_reg2
+        return supported_frequencies[0]
+
+    @classmethod
+    def is_frequency_supported(cls, frequency, bandwidth):
+        '''
+        Returns true if measurements with the bandwidth are fast enough for the continuous measurement frequency.
+        '''
+        # Each measurement has to finish before the next one starts
+        _, measurement_duration = cls.bandwidths[bandwidth]
+        return frequency * measurement_duration <= 1.0
 
     def is_new_meas_available(self):
+        if self._use_burst_read:
+            # Read the status together with the output registers, so that a following read_magnetometer() call
+            # does not need another i2c transaction
+            burst_data = self._read_burst()
+            if burst_data is not None:
+                status = burst_data[self.statusReg - self.Xout0Reg]
+                if status & 0b00000001:
+                    self._pending_burst_values = self._decode_burst(burst_data)
+                return status & 0b00000011
         status = self._i2c_bus.read_byte_data(self.i2caddress,self.statusReg)
         return status & 0b00000011
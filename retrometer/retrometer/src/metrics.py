@@ -0,0 +1,260 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_logger = logging.getLogger(__name__)
+
+# Histogram buckets in seconds for i2c transactions, detector steps and publishes
+LATENCY_BUCKETS = [50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 2.5e-3, 5e-3, 10e-3, 25e-3, 50e-3, 100e-3, 250e-3, 1.0]
+
+
+class Counter:
+    metric_type = "counter"
+
+    def __init__(self):
+        """Monotonically increasing value. Like all metrics, it should only be updated from one thread, reading it from
+        the server thread is safe.
+        """
+        self.value = 0.0
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+    def set(self, value):
+        """Set the total that is counted elsewhere, e.g. by the sampling scheduler.
+        """
+        self.value = value
+
+    def get_samples(self, name, labels):
+        return [(name, labels, self.value)]
+
+    def get_snapshot(self):
+        return self.value
+
+
+class Gauge(Counter):
+    metric_type = "gauge"
+
+    def __init__(self):
+        """Value that can go up and down.
+        """
+        super().__init__()
+
+
+class Histogram:
+    metric_type = "histogram"
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Distribution of observed values in cumulative buckets, e.g. of latencies.
+
+        Args:
+            buckets (list): Sorted upper bounds of the buckets. An infinite bucket is added.
+        """
+        self._buckets = list(buckets)
+        self._bucket_counts = [0] * (len(self._buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self._bucket_counts[bisect.bisect_left(self._buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_samples(self, name, labels):
+        samples = []
+        cumulative_count = 0
+        for upper_bound, bucket_count in zip(self._buckets + ["+Inf"], self._bucket_counts):
+            cumulative_count += bucket_count
+            samples.append((name + "_bucket", dict(labels, le=str(upper_bound)), cumulative_count))
+        samples.append((name + "_sum", labels, self.sum))
+        samples.append((name + "_count", labels, self.count))
+        return samples
+
+    def get_snapshot(self):
+        return {"count": self.count, "sum": self.sum, "mean": self.sum / self.count if self.count > 0 else None}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """Collection of named metrics that can be rendered in the Prometheus text format.
+        """
+        self._lock = threading.Lock()
+        # name -> (type, help, {label tuple -> metric})
+        self._families = {}
+        self._collectors = []
+
+    def counter(self, name, help_text, **labels):
+        return self._get_or_create(name, help_text, labels, Counter)
+
+    def gauge(self, name, help_text, **labels):
+        return self._get_or_create(name, help_text, labels, Gauge)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, **labels):
+        return self._get_or_create(name, help_text, labels, lambda: Histogram(buckets))
+
+    def add_collector(self, collector):
+        """Register a function that updates metrics right before they are rendered, for values that are already
+        counted elsewhere and should not cost anything per sample.
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        """Returns all metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for name, metric_type, help_text, metrics in self._collect():
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, metric_type))
+            for labels, metric in metrics:
+                for sample_name, sample_labels, value in metric.get_samples(name, labels):
+                    lines.append("{}{} {}".format(sample_name, self._format_labels(sample_labels), repr(float(value))))
+        return "\n".join(lines) + "\n"
+
+    def get_snapshot(self):
+        """Returns all metrics as a json serializable dict, e.g. to publish them to a diagnostics topic.
+        """
+        snapshot = {}
+        for name, _, _, metrics in self._collect():
+            for labels, metric in metrics:
+                snapshot[name + self._format_labels(labels)] = metric.get_snapshot()
+        return snapshot
+
+    def _get_or_create(self, name, help_text, labels, create_metric):
+        with self._lock:
+            if name not in self._families:
+                self._families[name] = (None, help_text, {})
+            metric_type, _, metrics = self._families[name]
+            label_key = tuple(sorted(labels.items()))
+            if label_key not in metrics:
+                metrics[label_key] = create_metric()
+                self._families[name] = (metrics[label_key].metric_type, help_text, metrics)
+            return metrics[label_key]
+
+    def _collect(self):
+        for collector in self._collectors:
+            collector()
+        with self._lock:
+            return [(name, metric_type, help_text, [(dict(label_key), metric) for label_key, metric in metrics.items()])
+                    for name, (metric_type, help_text, metrics) in sorted(self._families.items())]
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        return "{" + ",".join('{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                              for key, value in sorted(labels.items())) + "}"
+
+
+class InstrumentedBus:
+    def __init__(self, i2c_bus, registry, bus_name):
+        """Bus that measures the latency and counts the errors of each i2c transaction. Wrapping the bus only if metrics
+        are enabled keeps the sensor code free of any instrumentation branches.
+
+        Args:
+            i2c_bus (SMBus): The bus to instrument.
+            registry (MetricsRegistry): Registry for the metrics.
+            bus_name (str): Label to distinguish the buses.
+        """
+        self._i2c_bus = i2c_bus
+        self._latencies = {operation: registry.histogram("retrometer_i2c_transaction_seconds",
+                                                         "Duration of i2c transactions", bus=bus_name,
+                                                         operation=operation)
+                           for operation in ["read_byte_data", "write_byte_data", "read_i2c_block_data", "write_byte"]}
+        self._errors = registry.counter("retrometer_i2c_errors_total", "Failed i2c transactions", bus=bus_name)
+
+    def read_byte_data(self, i2caddress, register):
+        return self._call("read_byte_data", i2caddress, register)
+
+    def write_byte_data(self, i2caddress, register, value):
+        return self._call("write_byte_data", i2caddress, register, value)
+
+    def read_i2c_block_data(self, i2caddress, register, length):
+        return self._call("read_i2c_block_data", i2caddress, register, length)
+
+    def write_byte(self, i2caddress, value):
+        return self._call("write_byte", i2caddress, value)
+
+    def _call(self, operation, *args):
+        start = time.perf_counter()
+        try:
+            return getattr(self._i2c_bus, operation)(*args)
+        except OSError:
+            self._errors.inc()
+            raise
+        finally:
+            self._latencies[operation].observe(time.perf_counter() - start)
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are too frequent for the add-on log
+        _logger.debug(format, *args)
+
+
+class MetricsServer:
+    def __init__(self, registry, port, host="127.0.0.1"):
+        """Create a http server that serves the metrics of a registry at /metrics in its own thread.
+
+        Args:
+            registry (MetricsRegistry): Registry to serve.
+            port (int): Port to listen on. 0 picks a free port, see get_port().
+            host (str): Address to listen on.
+        """
+        self._server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+        self._server.daemon_threads = True
+        self._server.registry = registry
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        _logger.info("Serving metrics on port %d", self.get_port())
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def get_port(self):
+        return self._server.server_address[1]
+
+
+class DiagnosticsPublisher:
+    def __init__(self, client, topic, registry, interval=60.0, clock=time.monotonic):
+        """Create a publisher that periodically publishes a json snapshot of all metrics to a mqtt topic.
+
+        Args:
+            client (mqtt.Client): Paho mqtt client.
+            topic (str): Diagnostics topic.
+            registry (MetricsRegistry): Registry to publish.
+            interval (float): Time between two publishes in seconds.
+            clock (callable): Monotonic clock returning seconds.
+        """
+        self._client = client
+        self._topic = topic
+        self._registry = registry
+        self._interval = interval
+        self._clock = clock
+        self._last_publish_time = clock()
+
+    def poll(self):
+        """Publish the snapshot if the interval has passed. Cheap enough to be called for every sample.
+        """
+        now = self._clock()
+        if now - self._last_publish_time < self._interval:
+            return
+        self._last_publish_time = now
+        # Diagnostics are only interesting while they are fresh, so they are neither retained nor retried
+        self._client.publish(self._topic, json.dumps(self._registry.get_snapshot()), qos=0, retain=False)
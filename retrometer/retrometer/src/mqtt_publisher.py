@@ -0,0 +1,211 @@
+import collections
+import json
+import logging
+import os
+import threading
+import time
+from src.file_utils import write_file_atomically
+
+_logger = logging.getLogger(__name__)
+
+# Return codes of paho.mqtt, duplicated here so that this module can be used without paho
+MQTT_ERR_SUCCESS = 0
+MQTT_ERR_NO_CONN = 4
+
+
+class _QueueEntry:
+    __slots__ = ("payload", "mid", "publish_time", "queue_time")
+
+    def __init__(self, payload, queue_time, mid=None):
+        self.payload = payload
+        # Message id of the pending publish, None if the entry still has to be published
+        self.mid = mid
+        # Clock time of the last publish attempt, to measure the time until the broker acknowledged it
+        self.publish_time = None
+        # Clock time at which the entry was queued, to find updates that were not acknowledged for long
+        self.queue_time = queue_time
+
+
+class CoalescingPublisher:
+    def __init__(self, client, topic, coalesce_interval=1.0, queue_path=None, max_queue_length=1000,
+                 persist_interval=10.0, qos=1, retain=True, clock=time.monotonic, metrics=None):
+        """Create a publisher that merges updates within an interval and buffers them until the broker acknowledged them.
+
+        The on_publish() method has to be registered as the on_publish callback of the client.
+
+        Args:
+            client (mqtt.Client): Connected paho mqtt client.
+            topic (str): Topic to publish to.
+            coalesce_interval (float): Minimum time between two publishes in seconds. Only the latest update within the
+                interval is published.
+            queue_path (str): File to persist unacknowledged updates to, so that they survive restarts. Updates are only
+                kept in memory if None.
+            max_queue_length (int): Maximum number of unacknowledged updates. The oldest update is dropped when full.
+            persist_interval (float): Minimum time between two writes of the queue file in seconds. Updates are only
+                written once they were not acknowledged for this time, so that a connected broker causes no writes to
+                the flash memory.
+            qos (int): Mqtt quality of service of the publishes.
+            retain (bool): Publish as retained message, so that new subscribers get the latest state.
+            clock (callable): Monotonic clock returning seconds.
+            metrics (MetricsRegistry): Optional registry for the publish latency and queue metrics.
+        """
+        self._client = client
+        self._topic = topic
+        self._coalesce_interval = coalesce_interval
+        self._queue_path = queue_path
+        self._persist_interval = persist_interval
+        self._qos = qos
+        self._retain = retain
+        self._clock = clock
+
+        # The queue is only changed by the sampling loop, the lock protects it against readers in other threads. The
+        # network thread of the client only appends the acknowledged message ids, since it holds the mutex of the client
+        # while calling on_publish() and the client takes that mutex in publish()
+        self._lock = threading.Lock()
+        self._queue = collections.deque(maxlen=max_queue_length)
+        self._acknowledged = collections.deque()
+        self._pending_payload = None
+        self._last_publish_time = None
+        self._is_queue_dirty = False
+        self._last_persist_time = None
+        self._is_queue_persisted = False
+        self._dropped_count = 0
+
+        self._metrics = metrics
+        if metrics is not None:
+            self._publish_latency = metrics.histogram(
+                "retrometer_publish_seconds", "Duration of handing a message to the mqtt client", topic=topic)
+            self._acknowledge_latency = metrics.histogram(
+                "retrometer_publish_acknowledge_seconds", "Time from publishing until the broker acknowledged",
+                buckets=[0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, 600.0], topic=topic)
+            queue_length = metrics.gauge("retrometer_publish_queue_length", "Unacknowledged updates", topic=topic)
+            dropped = metrics.counter("retrometer_publish_dropped_total", "Updates dropped from the full queue",
+                                      topic=topic)
+
+            def collect():
+                queue_length.set(self.get_queue_length())
+                dropped.set(self._dropped_count)
+            metrics.add_collector(collect)
+
+        self._load_queue()
+
+    def update(self, payload):
+        """Set the latest state to publish. It is published when the coalesce interval since the last publish has passed.
+
+        Args:
+            payload (dict): Json serializable state.
+        """
+        self._pending_payload = json.dumps(payload)
+        self.poll()
+
+    def poll(self):
+        """Publish a pending update if it is due, retry failed publishes and persist the queue. Should be called regularly.
+        """
+        self._poll(is_flushing=False)
+
+    def on_publish(self, client, userdata, mid):
+        """Paho on_publish callback, the acknowledged update is removed from the queue by the next poll.
+        """
+        self._acknowledged.append((mid, self._clock()))
+
+    def flush(self):
+        """Publish a pending update regardless of the coalesce interval and persist the queue, e.g. before shutdown.
+        """
+        self._last_publish_time = None
+        self._poll(is_flushing=True)
+
+    def get_queue_length(self):
+        with self._lock:
+            return len(self._queue)
+
+    def get_dropped_count(self):
+        return self._dropped_count
+
+    def _poll(self, is_flushing):
+        now = self._clock()
+        with self._lock:
+            if self._pending_payload is not None and \
+                    (self._last_publish_time is None or now - self._last_publish_time >= self._coalesce_interval):
+                if len(self._queue) == self._queue.maxlen:
+                    self._dropped_count += 1
+                    _logger.warning("Publish queue full, dropping the oldest update")
+                self._queue.append(_QueueEntry(self._pending_payload, now))
+                self._pending_payload = None
+                self._last_publish_time = now
+                self._is_queue_dirty = True
+            unpublished_entries = [entry for entry in self._queue if entry.mid is None]
+
+        # Publishing without the lock, the client may call on_publish() before publish() returns
+        mids = [self._publish(entry) for entry in unpublished_entries]
+
+        with self._lock:
+            for entry, mid in zip(unpublished_entries, mids):
+                entry.mid = mid
+            self._remove_acknowledged()
+
+            if self._is_queue_dirty and (is_flushing or self._is_persist_due(now)):
+                self._persist_queue()
+                self._last_persist_time = now
+
+    def _is_persist_due(self, now):
+        if self._last_persist_time is not None and now - self._last_persist_time < self._persist_interval:
+            return False
+        # A queue file from before has to follow the queue, otherwise only updates that were not acknowledged within
+        # the persist interval are written, e.g. while the broker is disconnected
+        return self._is_queue_persisted or \
+            any(now - entry.queue_time >= self._persist_interval for entry in self._queue)
+
+    def _publish(self, entry):
+        """Hand the entry to the client and return the message id, None if it has to be published again.
+        """
+        entry.publish_time = self._clock()
+        info = self._client.publish(
+            self._topic, entry.payload, qos=self._qos, retain=self._retain)
+        if self._metrics is not None:
+            self._publish_latency.observe(self._clock() - entry.publish_time)
+        if info.rc in (MQTT_ERR_SUCCESS, MQTT_ERR_NO_CONN):
+            # Paho sends messages with qos > 0 that were published while disconnected after reconnecting
+            return info.mid
+        _logger.warning("Publishing to %s failed with result code %s, retrying later", self._topic, info.rc)
+        return None
+
+    def _remove_acknowledged(self):
+        # The client calls on_publish() of every publisher, so message ids of other topics are dropped here. The ids of
+        # this publisher are all known, since the ids were assigned before the acknowledgements were taken
+        entries = {entry.mid: entry for entry in self._queue if entry.mid is not None}
+        while self._acknowledged:
+            mid, acknowledge_time = self._acknowledged.popleft()
+            entry = entries.pop(mid, None)
+            if entry is None:
+                continue
+            if self._metrics is not None:
+                self._acknowledge_latency.observe(acknowledge_time - entry.publish_time)
+            self._queue.remove(entry)
+            self._is_queue_dirty = True
+
+    def _load_queue(self):
+        if self._queue_path is None or not os.path.exists(self._queue_path):
+            return
+        try:
+            with open(self._queue_path, "rb") as file:
+                payloads = json.loads(file.read().decode("utf-8"))["payloads"]
+        except (OSError, ValueError, KeyError) as error:
+            _logger.warning("Ignoring unreadable publish queue %s: %s", self._queue_path, error)
+            return
+        # Updates from a previous run have to be published again
+        now = self._clock()
+        self._queue.extend(_QueueEntry(payload, now) for payload in payloads)
+        self._is_queue_persisted = True
+
+    def _persist_queue(self):
+        self._is_queue_dirty = False
+        if self._queue_path is None:
+            return
+        if len(self._queue) == 0:
+            if os.path.exists(self._queue_path):
+                os.remove(self._queue_path)
+            self._is_queue_persisted = False
+            return
+        data = json.dumps({"payloads": [entry.payload for entry in self._queue]})
+        write_file_atomically(self._queue_path, data.encode("utf-8"))
+        self._is_queue_persisted = True
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+import time
+from src.tick_detector_array import ScalarPeriodCounterArray
+
+
+class MultiRetroMeter:
+    def __init__(self, magnetometers, mag_axes, max_period_length, min_amplitude, max_amplitude, min_std,
+                 telemetries=None, sample_recorders=None, metrics=None, names=None, tick_stores=None,
+                 activation_threshold_ratio=0.8, deactivation_threshold_ratio=0.7, calibration_mode="window"):
+        """Create a retro meter object for several meters with one magnetometer each, sampled together in one process.
+
+        Args:
+            magnetometers (list): One magnetometer per meter.
+            mag_axes (list): One of "x", "y", "z" per meter. Selects which magnetometer axis to use for counting.
+            telemetries (list): Optional telemetry per meter, None entries disable the telemetry of a meter.
+            sample_recorders (list): Optional sample recorder per meter, None entries disable the recording of a meter.
+            metrics (MetricsRegistry): Optional registry for the detector cost and state metrics.
+            names (list): Names of the meters in the metrics. Defaults to the meter indices.
+            tick_stores (list): Optional tick store per meter, None entries disable the tick log of a meter.
+            activation_threshold_ratio (float): Part of the calibrated range at which a tick is counted.
+            deactivation_threshold_ratio (float): Part of the calibrated range below which the next tick can start.
+            calibration_mode (str): Calibration mode of the detector, see CALIBRATION_MODES.
+        """
+        self._magnetometers = magnetometers
+        self._axis_indices = ["xyz".index(mag_axis) for mag_axis in mag_axes]
+        self._period_counter = ScalarPeriodCounterArray(
+            len(magnetometers), max_period_length, min_amplitude, max_amplitude, min_std,
+            activation_threshold_ratio=activation_threshold_ratio,
+            deactivation_threshold_ratio=deactivation_threshold_ratio, calibration_mode=calibration_mode)
+        self._telemetries = telemetries or [None] * len(magnetometers)
+        self._sample_recorders = sample_recorders or [None] * len(magnetometers)
+        self._tick_stores = tick_stores or [None] * len(magnetometers)
+        self._scalars = [0.0] * len(magnetometers)
+
+        # The detector step is chosen once, so that disabled metrics cost nothing per sample
+        self._record_scalars = self._period_counter.record_scalars
+        if metrics is not None:
+            names = names or [str(index) for index in range(len(magnetometers))]
+            # One detector step serves all meters
+            self._detector_latency = metrics.histogram(
+                "retrometer_detector_seconds", "Duration of one detector step", meter="all")
+            self._count_gauges = [metrics.gauge("retrometer_count", "Counted meter ticks", meter=name)
+                                  for name in names]
+            self._calibration_gauges = [metrics.gauge("retrometer_calibration_progress_percent",
+                                                      "Calibration confirmation progress", meter=name)
+                                        for name in names]
+            self._record_scalars = self._record_scalars_with_metrics
+
+    def is_count_updated(self):
+        """
+        Returns true if any of the magnetometers has a new measurement.
+        """
+        is_updated = False
+        for magnetometer in self._magnetometers:
+            # Check all magnetometers, so that burst reads fetch the values of all of them
+            if magnetometer.is_new_meas_available():
+                is_updated = True
+        return is_updated
+
+    def update_and_get_meter_ticks(self, timestamp=None):
+        """
+        Update all meters with one measurement of each magnetometer and return the list of tick counts.
+
+        Args:
+            timestamp (float): Monotonic time at which the measurements were available. The current time is used if None.
+        """
+        return self.process_sample(self.read_sample(), timestamp)
+
+    def read_sample(self):
+        """
+        Read and record one measurement of each magnetometer and return them as list of tuples (x, y, z).
+        """
+        samples = [magnetometer.read_magnetometer() for magnetometer in self._magnetometers]
+        timestamp = time.monotonic()
+        for index, sample in enumerate(samples):
+            if self._sample_recorders[index] is not None:
+                self._sample_recorders[index].record(timestamp, *sample)
+        return samples
+
+    def process_sample(self, samples, timestamp=None):
+        """
+        Update all meters with measurements returned by read_sample() and return the list of tick counts.
+
+        Args:
+            samples (list): One magnetometer measurement (x, y, z) per meter.
+            timestamp (float): Monotonic time at which the measurements were available. The current time is used if None.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        for index, sample in enumerate(samples):
+            self._scalars[index] = sample[self._axis_indices[index]]
+
+        self._record_scalars(self._scalars, timestamp)
+        counts = self._period_counter.get_counts().tolist()
+
+        for index, tick_store in enumerate(self._tick_stores):
+            if tick_store is not None:
+                tick_store.record_count(counts[index])
+
+        for index, telemetry in enumerate(self._telemetries):
+            if telemetry is not None:
+                telemetry.record_sample(timestamp, counts[index], *samples[index])
+        return counts
+
+    def _record_scalars_with_metrics(self, scalars, timestamp):
+        start = time.perf_counter()
+        self._period_counter.record_scalars(scalars, timestamp)
+        self._detector_latency.observe(time.perf_counter() - start)
+        for gauge, count in zip(self._count_gauges, self._period_counter.get_counts()):
+            gauge.set(int(count))
+        for gauge, percentage in zip(self._calibration_gauges,
+                                     self._period_counter.get_calibration_progress_percentages()):
+            gauge.set(int(percentage))
+
+    def get_readings(self):
+        """
+        Returns the latest readings as list with one dict per meter, with the same entries as RetroMeter.get_readings().
+        """
+        return [{"count": count, "fractional_count": fractional_count, "flow_rate": flow_rate}
+                for count, fractional_count, flow_rate in zip(self._period_counter.get_counts().tolist(),
+                                                              self._period_counter.get_fractional_counts().tolist(),
+                                                              self._period_counter.get_flow_rates().tolist())]
+
+    def get_state(self, timestamp=None):
+        """
+        Returns the detector states of all meters as a json serializable list that can be stored in a checkpoint.
+        """
+        return [self._period_counter.get_state(index, timestamp)
+                for index in range(self._period_counter.get_meter_count())]
+
+    def restore_state(self, state, timestamp=None, restore_calibration=True):
+        """
+        Restore the detector states of all meters from a checkpoint.
+        """
+        for index, meter_state in enumerate(state):
+            self._period_counter.restore_state(index, meter_state, timestamp, restore_calibration)
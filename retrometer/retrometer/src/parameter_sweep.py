@@ -0,0 +1,160 @@
+import concurrent.futures
+import csv
+import itertools
+import math
+import os
+import random
+import numpy as np
+from src.sample_recorder import open_recording
+from src.tick_detector import ScalarPeriodCounter
+
+# Tuned detector parameters and the add-on options they are fed back into
+PARAMETER_OPTIONS = {
+    "max_period_time": "maxperiodtime",
+    "min_amplitude": "minamplitude",
+    "min_std": "minstd",
+    "activation_threshold_ratio": "activationratio",
+    "deactivation_threshold_ratio": "deactivationratio",
+}
+
+# Traces of the worker process, loaded once by the pool initializer instead of being sent with every task
+_worker_traces = None
+
+
+def load_trace(paths, ticks, axis=None):
+    """Load the recordings of one trace into memory and return it as dict with the name, sample_time, timestamps,
+    scalars and the ground truth ticks.
+
+    Args:
+        paths (list): Recording files of the trace in the order they were written.
+        ticks (int): Number of ticks of the meter during the trace, e.g. read from the meter display.
+        axis (str): Magnetometer axis to count on. Defaults to the axis in the header of the first recording.
+    """
+    sample_time = None
+    timestamps = []
+    scalars = []
+    for path in paths:
+        recording_sample_time, sensor_config, samples = open_recording(path)
+        if sample_time is None:
+            sample_time = recording_sample_time
+            axis = axis or sensor_config.get("mag_axis", "x")
+        timestamps.append(np.array(samples["timestamp"]))
+        scalars.append(np.array(samples[axis]))
+    return {"name": paths[0], "sample_time": sample_time, "timestamps": np.concatenate(timestamps),
+            "scalars": np.concatenate(scalars), "ticks": ticks}
+
+
+def create_grid(parameter_values):
+    """Returns all combinations of the parameter values as list of dicts. Combinations with an activation threshold
+    ratio that is not above the deactivation threshold ratio are left out.
+
+    Args:
+        parameter_values (dict): Parameter name -> list of values, see PARAMETER_OPTIONS.
+    """
+    names = list(parameter_values)
+    candidates = [dict(zip(names, values)) for values in itertools.product(*parameter_values.values())]
+    return [candidate for candidate in candidates if _is_valid(candidate)]
+
+
+def create_random(parameter_ranges, count, seed=None):
+    """Returns count random parameter sets as list of dicts, each parameter drawn uniformly between the smallest and the
+    largest of its values.
+
+    Args:
+        parameter_ranges (dict): Parameter name -> list of values that spans the range.
+        count (int): Number of parameter sets.
+        seed (int): Optional seed for reproducible sweeps.
+    """
+    if not _is_valid({name: max(values) if name == "activation_threshold_ratio" else min(values)
+                      for name, values in parameter_ranges.items()}):
+        raise ValueError("The activation threshold ratio range has to reach above the deactivation threshold ratio range")
+    generator = random.Random(seed)
+    candidates = []
+    while len(candidates) < count:
+        candidate = {name: generator.uniform(min(values), max(values))
+                     for name, values in parameter_ranges.items()}
+        if _is_valid(candidate):
+            candidates.append(candidate)
+    return candidates
+
+
+def evaluate(parameters, traces, max_amplitude=8000):
+    """Count the ticks of all traces with one parameter set and return the parameters with the count errors and the time
+    to the first count.
+
+    Args:
+        parameters (dict): Detector parameters, see PARAMETER_OPTIONS. Missing parameters use the detector defaults.
+        traces (list): Traces from load_trace().
+        max_amplitude (float): Maximum amplitude for the calibration.
+    """
+    count_errors = []
+    first_count_times = []
+    for trace in traces:
+        counter = ScalarPeriodCounter(
+            int(parameters.get("max_period_time", 1.0) / trace["sample_time"]), parameters.get("min_amplitude", 20),
+            max_amplitude, parameters.get("min_std", 50),
+            activation_threshold_ratio=parameters.get("activation_threshold_ratio", 0.8),
+            deactivation_threshold_ratio=parameters.get("deactivation_threshold_ratio", 0.7))
+        counts = counter.record_batch(trace["scalars"], trace["timestamps"])
+        count = int(counts[-1]) if len(counts) > 0 else 0
+        count_errors.append(count - trace["ticks"])
+        counted = np.flatnonzero(counts > 0)
+        first_count_times.append(
+            float(trace["timestamps"][counted[0]] - trace["timestamps"][0]) if len(counted) > 0 else math.inf)
+    return dict(parameters,
+                count_error=int(sum(abs(count_error) for count_error in count_errors)),
+                max_count_error=int(max(abs(count_error) for count_error in count_errors)),
+                time_to_first_count=float(np.mean(first_count_times)))
+
+
+def run_sweep(candidates, trace_specs, axis=None, max_workers=None):
+    """Evaluate all parameter sets in a process pool and return the results ranked by the total count error and then by
+    the mean time to the first count.
+
+    Args:
+        candidates (list): Parameter sets from create_grid() or create_random().
+        trace_specs (list): Tuples (paths, ticks) of the traces, see load_trace().
+        axis (str): Optional magnetometer axis to count on.
+        max_workers (int): Number of processes. Defaults to the number of cores.
+    """
+    max_workers = max_workers or os.cpu_count()
+    # Several parameter sets per task keep the inter process traffic small compared to the counting
+    chunk_size = max(1, len(candidates) // (4 * max_workers))
+    with concurrent.futures.ProcessPoolExecutor(max_workers, initializer=_load_worker_traces,
+                                                initargs=(trace_specs, axis)) as executor:
+        results = list(executor.map(_evaluate_in_worker, candidates, chunksize=chunk_size))
+    return rank(results)
+
+
+def rank(results):
+    return sorted(results, key=lambda result: (result["count_error"], result["time_to_first_count"]))
+
+
+def write_table(results, file):
+    """Write ranked results as csv table with one row per parameter set. The parameter columns are named like the add-on
+    options, so that the best row can be copied into the add-on configuration.
+    """
+    parameter_names = [name for name in PARAMETER_OPTIONS if any(name in result for result in results)]
+    writer = csv.writer(file)
+    writer.writerow(["rank"] + [PARAMETER_OPTIONS[name] for name in parameter_names] +
+                    ["count_error", "max_count_error", "time_to_first_count"])
+    for index, result in enumerate(results):
+        writer.writerow([index + 1] + [_format_value(result.get(name)) for name in parameter_names] +
+                        [result["count_error"], result["max_count_error"], _format_value(result["time_to_first_count"])])
+
+
+def _is_valid(parameters):
+    return parameters.get("activation_threshold_ratio", 0.8) > parameters.get("deactivation_threshold_ratio", 0.7)
+
+
+def _format_value(value):
+    return "{:.4g}".format(value) if isinstance(value, float) else value
+
+
+def _load_worker_traces(trace_specs, axis):
+    global _worker_traces
+    _worker_traces = [load_trace(paths, ticks, axis) for paths, ticks in trace_specs]
+
+
+def _evaluate_in_worker(parameters):
+    return evaluate(parameters, _worker_traces)
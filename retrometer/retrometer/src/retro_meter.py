@@ -5,7 +5,10 @@ from src.tick_detector import ScalarPeriodCounter
 
 
 class RetroMeter:
-    def __init__(self, magnetometer, mag_axis, max_period_length, min_amplitude, max_amplitude, min_std, is_verbose=False):
+    def __init__(self, magnetometer, mag_axis, max_period_length, min_amplitude, max_amplitude, min_std, telemetry=None,
+                 sample_recorder=None, rate_controller=None, backend="python", metrics=None, name="gas",
+                 tick_store=None, activation_threshold_ratio=0.8, deactivation_threshold_ratio=0.7,
+                 calibration_mode="window"):
         """Create a retro meter object.
 
         Args:
@@ -13,15 +16,44 @@ class RetroMeter:
             mag_axis (String): One of "x", "y", "z". Selects which magnetometer axis to use for counting.
             expected_axis_min (float): _description_
             expected_axis_max (float): _description_
+            telemetry (Telemetry): Optional telemetry that keeps track of the recent samples.
+            sample_recorder (SampleRecorder): Optional recorder that stores all raw magnetometer samples.
+            rate_controller (AdaptiveRateController): Optional controller that lowers the sample rate while the meter is idle.
+            backend (str): Detector backend, "python" or "numpy", see ScalarPeriodCounter.
+            metrics (MetricsRegistry): Optional registry for the detector cost and state metrics.
+            name (str): Name of the meter in the metrics.
+            tick_store (TickStore): Optional store that logs the time of every tick.
+            activation_threshold_ratio (float): Part of the calibrated range at which a tick is counted.
+            deactivation_threshold_ratio (float): Part of the calibrated range below which the next tick can start.
+            calibration_mode (str): Calibration mode of the detector, see CALIBRATION_MODES.
         """
         self._magnetometer = magnetometer
 
         # initialize the period counter with expected magx min and max values
-        self._period_counter = ScalarPeriodCounter( max_period_length, min_amplitude, max_amplitude, min_std)
+        self._period_counter = ScalarPeriodCounter( max_period_length, min_amplitude, max_amplitude, min_std,
+                                                    backend=backend,
+                                                    activation_threshold_ratio=activation_threshold_ratio,
+                                                    deactivation_threshold_ratio=deactivation_threshold_ratio,
+                                                    calibration_mode=calibration_mode)
         self._mag_axis = mag_axis
 
-        # configure printing
-        self._is_verbose = is_verbose
+        self._telemetry = telemetry
+
+        self._sample_recorder = sample_recorder
+
+        self._rate_controller = rate_controller
+
+        self._tick_store = tick_store
+
+        # The detector step is chosen once, so that disabled metrics cost nothing per sample
+        self._record_scalar = self._period_counter.record_scalar
+        if metrics is not None:
+            self._detector_latency = metrics.histogram(
+                "retrometer_detector_seconds", "Duration of one detector step", meter=name)
+            self._count_gauge = metrics.gauge("retrometer_count", "Counted meter ticks", meter=name)
+            self._calibration_gauge = metrics.gauge(
+                "retrometer_calibration_progress_percent", "Calibration confirmation progress", meter=name)
+            self._record_scalar = self._record_scalar_with_metrics
 
     def is_count_updated(self):
         """
@@ -29,18 +61,87 @@ class RetroMeter:
         """
         return self._magnetometer.is_new_meas_available()
 
-    def update_and_get_meter_ticks(self):
+    def update_and_get_meter_ticks(self, timestamp=None):
         """
         Update and get the current number of meter ticks. Should only be called when is_count_updated() returns true. 
+
+        Args:
+            timestamp (float): Monotonic time at which the measurement was available. The current time is used if None.
+        """
+        return self.process_sample(self.read_sample(), timestamp)
+
+    def read_sample(self):
+        """
+        Read and record one magnetometer measurement and return it as tuple (x, y, z). Together with process_sample() this
+        splits update_and_get_meter_ticks() into the i2c part and the detection part, so that both can run in different
+        threads.
+        """
+        if self._rate_controller is not None:
+            # Change the sensor rate in the thread that reads the sensor
+            self._rate_controller.apply()
+        sample = self._magnetometer.read_magnetometer()
+        if self._sample_recorder is not None:
+            self._sample_recorder.record(time.monotonic(), *sample)
+        return sample
+
+    def process_sample(self, sample, timestamp=None):
+        """
+        Update the meter ticks with a measurement returned by read_sample() and return the current number of meter ticks.
+
+        Args:
+            sample (tuple): Magnetometer measurement (x, y, z).
+            timestamp (float): Monotonic time at which the measurement was available. The current time is used if None.
         """
-        (x,y,z) = self._magnetometer.read_magnetometer()
+        if timestamp is None:
+            timestamp = time.monotonic()
+        (x,y,z) = sample
         mag_dict = {"x": x, "y": y, "z" : z}
-        self._period_counter.record_scalar(mag_dict[self._mag_axis])
+        self._record_scalar(mag_dict[self._mag_axis], timestamp)
         count = self._period_counter.get_count()
+        if self._rate_controller is not None:
+            self._rate_controller.input(mag_dict[self._mag_axis], timestamp)
 
-        if self._is_verbose:
-            print("Count: {}, x: {:10.3f}, y: {:10.3f}, z: {:10.3f}".format(count, x,y,z))
+        if self._tick_store is not None:
+            self._tick_store.record_count(count)
+
+        if self._telemetry is not None:
+            self._telemetry.record_sample(timestamp, count, x, y, z)
         return count
 
+    def _record_scalar_with_metrics(self, scalar, timestamp):
+        start = time.perf_counter()
+        self._period_counter.record_scalar(scalar, timestamp)
+        self._detector_latency.observe(time.perf_counter() - start)
+        self._count_gauge.set(self._period_counter.get_count())
+        self._calibration_gauge.set(self._period_counter.get_calibration_progress_percentage())
 
+    def get_readings(self):
+        """
+        Returns the latest readings as list with one dict for the meter. Besides the integer count, it contains the
+        fractional count that is interpolated from the phase of the magnetic signal and the smoothed flow rate in ticks
+        per second, see ScalarPeriodCounter.get_fractional_count().
+        """
+        return [{"count": self._period_counter.get_count(),
+                 "fractional_count": self._period_counter.get_fractional_count(),
+                 "flow_rate": self._period_counter.get_flow_rate()}]
 
+    def get_state(self, timestamp=None):
+        """
+        Returns the detector state as a json serializable dict that can be stored in a checkpoint.
+        """
+        return self._period_counter.get_state(timestamp)
+
+    def restore_state(self, state, timestamp=None, restore_calibration=True):
+        """
+        Restore a detector state from a checkpoint, see ScalarPeriodCounter.restore_state().
+        """
+        self._period_counter.restore_state(state, timestamp, restore_calibration)
+
+    def replay_samples(self, samples):
+        """
+        Update the meter ticks with recorded samples instead of magnetometer readings and return the count after each sample.
+
+        Args:
+            samples (np.ndarray): Structured array with the fields timestamp, x, y and z, e.g. from open_recording().
+        """
+        return self._period_counter.record_batch(samples[self._mag_axis], samples["timestamp"])
@@ -0,0 +1,137 @@
+import json
+import os
+import struct
+import time
+
+
+class SampleRecorder:
+    # Every recording file starts with a fixed size header, followed by fixed width sample records
+    file_magic = b"RMSAMPLE"
+    file_version = 2
+    file_extension = ".rms"
+    # magic, version, header length, sample time and since version 2 the unix time and monotonic time of the file start
+    header_formats = {1: "<8sHHd", 2: "<8sHHddd"}
+    header_format = header_formats[file_version]
+    header_length = 512
+    sample_format = "<dfff"  # monotonic timestamp, x, y, z
+    sample_dtype = [("timestamp", "<f8"), ("x", "<f4"), ("y", "<f4"), ("z", "<f4")]
+
+    def __init__(self, directory, sample_time, sensor_config, max_file_size=64*1024*1024, max_file_count=None,
+                 file_prefix="samples"):
+        """Create a recorder that appends timestamped raw magnetometer samples to compact binary files. The samples have
+        monotonic timestamps like the detector, the header of each file stores the unix time that belongs to a monotonic
+        time at its start, see read_header().
+
+        Args:
+            directory (str): Directory the recording files are written to. It is created if it does not exist.
+            sample_time (float): Nominal time between two samples in seconds.
+            sensor_config (dict): Sensor and detector configuration that is stored in the file header.
+            max_file_size (int): A new file is started when the current file would grow beyond this size in bytes.
+            max_file_count (int): The oldest recording files in the directory are deleted when there are more files.
+                All files are kept if None.
+            file_prefix (str): Prefix of the recording file names.
+        """
+        self._directory = directory
+        self._sample_time = sample_time
+        self._sensor_config = sensor_config
+        self._file_prefix = file_prefix
+        self._sample_struct = struct.Struct(self.sample_format)
+        assert max_file_size >= self.header_length + self._sample_struct.size
+        self._max_file_size = max_file_size
+        self._max_file_count = max_file_count
+        self._file = None
+        self._file_size = 0
+        self._file_index = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, timestamp, x, y, z):
+        """Append one sample to the current recording file and start a new file if the size limit is reached.
+
+        Args:
+            timestamp (float): Monotonic time of the sample in seconds.
+            x (float): Magnetometer value of the x axis.
+            y (float): Magnetometer value of the y axis.
+            z (float): Magnetometer value of the z axis.
+        """
+        if self._file is None or self._file_size + self._sample_struct.size > self._max_file_size:
+            self._open_next_file()
+        self._file.write(self._sample_struct.pack(timestamp, x, y, z))
+        self._file_size += self._sample_struct.size
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def get_current_path(self):
+        return None if self._file is None else self._file.name
+
+    def _open_next_file(self):
+        self.close()
+        file_name = "{}-{}-{:04d}{}".format(self._file_prefix, time.strftime("%Y%m%d-%H%M%S"),
+                                            self._file_index, self.file_extension)
+        self._file_index += 1
+        self._file = open(os.path.join(self._directory, file_name), "wb")
+        self._file.write(self.pack_header(self._sample_time, self._sensor_config, time.time(), time.monotonic()))
+        self._file_size = self.header_length
+        if self._max_file_count is not None:
+            for path in list_recordings(self._directory)[:-self._max_file_count]:
+                os.remove(path)
+
+    @classmethod
+    def pack_header(cls, sample_time, sensor_config, start_unix_time, start_timestamp):
+        config = json.dumps(sensor_config).encode("utf-8")
+        header = struct.pack(cls.header_format, cls.file_magic, cls.file_version, cls.header_length,
+                             sample_time, start_unix_time, start_timestamp) + config
+        if len(header) > cls.header_length:
+            raise ValueError("sensor config does not fit into the recording file header")
+        return header.ljust(cls.header_length, b"\0")
+
+    @classmethod
+    def read_header(cls, path):
+        """Read the header of a recording file and return a tuple (sample_time, sensor_config, header_length,
+        start_unix_time, start_timestamp). The unix time of a sample is start_unix_time + timestamp - start_timestamp.
+        Version 1 recordings have unix timestamps, their start times are 0.
+        """
+        with open(path, "rb") as file:
+            header = file.read(cls.header_length)
+        if len(header) < struct.calcsize(cls.header_formats[1]):
+            raise ValueError("{} is not a sample recording".format(path))
+        magic, version = struct.unpack_from("<8sH", header)
+        if magic != cls.file_magic:
+            raise ValueError("{} is not a sample recording".format(path))
+        if version not in cls.header_formats:
+            raise ValueError(
+                "{} has unsupported recording version {}".format(path, version))
+        header_format = cls.header_formats[version]
+        _, _, header_length, sample_time, *start_times = struct.unpack_from(header_format, header)
+        start_unix_time, start_timestamp = start_times or (0.0, 0.0)
+        config = header[struct.calcsize(header_format):header_length]
+        return sample_time, json.loads(config.rstrip(b"\0").decode("utf-8")), header_length, start_unix_time, \
+            start_timestamp
+
+
+def open_recording(path):
+    """Memory map the samples of a recording file without loading them into RAM.
+
+    Returns a tuple (sample_time, sensor_config, samples) where samples is a read only structured array with the fields
+    timestamp, x, y and z.
+    """
+    import numpy as np
+
+    sample_time, sensor_config, header_length, _, _ = SampleRecorder.read_header(path)
+    dtype = np.dtype(SampleRecorder.sample_dtype)
+    # Ignore a partially written last sample, e.g. after a power loss
+    sample_count = (os.path.getsize(path) - header_length) // dtype.itemsize
+    if sample_count == 0:
+        return sample_time, sensor_config, np.zeros(0, dtype=dtype)
+    samples = np.memmap(path, dtype=dtype, mode="r",
+                        offset=header_length, shape=(sample_count,))
+    return sample_time, sensor_config, samples
+
+
+def list_recordings(directory):
+    """Returns the recording files in a directory in the order they were written.
+    """
+    return sorted(os.path.join(directory, file_name) for file_name in os.listdir(directory)
+                  if file_name.endswith(SampleRecorder.file_extension))
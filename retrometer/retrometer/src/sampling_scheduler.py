@@ -0,0 +1,99 @@
+import time
+
+
+class SamplingScheduler:
+    def __init__(self, sample_time, max_data_ready_wait_ratio=0.5, clock=time.monotonic, sleep=time.sleep):
+        """Create a scheduler that paces sampling on fixed rate deadlines instead of sleeping a fixed time after each sample.
+
+        Args:
+            sample_time (float): Time between two sample deadlines in seconds.
+            max_data_ready_wait_ratio (float): Fraction of the sample time to wait for the sensor data ready flag after a
+                deadline before the sample is counted as missed.
+            clock (callable): Monotonic clock returning seconds.
+            sleep (callable): Function that sleeps for the given number of seconds.
+        """
+        assert 0.0 < max_data_ready_wait_ratio < 1.0
+        self._sample_time = sample_time
+        self._max_data_ready_wait_ratio = max_data_ready_wait_ratio
+        self._clock = clock
+        self._sleep = sleep
+        self._next_deadline = None
+
+        # Statistics
+        self._sample_count = 0
+        self._overrun_count = 0
+        self._missed_sample_count = 0
+        self._data_not_ready_count = 0
+        self._max_lateness = 0.0
+
+    def get_sample_time(self):
+        return self._sample_time
+
+    def set_sample_time(self, sample_time):
+        """Change the time between two deadlines. The next deadline is moved to one new sample time after the last one, so
+        that a shorter sample time takes effect immediately.
+        """
+        if self._next_deadline is not None:
+            self._next_deadline += sample_time - self._sample_time
+        self._sample_time = sample_time
+
+    def wait_for_next_sample(self, is_data_ready):
+        """Wait until the next deadline and until is_data_ready() returns true.
+
+        Returns the clock time at which the data was ready, or None if the data was not ready in time and the sample is
+        missed.
+
+        Args:
+            is_data_ready (callable): Returns true if the sensor has a new measurement available.
+        """
+        now = self._clock()
+        if self._next_deadline is None:
+            self._next_deadline = now
+
+        lateness = now - self._next_deadline
+        if lateness > 0.0:
+            # The work since the last sample did not finish before this deadline
+            self._overrun_count += 1
+            self._max_lateness = max(self._max_lateness, lateness)
+            # Skip the deadlines that already passed completely, sampling them now would only add jitter
+            missed_deadlines = int(lateness // self._sample_time)
+            if missed_deadlines > 0:
+                self._missed_sample_count += missed_deadlines
+                self._next_deadline += missed_deadlines * self._sample_time
+        else:
+            self._sleep(-lateness)
+
+        deadline = self._next_deadline
+        self._next_deadline = deadline + self._sample_time
+
+        if is_data_ready():
+            self._sample_count += 1
+            return self._clock()
+
+        # The sensor has not finished its conversion yet. Poll with an increasing interval instead of spinning.
+        self._data_not_ready_count += 1
+        max_wait_time = self._max_data_ready_wait_ratio * self._sample_time
+        poll_interval = self._sample_time / 32.0
+        while True:
+            waited_time = self._clock() - deadline
+            if waited_time >= max_wait_time:
+                self._missed_sample_count += 1
+                return None
+            self._sleep(min(poll_interval, max_wait_time - waited_time))
+            poll_interval *= 2.0
+            if is_data_ready():
+                now = self._clock()
+                # Shift the following deadlines to the time the sensor data gets ready, so that the next poll is
+                # likely to succeed at the first try
+                self._next_deadline += now - deadline
+                self._sample_count += 1
+                return now
+
+    def get_statistics(self):
+        return {
+            "samples": self._sample_count,
+            "overruns": self._overrun_count,
+            "missed_samples": self._missed_sample_count,
+            "data_not_ready": self._data_not_ready_count,
+            "max_lateness": self._max_lateness,
+        }
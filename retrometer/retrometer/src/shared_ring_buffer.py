@@ -0,0 +1,125 @@
+import struct
+import zlib
+from multiprocessing import shared_memory
+
+# One record per sample: monotonic timestamp and the magnetometer values x, y, z as native float64
+RECORD_FIELDS = ("timestamp", "x", "y", "z")
+RECORD_FORMAT = "=" + "d" * len(RECORD_FIELDS)
+
+# A slot holds the sequence number and the record, followed by the CRC32 of both
+_SLOT_PAYLOAD = struct.Struct("=Q" + RECORD_FORMAT[1:])
+_SLOT_CHECKSUM = struct.Struct("=I")
+_SLOT_SIZE = _SLOT_PAYLOAD.size + _SLOT_CHECKSUM.size
+
+# The header consists of 64 byte lines of uint64 words. The producer and the consumer only write to their own line, so
+# they never write the same cache line.
+_WORD_SIZE = 8
+_LINE_WORDS = 8
+_CAPACITY = 0
+_WRITE_INDEX = _LINE_WORDS
+_OVERFLOW_COUNT = _LINE_WORDS + 1
+_READ_INDEX = 2 * _LINE_WORDS
+_HEADER_SIZE = 3 * _LINE_WORDS * _WORD_SIZE
+
+
+class SharedRingBuffer:
+    def __init__(self, capacity=None, name=None):
+        """Create or attach a single producer single consumer ring buffer of samples in shared memory, e.g. to hand the
+        samples of an acquisition process to a processing process without a lock or a pipe.
+
+        The producer only writes the write index and the overflow counter, the consumer only writes the read index.
+        Python can not order the writes to shared memory, so on e.g. ARM the consumer can see a new write index before the
+        record. Each slot therefore holds the sequence number of its record and a checksum of both. The consumer only
+        reads a record once a copy of the slot has the expected sequence number and a valid checksum, otherwise it tries
+        again with the next batch. A full buffer never blocks the producer, the new sample is dropped and counted instead.
+
+        Args:
+            capacity (int): Number of samples the buffer holds. Creates a new buffer if given.
+            name (str): Name of an existing buffer to attach to, see get_name(). Only used if capacity is None.
+        """
+        if capacity is not None:
+            if capacity <= 0:
+                raise ValueError("The capacity has to be positive")
+            self._shared_memory = shared_memory.SharedMemory(
+                create=True, size=_HEADER_SIZE + capacity * _SLOT_SIZE)
+            self._is_owner = True
+        else:
+            self._shared_memory = shared_memory.SharedMemory(name=name)
+            self._is_owner = False
+        buffer = self._shared_memory.buf
+        self._views = [buffer[:_HEADER_SIZE]]
+        self._header = self._views[-1].cast("Q")
+        if self._is_owner:
+            self._header[_CAPACITY] = capacity
+        self._capacity = self._header[_CAPACITY]
+        self._slots = buffer[_HEADER_SIZE:_HEADER_SIZE + self._capacity * _SLOT_SIZE]
+        self._views.extend([self._header, self._slots])
+        # Each side caches its own index, the other index has to be read from the shared header
+        self._write_index = self._header[_WRITE_INDEX]
+        self._read_index = self._header[_READ_INDEX]
+
+    def get_name(self):
+        return self._shared_memory.name
+
+    def get_capacity(self):
+        return self._capacity
+
+    def put(self, *record):
+        """Append one record with the values of RECORD_FIELDS. Must only be called by the producer.
+
+        Returns False if the buffer is full and the record was dropped.
+        """
+        write_index = self._write_index
+        if write_index - self._header[_READ_INDEX] >= self._capacity:
+            self._header[_OVERFLOW_COUNT] += 1
+            return False
+        offset = write_index % self._capacity * _SLOT_SIZE
+        payload = _SLOT_PAYLOAD.pack(write_index + 1, *record)
+        self._slots[offset:offset + _SLOT_PAYLOAD.size] = payload
+        _SLOT_CHECKSUM.pack_into(self._slots, offset + _SLOT_PAYLOAD.size, zlib.crc32(payload))
+        self._write_index = write_index + 1
+        self._header[_WRITE_INDEX] = self._write_index
+        return True
+
+    def get_batch(self, max_length=None):
+        """Remove and return up to max_length records in the order they were put, as list of tuples with the values of
+        RECORD_FIELDS. Returns all available records if max_length is None. Must only be called by the consumer.
+        """
+        read_index = self._read_index
+        length = self._header[_WRITE_INDEX] - read_index
+        if max_length is not None:
+            length = min(length, max_length)
+        records = []
+        for index in range(read_index, read_index + length):
+            offset = index % self._capacity * _SLOT_SIZE
+            # Validate and unpack the same copy, the producer could write the slot in between otherwise
+            slot = bytes(self._slots[offset:offset + _SLOT_SIZE])
+            payload = slot[:_SLOT_PAYLOAD.size]
+            sequence, *record = _SLOT_PAYLOAD.unpack(payload)
+            if sequence != index + 1 or _SLOT_CHECKSUM.unpack_from(slot, _SLOT_PAYLOAD.size)[0] != zlib.crc32(payload):
+                # The record is not complete or not visible yet
+                break
+            records.append(tuple(record))
+        self._read_index = read_index + len(records)
+        self._header[_READ_INDEX] = self._read_index
+        return records
+
+    def get_pending_count(self):
+        """Returns the number of records that were put but not read yet.
+        """
+        return self._header[_WRITE_INDEX] - self._header[_READ_INDEX]
+
+    def get_overflow_count(self):
+        """Returns the number of records that were dropped because the buffer was full.
+        """
+        return self._header[_OVERFLOW_COUNT]
+
+    def close(self):
+        """Detach from the buffer. The creator also removes the shared memory.
+        """
+        # The views have to be released before the shared memory can be closed
+        for view in reversed(self._views):
+            view.release()
+        self._shared_memory.close()
+        if self._is_owner:
+            self._shared_memory.unlink()
@@ -0,0 +1,253 @@
+import collections
+import math
+import random
+
+
+class _SkiplistNode:
+    __slots__ = ("value", "next", "width")
+
+    def __init__(self, value, level):
+        self.value = value
+        self.next = [None] * level
+        self.width = [1] * level
+
+
+class IndexableSkiplist:
+    def __init__(self, expected_size=100):
+        """Create a sorted container with O(log n) insert, remove and access by rank.
+
+        Args:
+            expected_size (int): Expected maximum number of elements. Used to choose the number of levels.
+        """
+        self._max_levels = 1 + int(math.log(max(expected_size, 2), 2))
+        self._head = _SkiplistNode(None, self._max_levels)
+        self._nil = _SkiplistNode(math.inf, 0)
+        self._head.next = [self._nil] * self._max_levels
+        self._head.width = [1] * self._max_levels
+        self._size = 0
+        self._random = random.Random(0)
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, rank):
+        """Returns the element with the given rank (0 is the smallest element).
+        """
+        if rank < 0:
+            rank += self._size
+        if rank < 0 or rank >= self._size:
+            raise IndexError("skiplist index out of range")
+        node = self._head
+        rank += 1
+        for level in reversed(range(self._max_levels)):
+            while node.width[level] <= rank:
+                rank -= node.width[level]
+                node = node.next[level]
+        return node.value
+
+    def insert(self, value):
+        # find the last node on each level that is smaller than the value and remember its position
+        chain = [None] * self._max_levels
+        steps_at_level = [0] * self._max_levels
+        node = self._head
+        for level in reversed(range(self._max_levels)):
+            while node.next[level].value <= value:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        # insert a link to the new node at each of its levels
+        level_count = min(self._max_levels, 1 -
+                          int(math.log(1.0 - self._random.random(), 2.0)))
+        new_node = _SkiplistNode(value, level_count)
+        steps = 0
+        for level in range(level_count):
+            prev_node = chain[level]
+            new_node.next[level] = prev_node.next[level]
+            prev_node.next[level] = new_node
+            new_node.width[level] = prev_node.width[level] - steps
+            prev_node.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(level_count, self._max_levels):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, value):
+        # find the first node on each level where the next node is the value to remove
+        chain = [None] * self._max_levels
+        node = self._head
+        for level in reversed(range(self._max_levels)):
+            while node.next[level].value < value:
+                node = node.next[level]
+            chain[level] = node
+        if value != chain[0].next[0].value:
+            raise KeyError("value not found in skiplist")
+
+        # remove one link at each level
+        level_count = len(chain[0].next[0].next)
+        for level in range(level_count):
+            prev_node = chain[level]
+            prev_node.width[level] += prev_node.next[level].width[level] - 1
+            prev_node.next[level] = prev_node.next[level].next[level]
+        for level in range(level_count, self._max_levels):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+
+class SlidingWindowStatistics:
+    def __init__(self, maxlen):
+        """Create a sliding window over the last maxlen values that incrementally tracks order statistics, mean and standard deviation.
+
+        Inserting a value and evicting the oldest one costs O(log n), so that percentiles and the standard deviation are
+        available on every sample without sorting the whole window again.
+
+        Args:
+            maxlen (int): Number of values in the window. The oldest value is evicted when a new value is appended to a full window.
+        """
+        self._values = collections.deque(maxlen=maxlen)
+        self._sorted_values = IndexableSkiplist(maxlen)
+        self._mean = 0.0
+        self._sum_squared_deviations = 0.0
+
+    @property
+    def maxlen(self):
+        return self._values.maxlen
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def is_full(self):
+        return len(self._values) == self._values.maxlen
+
+    def append(self, value):
+        """Add a value to the window and evict the oldest value if the window is full.
+        """
+        if self.is_full():
+            self._evict(self._values[0])
+        self._values.append(value)
+        self._sorted_values.insert(value)
+
+        # Welford update of the running mean and sum of squared deviations
+        delta = value - self._mean
+        self._mean += delta / len(self._values)
+        self._sum_squared_deviations += delta * (value - self._mean)
+
+    def extend(self, values):
+        """Add a sequence of values to the window. If there are at least as many values as fit into the window, the window is
+        rebuilt from the newest values instead of inserting and evicting each value.
+        """
+        if len(values) < self.maxlen:
+            for value in values:
+                self.append(float(value))
+            return
+
+        self._values.clear()
+        self._values.extend(float(value) for value in values[-self.maxlen:])
+        self._sorted_values = IndexableSkiplist(self.maxlen)
+        for value in self._values:
+            self._sorted_values.insert(value)
+        self._mean = math.fsum(self._values) / len(self._values)
+        self._sum_squared_deviations = math.fsum(
+            (value - self._mean)**2 for value in self._values)
+
+    def _evict(self, value):
+        self._sorted_values.remove(value)
+        count = len(self._values) - 1
+        if count == 0:
+            self._mean = 0.0
+            self._sum_squared_deviations = 0.0
+            return
+        # reverse Welford update to remove the value from the running mean and sum of squared deviations
+        delta = value - self._mean
+        self._mean -= delta / count
+        self._sum_squared_deviations -= delta * (value - self._mean)
+
+    def percentile(self, percentage):
+        """Returns the percentile of the window values with linear interpolation between the closest ranks, like np.percentile.
+        """
+        count = len(self._sorted_values)
+        if count == 0:
+            return math.nan
+        rank = percentage / 100.0 * (count - 1)
+        lower_rank = int(rank)
+        lower_value = self._sorted_values[lower_rank]
+        if lower_rank + 1 >= count:
+            return lower_value
+        upper_value = self._sorted_values[lower_rank + 1]
+        fraction = rank - lower_rank
+        return lower_value + (upper_value - lower_value) * fraction
+
+    def mean(self):
+        if len(self._values) == 0:
+            return math.nan
+        return self._mean
+
+    def std(self):
+        """Returns the population standard deviation of the window values, like np.std.
+        """
+        if len(self._values) == 0:
+            return math.nan
+        # clamp negative values that may be caused by rounding errors
+        return math.sqrt(max(self._sum_squared_deviations, 0.0) / len(self._values))
+
+
+class NumpyWindowStatistics:
+    def __init__(self, maxlen):
+        """Create a sliding window over the last maxlen values in a numpy ring buffer. Percentiles and the standard
+        deviation are computed from the whole window on every call. Has the same interface as SlidingWindowStatistics.
+
+        Args:
+            maxlen (int): Number of values in the window. The oldest value is overwritten when a new value is appended to a full window.
+        """
+        # numpy is only imported if this backend is used
+        import numpy as np
+        self._np = np
+        self._buffer = np.zeros(maxlen)
+        self._write_index = 0
+        self._count = 0
+
+    @property
+    def maxlen(self):
+        return len(self._buffer)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        if self.is_full():
+            return iter(self._np.concatenate((self._buffer[self._write_index:], self._buffer[:self._write_index])).tolist())
+        return iter(self._buffer[:self._count].tolist())
+
+    def is_full(self):
+        return self._count == len(self._buffer)
+
+    def append(self, value):
+        """Add a value to the window and overwrite the oldest value if the window is full.
+        """
+        self._buffer[self._write_index] = value
+        self._write_index = (self._write_index + 1) % len(self._buffer)
+        self._count = min(self._count + 1, len(self._buffer))
+
+    def extend(self, values):
+        for value in values[-self.maxlen:]:
+            self.append(float(value))
+
+    def percentile(self, percentage):
+        if self._count == 0:
+            return math.nan
+        return float(self._np.percentile(self._buffer[:self._count], percentage))
+
+    def mean(self):
+        if self._count == 0:
+            return math.nan
+        return float(self._np.mean(self._buffer[:self._count]))
+
+    def std(self):
+        """Returns the population standard deviation of the window values.
+        """
+        if self._count == 0:
+            return math.nan
+        return float(self._np.std(self._buffer[:self._count]))
@@ -0,0 +1,203 @@
+import gc
+import json
+import logging
+import multiprocessing
+import signal
+import time
+from src.sampling_scheduler import SamplingScheduler
+from src.shared_ring_buffer import SharedRingBuffer
+
+_logger = logging.getLogger(__name__)
+
+
+def run_acquisition(ring_buffer_name, magnetometer_factory, sample_time, stop_event, i2c_error_count=None,
+                    report_interval=60.0):
+    """Entry point of the acquisition process. Only reads the magnetometer on the deadlines of a scheduler, stamps the
+    samples and puts them into the ring buffer until the stop event is set. A sample whose i2c transaction failed is
+    skipped and counted.
+
+    Args:
+        ring_buffer_name (str): Name of the SharedRingBuffer to put the samples into.
+        magnetometer_factory (callable): Returns the magnetometer. It is called in the acquisition process, so that the
+            i2c bus is only opened there.
+        sample_time (float): Time between two samples in seconds.
+        stop_event (multiprocessing.Event): Event that stops the acquisition.
+        i2c_error_count (multiprocessing.Value): Optional shared counter of the failed i2c transactions.
+        report_interval (float): Minimum time between two reports of late or missed samples in seconds.
+    """
+    # A spawned process does not inherit the logging configuration
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # The processing process decides when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    ring_buffer = SharedRingBuffer(name=ring_buffer_name)
+    try:
+        magnetometer = magnetometer_factory()
+        scheduler = SamplingScheduler(sample_time)
+        # The loop creates no reference cycles, so the cyclic garbage collector would only add pauses
+        gc.collect()
+        gc.disable()
+        last_report_time = time.monotonic()
+        error_count = 0
+        last_statistics = dict(scheduler.get_statistics(), i2c_errors=error_count)
+        while not stop_event.is_set():
+            try:
+                timestamp = scheduler.wait_for_next_sample(magnetometer.is_new_meas_available)
+                if timestamp is not None:
+                    ring_buffer.put(timestamp, *magnetometer.read_magnetometer())
+            except OSError as error:
+                # A disturbed i2c transaction only loses this sample, further errors are counted in the statistics
+                if error_count == 0:
+                    _logger.warning("i2c transaction failed, skipping the sample: %s", error)
+                error_count += 1
+                if i2c_error_count is not None:
+                    i2c_error_count.value = error_count
+            if time.monotonic() - last_report_time > report_interval:
+                statistics = dict(scheduler.get_statistics(), i2c_errors=error_count)
+                if statistics["overruns"] != last_statistics["overruns"] or \
+                        statistics["missed_samples"] != last_statistics["missed_samples"] or \
+                        statistics["i2c_errors"] != last_statistics["i2c_errors"]:
+                    _logger.warning("Sampling statistics: %s", json.dumps(statistics))
+                last_statistics = statistics
+                last_report_time = time.monotonic()
+    finally:
+        ring_buffer.close()
+
+
+class SplitProcessRuntime:
+    def __init__(self, meter, reporter, magnetometer_factory, sample_time, checkpointer=None, sample_recorder=None,
+                 diagnostics_publisher=None, capacity=4096, max_batch_length=256, poll_interval=None,
+                 start_method="spawn", join_timeout=5.0):
+        """Create a runtime that reads the magnetometer in a separate process, so that garbage collection, mqtt
+        reconnects and detector spikes of this process never delay the i2c reads.
+
+        The acquisition process hands the samples over through a SharedRingBuffer. This process counts and publishes
+        them. When it fell behind, it drains the buffer in batches and publishes once per batch.
+
+        Args:
+            meter (RetroMeter): Meter with process_sample() and get_readings(). Its magnetometer is not used.
+            reporter (VolumeReporter): Reporter that publishes the readings.
+            magnetometer_factory (callable): Picklable callable that returns the magnetometer in the acquisition process.
+            sample_time (float): Time between two samples in seconds.
+            checkpointer (Checkpointer): Optional checkpointer that stores the detector state.
+            sample_recorder (SampleRecorder): Optional recorder that stores all raw magnetometer samples.
+            diagnostics_publisher (DiagnosticsPublisher): Optional publisher of the metrics that is polled with the
+                reporter.
+            capacity (int): Number of samples the ring buffer holds. Newer samples are dropped when full.
+            max_batch_length (int): Maximum number of samples that are counted before the next publish.
+            poll_interval (float): Time to wait for new samples in seconds. Defaults to half the sample time.
+            start_method (str): Multiprocessing start method. spawn does not copy the threads and sockets of this process.
+            join_timeout (float): Time to wait for the acquisition process to stop in seconds before it is terminated.
+        """
+        self._meter = meter
+        self._reporter = reporter
+        self._magnetometer_factory = magnetometer_factory
+        self._sample_time = sample_time
+        self._checkpointer = checkpointer
+        self._sample_recorder = sample_recorder
+        self._diagnostics_publisher = diagnostics_publisher
+        self._capacity = capacity
+        self._max_batch_length = max_batch_length
+        self._poll_interval = sample_time / 2.0 if poll_interval is None else poll_interval
+        self._join_timeout = join_timeout
+        self._context = multiprocessing.get_context(start_method)
+        self._stop_event = self._context.Event()
+        # Only written by the acquisition process
+        self._i2c_error_count = self._context.Value("Q", 0, lock=False)
+        self._is_stopping = False
+        self._ring_buffer = None
+
+        # Statistics
+        self._sample_count = 0
+        self._batch_count = 0
+        self._max_batch_fill = 0
+        self._max_lag = 0.0
+        self._overflow_count = 0
+
+    def run(self):
+        """Run until stop() is called or the acquisition process ends. Counts all samples that were acquired, saves the
+        checkpoint and flushes the publishers before returning.
+        """
+        self._ring_buffer = SharedRingBuffer(self._capacity)
+        process = self._context.Process(
+            target=run_acquisition, name="acquisition", daemon=True,
+            args=(self._ring_buffer.get_name(), self._magnetometer_factory, self._sample_time, self._stop_event,
+                  self._i2c_error_count))
+        process.start()
+        try:
+            while not self._is_stopping:
+                if self._process_batch() == 0:
+                    if not process.is_alive():
+                        raise RuntimeError("The acquisition process stopped with exit code {}".format(
+                            process.exitcode))
+                    self._poll()
+                    time.sleep(self._poll_interval)
+        finally:
+            self._stop_event.set()
+            process.join(self._join_timeout)
+            if process.is_alive():
+                _logger.warning("Terminating the acquisition process")
+                process.terminate()
+                process.join()
+            try:
+                # Count the samples that were acquired until the acquisition stopped
+                while self._process_batch() > 0:
+                    pass
+                if self._checkpointer is not None:
+                    self._checkpointer.save(self._meter.get_state())
+                self._reporter.flush()
+            finally:
+                self._ring_buffer.close()
+                self._ring_buffer = None
+
+    def stop(self):
+        """Request a clean shutdown, e.g. from a SIGTERM handler.
+        """
+        self._is_stopping = True
+        self._stop_event.set()
+
+    def get_statistics(self):
+        """Returns the processed samples and batches, the samples dropped because the ring buffer was full, the samples
+        waiting in the ring buffer, the maximum time between the acquisition and the processing of a sample and the
+        samples skipped because of failed i2c transactions.
+        """
+        statistics = {"samples": self._sample_count, "batches": self._batch_count,
+                      "max_batch_fill": self._max_batch_fill, "max_lag": self._max_lag,
+                      "overflows": self._overflow_count, "pending_samples": 0,
+                      "i2c_errors": self._i2c_error_count.value}
+        if self._ring_buffer is not None:
+            statistics["pending_samples"] = self._ring_buffer.get_pending_count()
+        return statistics
+
+    def _process_batch(self):
+        samples = self._ring_buffer.get_batch(self._max_batch_length)
+        if len(samples) == 0:
+            return 0
+        # The monotonic clock is shared by all processes, so the lag of the oldest sample can be measured directly
+        self._max_lag = max(self._max_lag, time.monotonic() - samples[0][0])
+        self._max_batch_fill = max(self._max_batch_fill, len(samples))
+        for timestamp, x, y, z in samples:
+            if self._sample_recorder is not None:
+                self._sample_recorder.record(timestamp, x, y, z)
+            self._meter.process_sample((x, y, z), timestamp)
+        self._sample_count += len(samples)
+        self._batch_count += 1
+
+        # Samples only overflow while the processing fell behind, so the count is checked once per batch
+        overflow_count = self._ring_buffer.get_overflow_count()
+        if overflow_count > 0 and self._overflow_count == 0:
+            _logger.warning("Ring buffer full, dropping samples")
+        self._overflow_count = overflow_count
+
+        readings = self._meter.get_readings()
+        self._reporter.update(readings)
+        if self._checkpointer is not None and self._checkpointer.is_due(readings):
+            self._checkpointer.save(self._meter.get_state(timestamp), readings)
+        self._poll()
+        return len(samples)
+
+    def _poll(self):
+        # Publish coalesced updates and retry unacknowledged ones
+        self._reporter.poll()
+        if self._diagnostics_publisher is not None:
+            self._diagnostics_publisher.poll()
@@ -0,0 +1,64 @@
+import collections
+import logging
+
+
+class Telemetry:
+    def __init__(self, sample_buffer_length=1200, summary_interval=None, logger=None):
+        """Create a telemetry object that keeps the recent samples in memory and logs only on state changes.
+
+        Args:
+            sample_buffer_length (int): Number of recent samples that are kept for dump().
+            summary_interval (float): Seconds between two summary log messages. No summaries are logged if None.
+            logger (logging.Logger): Logger to write to. Defaults to the logger of this module.
+        """
+        self._samples = collections.deque(maxlen=sample_buffer_length)
+        self._summary_interval = summary_interval
+        self._logger = logger or logging.getLogger(__name__)
+        self._last_count = None
+        self._last_summary_timestamp = None
+        self._samples_since_summary = 0
+        self._count_since_summary = None
+
+    def record_sample(self, timestamp, count, x, y, z):
+        """Record one sample. Only logs if the count changed or a summary is due.
+
+        Args:
+            timestamp (float): Monotonic time of the sample in seconds.
+            count (int): Tick count after the sample.
+            x (float): Magnetometer x value.
+            y (float): Magnetometer y value.
+            z (float): Magnetometer z value.
+        """
+        self._samples.append((timestamp, count, x, y, z))
+
+        if count != self._last_count:
+            self._logger.debug("Count: %d", count)
+            self._last_count = count
+
+        if self._summary_interval is None:
+            return
+        self._samples_since_summary += 1
+        if self._last_summary_timestamp is None:
+            self._last_summary_timestamp = timestamp
+            self._count_since_summary = count
+        elif timestamp - self._last_summary_timestamp >= self._summary_interval:
+            self._logger.info("Summary: %d samples in %.1f s, count %d (+%d), x: %.3f, y: %.3f, z: %.3f",
+                              self._samples_since_summary, timestamp - self._last_summary_timestamp, count,
+                              count - self._count_since_summary, x, y, z)
+            self._last_summary_timestamp = timestamp
+            self._samples_since_summary = 0
+            self._count_since_summary = count
+
+    def get_recent_samples(self):
+        """Returns the recent samples as a list of tuples (timestamp, count, x, y, z), oldest first.
+        """
+        return list(self._samples)
+
+    def dump(self):
+        """Log all recent samples, e.g. when requested by a signal.
+        """
+        samples = self.get_recent_samples()
+        self._logger.info("Dumping %d recent samples", len(samples))
+        for timestamp, count, x, y, z in samples:
+            self._logger.info("%.3f count: %d, x: %10.3f, y: %10.3f, z: %10.3f",
+                              timestamp, count, x, y, z)
@@ -1,7 +1,21 @@
 import collections
-import numpy as np
+import logging
+import math
+import statistics
 from datetime import timedelta
 import time
+from src.sliding_window import SlidingWindowStatistics, NumpyWindowStatistics
+
+_logger = logging.getLogger(__name__)
+
+# Window statistics implementations that the calibrator can be constructed with. The python backend avoids importing
+# numpy, which dominates the startup time and memory on small boards. numpy is still imported by the batch methods.
+WINDOW_BACKENDS = {"python": SlidingWindowStatistics,
+                   "numpy": NumpyWindowStatistics}
+
+# Calibration modes of the MinMaxCalibrator. window waits for a full window of values and confirms the calibration after a
+# fixed duration. adaptive starts after a few oscillations and confirms as soon as the min max estimates are stable.
+CALIBRATION_MODES = ["window", "adaptive"]
 
 
 class HysteresisTrigger:
@@ -41,9 +55,199 @@ class HysteresisTrigger:
 
         return is_triggered
 
+    def is_activated(self):
+        return self._is_activated
+
+    def is_configured(self):
+        return self._is_configured
+
+    def get_min_max(self):
+        """Returns the min and max values the thresholds were configured with.
+        """
+        threshold_range = (self.activation_threshold - self.deactivation_threshold) / \
+            (self.activation_threshold_ratio - self.deactivation_threshold_ratio)
+        expected_min = self.activation_threshold - self.activation_threshold_ratio*threshold_range
+        return (expected_min, expected_min + threshold_range)
+
+    def get_state(self):
+        """Returns the trigger state as a json serializable dict, see restore_state().
+        """
+        return {"activation_threshold": float(self.activation_threshold),
+                "deactivation_threshold": float(self.deactivation_threshold),
+                "is_activated": bool(self._is_activated),
+                "is_configured": bool(self._is_configured)}
+
+    def restore_state(self, state):
+        self.activation_threshold = state["activation_threshold"]
+        self.deactivation_threshold = state["deactivation_threshold"]
+        self._is_activated = state["is_activated"]
+        self._is_configured = state["is_configured"]
+
+    def input_batch(self, values, min_values=None, max_values=None):
+        """Processes an array of input values like consecutive input() calls and returns a boolean array with the triggers.
+
+        Args:
+            values (np.ndarray): Input values.
+            min_values (np.ndarray): Optional min estimates to configure the trigger with before each value is processed.
+                NaN entries keep the previous configuration, like not calling configure_min_max() for that value.
+            max_values (np.ndarray): Optional max estimates, see min_values.
+        """
+        import numpy as np
+        values = np.asarray(values, dtype=float)
+        sample_count = len(values)
+        if sample_count == 0:
+            return np.zeros(0, dtype=bool)
+
+        # Determine the thresholds that are configured for each value by carrying the last configuration forward
+        activation_thresholds = np.full(sample_count, self.activation_threshold)
+        deactivation_thresholds = np.full(
+            sample_count, self.deactivation_threshold)
+        is_configured = np.full(sample_count, self._is_configured)
+        if min_values is not None:
+            min_values = np.asarray(min_values, dtype=float)
+            max_values = np.asarray(max_values, dtype=float)
+            is_reconfigured = ~(np.isnan(min_values) | np.isnan(max_values))
+            last_configuration_index = np.maximum.accumulate(
+                np.where(is_reconfigured, np.arange(sample_count), -1))
+            has_configuration = last_configuration_index >= 0
+            configuration_index = last_configuration_index[has_configuration]
+            ranges = max_values[configuration_index] - \
+                min_values[configuration_index]
+            activation_thresholds[has_configuration] = min_values[configuration_index] + \
+                self.activation_threshold_ratio*ranges
+            deactivation_thresholds[has_configuration] = min_values[configuration_index] + \
+                self.deactivation_threshold_ratio*ranges
+            is_configured |= has_configuration
+
+        # Values that switch the state, depending on the state before them
+        is_activating = is_configured & (values >= activation_thresholds)
+        is_deactivating = is_configured & ~(values > deactivation_thresholds)
+
+        if np.any(is_activating & is_deactivating):
+            # Degenerated thresholds toggle the state on every value, process them one by one
+            is_triggered = np.zeros(sample_count, dtype=bool)
+            for index in range(sample_count):
+                if is_configured[index]:
+                    self.activation_threshold = activation_thresholds[index]
+                    self.deactivation_threshold = deactivation_thresholds[index]
+                    self._is_configured = True
+                is_triggered[index] = self.input(values[index])
+            return is_triggered
+
+        # Without overlapping thresholds the state after each value is defined by the last switching value
+        is_switching = is_activating | is_deactivating
+        last_switch_index = np.maximum.accumulate(
+            np.where(is_switching, np.arange(sample_count), -1))
+        is_activated = np.where(last_switch_index >= 0,
+                                is_activating[np.maximum(last_switch_index, 0)], self._is_activated)
+        was_activated = np.concatenate(
+            ([self._is_activated], is_activated[:-1]))
+
+        # Carry the state over to the next call
+        self._is_activated = bool(is_activated[-1])
+        self.activation_threshold = float(activation_thresholds[-1])
+        self.deactivation_threshold = float(deactivation_thresholds[-1])
+        self._is_configured = bool(is_configured[-1])
+
+        return is_activated & ~was_activated
+
+
+class OscillationTracker:
+    def __init__(self, min_swing, max_swing, min_std, std_length, max_extremum_count=100):
+        """Create a tracker of the peaks and troughs of an oscillation. A peak is confirmed when the value falls by half
+        the minimum swing below it, a trough when the value rises by half the minimum swing above it, so the tracking
+        does not depend on the period and no value window is needed. Single outliers are removed with a median of three
+        values, and extrema are only recorded while the exponentially weighted standard deviation of the values is big
+        enough, so that noise of an idle meter is not mistaken for an oscillation.
+
+        Args:
+            min_swing (float): Minimum difference between a peak and the previous trough or vice versa to record it.
+            max_swing (float): Maximum difference between a peak and the previous trough or vice versa to record it.
+            min_std (float): Minimum standard deviation of the values to record extrema.
+            std_length (int): Number of values the standard deviation is averaged over.
+            max_extremum_count (int): Number of most recent peaks and troughs that are kept.
+        """
+        self._hysteresis = min_swing / 2.0
+        self._min_swing = min_swing
+        self._max_swing = max_swing
+        self._min_variance = min_std**2
+        self._alpha = 1.0 / max(1, std_length)
+        self._recent_values = collections.deque(maxlen=3)
+        self._mean = None
+        self._variance = 0.0
+        self._is_rising = None
+        self._low = None
+        self._high = None
+        self._extremum = None
+        self._last_extremum = None
+        self._peaks = collections.deque(maxlen=max_extremum_count)
+        self._troughs = collections.deque(maxlen=max_extremum_count)
+
+    def input(self, value):
+        """Returns True if the value confirmed a new peak or trough that was recorded.
+        """
+        self._recent_values.append(value)
+        value = sorted(self._recent_values)[len(self._recent_values) // 2]
+        if self._mean is None:
+            self._mean = value
+        delta = value - self._mean
+        self._mean += self._alpha * delta
+        self._variance = (1.0 - self._alpha) * (self._variance + self._alpha * delta * delta)
+
+        if self._is_rising is None:
+            # Wait for the first move in either direction. The start value is not an extremum, so the first turn is only
+            # the reference for the swing of the next one.
+            if self._low is None:
+                self._low = self._high = value
+            self._low = min(self._low, value)
+            self._high = max(self._high, value)
+            if value < self._high - self._hysteresis:
+                self._is_rising = False
+                self._last_extremum = self._high
+                self._extremum = value
+            elif value > self._low + self._hysteresis:
+                self._is_rising = True
+                self._last_extremum = self._low
+                self._extremum = value
+            return False
+
+        if self._is_rising:
+            if value > self._extremum:
+                self._extremum = value
+                return False
+            if value < self._extremum - self._hysteresis:
+                self._is_rising = False
+                return self._confirm(value, self._peaks)
+        else:
+            if value < self._extremum:
+                self._extremum = value
+                return False
+            if value > self._extremum + self._hysteresis:
+                self._is_rising = True
+                return self._confirm(value, self._troughs)
+        return False
+
+    def get_peaks(self):
+        return self._peaks
+
+    def get_troughs(self):
+        return self._troughs
+
+    def _confirm(self, value, extrema):
+        extremum = self._extremum
+        swing = abs(extremum - self._last_extremum)
+        self._last_extremum = extremum
+        self._extremum = value
+        if self._min_swing < swing < self._max_swing and self._variance > self._min_variance:
+            extrema.append(extremum)
+            return True
+        return False
+
 
 class MinMaxCalibrator:
-    def __init__(self, max_buffer_length, min_amplitude, max_amplitude, min_std, calibration_confirm_duration):
+    def __init__(self, max_buffer_length, min_amplitude, max_amplitude, min_std, calibration_confirm_duration,
+                 backend="python", calibration_mode="window", min_oscillations=3, lock_oscillations=10,
+                 lock_tolerance=0.02):
         """Create a min max calibrator that monitors an oscillation and determins min and max values.
 
         Args:
@@ -52,10 +256,32 @@ class MinMaxCalibrator:
             max_amplitude (_type_): _description_
             min_std (_type_): _description_
             calibration_duration (_type_): _description_
+            backend (str): Window statistics implementation, one of WINDOW_BACKENDS.
+            calibration_mode (str): One of CALIBRATION_MODES. The adaptive mode estimates min and max with the medians of
+                the troughs and peaks of the oscillations seen so far, independent of the buffer length and the period.
+            min_oscillations (int): Number of peaks and troughs after which the adaptive mode is calibrated.
+            lock_oscillations (int): Minimum number of peaks and troughs before the adaptive mode confirms the calibration.
+            lock_tolerance (float): The adaptive mode confirms the calibration when the standard errors of the peaks and
+                troughs are below this part of the estimated range, or after the calibration confirm duration.
         """
-        self._value_window = collections.deque(maxlen=max_buffer_length)
-        self._current_min = np.inf
-        self._current_max = -np.inf
+        if backend not in WINDOW_BACKENDS:
+            raise ValueError("Unknown detector backend {}".format(backend))
+        if calibration_mode not in CALIBRATION_MODES:
+            raise ValueError("Unknown calibration mode {}".format(calibration_mode))
+        self._calibration_mode = calibration_mode
+        self._value_window = None
+        self._oscillation_tracker = None
+        if calibration_mode == "window":
+            self._value_window = WINDOW_BACKENDS[backend](max_buffer_length)
+        else:
+            # The standard deviation is averaged over about one maximum period instead of the whole window
+            self._oscillation_tracker = OscillationTracker(
+                2.0*min_amplitude, 2.0*max_amplitude, min_std, max_buffer_length // 10)
+            self._min_oscillations = min_oscillations
+            self._lock_oscillations = max(lock_oscillations, min_oscillations, 2)
+            self._lock_tolerance = lock_tolerance
+        self._current_min = math.inf
+        self._current_max = -math.inf
         self._current_std = 0
         self._min_amplitude = min_amplitude
         self._max_amplitude = max_amplitude
@@ -65,68 +291,350 @@ class MinMaxCalibrator:
         # We need to receive a first value before we can initialize this
         self._calibration_confirm_start_time = None
 
-    def input(self, value):
+    def input(self, value, timestamp=None):
         """provide an input value for calibration. Should be called regularly. Triggers all sorts of calculations
 
         Args:
             value (_type_): _description_
+            timestamp (float): Monotonic time of the value in seconds. The current time is used if None.
         """
+        if self._oscillation_tracker is not None:
+            if self._oscillation_tracker.input(value):
+                self._update_from_oscillations(time.monotonic() if timestamp is None else timestamp)
+            return
+
         # add value to the buffer
         self._value_window.append(value)
         # check if a signification amount of excitation has been observed
         if self._is_sufficiently_excited():
             # If yes, update the min and max values with 5 and 95 percentiles to be robust against outliers
             self._current_min = min(
-                self._current_min, np.percentile(self._value_window, 5))
+                self._current_min, self._value_window.percentile(5))
             self._current_max = max(
-                self._current_max, np.percentile(self._value_window, 95))
+                self._current_max, self._value_window.percentile(95))
             # Set the calibrated flag
             self._is_calibrated = True
             # Start calibration confirmation if it is not started yet
             if self._calibration_confirm_start_time is None:
+                self._calibration_confirm_start_time = time.monotonic() if timestamp is None else timestamp
+
+    def input_batch(self, values, timestamps=None):
+        """Provide an array of input values for calibration, like consecutive input() calls. The window statistics for all
+        values are computed with vectorized numpy operations.
+
+        Returns a tuple (is_calibrated, min_values, max_values) of arrays with the calibration state after each value.
+
+        Args:
+            values (np.ndarray): Input values.
+            timestamps (np.ndarray): Monotonic times of the values in seconds. The current time is used if None.
+        """
+        import numpy as np
+        from numpy.lib.stride_tricks import sliding_window_view
+        values = np.asarray(values, dtype=float)
+        sample_count = len(values)
+        if self._oscillation_tracker is not None:
+            # The oscillation tracking is sequential, but only costs a few comparisons per value
+            is_calibrated = np.zeros(sample_count, dtype=bool)
+            min_values = np.empty(sample_count)
+            max_values = np.empty(sample_count)
+            for index, value in enumerate(values):
+                self.input(value, None if timestamps is None else timestamps[index])
+                is_calibrated[index] = self._is_calibrated
+                min_values[index] = self._current_min
+                max_values[index] = self._current_max
+            return is_calibrated, min_values, max_values
+        window_length = self._value_window.maxlen
+        history = np.fromiter(self._value_window, dtype=float,
+                              count=len(self._value_window))
+        combined_values = np.concatenate((history, values))
+
+        # The window of value i is full once the history and the values up to i fill the buffer
+        first_full_index = max(0, window_length - len(history) - 1)
+        is_excited = np.zeros(sample_count, dtype=bool)
+        lower_percentiles = np.full(sample_count, np.inf)
+        upper_percentiles = np.full(sample_count, -np.inf)
+        if first_full_index < sample_count:
+            windows = sliding_window_view(combined_values, window_length)
+            first_window_index = len(history) + \
+                first_full_index - window_length + 1
+            # Limit the number of window values that are processed at once to bound the memory usage
+            chunk_length = max(1, 2**20 // window_length)
+            for chunk_start in range(first_full_index, sample_count, chunk_length):
+                chunk_end = min(chunk_start + chunk_length, sample_count)
+                chunk_windows = windows[first_window_index + chunk_start - first_full_index:
+                                        first_window_index + chunk_end - first_full_index]
+                lower, upper = np.percentile(chunk_windows, [5, 95], axis=1)
+                biggest_amplitude = np.abs(upper - lower)/2.0
+                is_excited[chunk_start:chunk_end] = (biggest_amplitude > self._min_amplitude) & \
+                    (biggest_amplitude < self._max_amplitude) & \
+                    (np.std(chunk_windows, axis=1) > self._min_std)
+                lower_percentiles[chunk_start:chunk_end] = lower
+                upper_percentiles[chunk_start:chunk_end] = upper
+
+        # The min and max estimates only ever widen with the percentiles of excited windows
+        min_values = np.minimum(self._current_min, np.minimum.accumulate(
+            np.where(is_excited, lower_percentiles, np.inf)))
+        max_values = np.maximum(self._current_max, np.maximum.accumulate(
+            np.where(is_excited, upper_percentiles, -np.inf)))
+        is_calibrated = self._is_calibrated | np.logical_or.accumulate(
+            is_excited)
+
+        # Carry the state over to the next call
+        self._value_window.extend(values)
+        self._current_std = self._value_window.std()
+        if sample_count > 0:
+            self._current_min = float(min_values[-1])
+            self._current_max = float(max_values[-1])
+            self._is_calibrated = bool(is_calibrated[-1])
+        if self._is_calibrated and self._calibration_confirm_start_time is None:
+            if timestamps is None:
                 self._calibration_confirm_start_time = time.monotonic()
+            else:
+                self._calibration_confirm_start_time = float(
+                    timestamps[np.argmax(is_calibrated)])
+
+        return is_calibrated, min_values, max_values
 
     def is_calibrated(self):
         return self._is_calibrated
 
-    def get_calibration_progress_percentage(self):
+    def get_calibration_mode(self):
+        return self._calibration_mode
+
+    def get_calibration_progress_percentage(self, timestamp=None):
         """Returns the calibration confirmation percentage. When 100 is reached, no more updates of min and max estimates are necessary.
+
+        Args:
+            timestamp (float): Monotonic time to get the progress for. The current time is used if None.
         """
         if not self._is_calibrated:
             return 0
         else:
-            calibration_duration_elapsed = time.monotonic(
-            ) - self._calibration_confirm_start_time
+            if timestamp is None:
+                timestamp = time.monotonic()
+            calibration_duration_elapsed = timestamp - self._calibration_confirm_start_time
             raw_percentage = int(100 * calibration_duration_elapsed /
                                  self._calibration_confirm_duration)
             # Return a value between 1 and 100
             return min(max(1, raw_percentage), 100)
 
+    def get_calibration_progress_percentage_batch(self, is_calibrated, timestamps):
+        """Returns an array with the calibration confirmation percentage at each timestamp of a batch.
+
+        Args:
+            is_calibrated (np.ndarray): Calibration state after each value of the batch, as returned by input_batch().
+            timestamps (np.ndarray): Monotonic times of the values in seconds.
+        """
+        import numpy as np
+        if self._calibration_confirm_start_time is None:
+            return np.zeros(len(timestamps), dtype=int)
+        calibration_duration_elapsed = np.asarray(
+            timestamps, dtype=float) - self._calibration_confirm_start_time
+        raw_percentages = (100 * calibration_duration_elapsed /
+                           self._calibration_confirm_duration).astype(int)
+        return np.where(is_calibrated, np.clip(raw_percentages, 1, 100), 0)
+
+    def get_state(self, timestamp=None):
+        """Returns the min max estimates and the calibration progress as a json serializable dict, see restore_state().
+        The value window is not part of the state.
+
+        Args:
+            timestamp (float): Monotonic time of the state. The current time is used if None.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        calibration_confirm_elapsed = None
+        if self._calibration_confirm_start_time is not None:
+            # Monotonic times are not comparable across restarts, so the elapsed duration is stored instead. It is limited
+            # to the confirmation duration to keep the state constant once the calibration is confirmed.
+            calibration_confirm_elapsed = float(min(timestamp - self._calibration_confirm_start_time,
+                                                    self._calibration_confirm_duration))
+        return {"current_min": float(self._current_min),
+                "current_max": float(self._current_max),
+                "is_calibrated": bool(self._is_calibrated),
+                "calibration_confirm_elapsed": calibration_confirm_elapsed}
+
+    def restore_state(self, state, timestamp=None):
+        """Restore a state returned by get_state(), e.g. after a restart.
+
+        Args:
+            state (dict): State to restore.
+            timestamp (float): Monotonic time to continue the calibration confirmation from. The current time is used if None.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        self._current_min = state["current_min"]
+        self._current_max = state["current_max"]
+        self._is_calibrated = state["is_calibrated"]
+        self._calibration_confirm_start_time = None
+        if state["calibration_confirm_elapsed"] is not None:
+            self._calibration_confirm_start_time = timestamp - \
+                state["calibration_confirm_elapsed"]
+
     def get_expected_min_max(self):
         return (self._current_min, self._current_max)
 
+    def _update_from_oscillations(self, timestamp):
+        peaks = self._oscillation_tracker.get_peaks()
+        troughs = self._oscillation_tracker.get_troughs()
+        oscillation_count = min(len(peaks), len(troughs))
+        if oscillation_count < self._min_oscillations:
+            return
+        if self._is_calibrated and self.get_calibration_progress_percentage(timestamp) >= 100:
+            # The estimates are locked
+            return
+
+        # Medians are robust against single peaks that were distorted by noise or outliers
+        self._current_min = statistics.median(troughs)
+        self._current_max = statistics.median(peaks)
+        if not self._is_calibrated:
+            self._is_calibrated = True
+            self._calibration_confirm_start_time = timestamp
+            _logger.info("Calibrated after %d oscillations", oscillation_count)
+
+        if oscillation_count >= self._lock_oscillations:
+            max_standard_error = max(statistics.stdev(peaks) / math.sqrt(len(peaks)),
+                                     statistics.stdev(troughs) / math.sqrt(len(troughs)))
+            if max_standard_error < self._lock_tolerance * (self._current_max - self._current_min):
+                # Confirm the calibration now, it is stored and restored like a calibration confirmed after the duration
+                self._calibration_confirm_start_time = timestamp - self._calibration_confirm_duration
+                _logger.info("Calibration stable after %d oscillations", oscillation_count)
+
     def _is_sufficiently_excited(self):
 
         # Condition 1: buffer full
-        is_buffer_full = len(self._value_window) == self._value_window.maxlen
+        is_buffer_full = self._value_window.is_full()
 
         # Condition 2: min and max amplitude between 5% and 95% value are satisfied
-        biggest_amplitude = abs(np.percentile(
-            self._value_window, 95) - np.percentile(self._value_window, 5))/2.0
+        biggest_amplitude = abs(self._value_window.percentile(
+            95) - self._value_window.percentile(5))/2.0
         is_amplitude_range_ok = biggest_amplitude > self._min_amplitude and biggest_amplitude < self._max_amplitude
 
         # Condition 3: high enough standard deviation
-        self._current_std = np.std(self._value_window)
+        self._current_std = self._value_window.std()
         is_variance_big_enough = self._current_std > self._min_std
 
         return is_buffer_full and is_amplitude_range_ok and is_variance_big_enough
 
 
+class PhaseEstimator:
+    def __init__(self, activation_threshold_ratio, deactivation_threshold_ratio, extremum_margin_ratio=0.05,
+                 flow_rate_time_constant=60.0, max_fraction=0.999):
+        """Create an estimator of the fractional phase of the current oscillation and of the smoothed flow rate.
+
+        The signal is modeled as min + (max-min)*(1-cos(phase))/2. A period starts when the rising signal crosses the
+        activation threshold, which is where the trigger counts. Whether the signal is rising or falling is derived from
+        the trigger state and whether the signal already turned around at its extremum since the last trigger switch,
+        which is more robust against noise than the difference of consecutive values at low flows.
+
+        Args:
+            activation_threshold_ratio (float): Activation threshold ratio of the trigger.
+            deactivation_threshold_ratio (float): Deactivation threshold ratio of the trigger.
+            extremum_margin_ratio (float): Part of the range the signal has to move back from its extremum to count as
+                turned around.
+            flow_rate_time_constant (float): Time constant of the flow rate smoothing in seconds.
+            max_fraction (float): Upper limit of the fraction, so that the fractional count never reaches the next count
+                before the trigger counted it.
+        """
+        # Phases of the activation crossing of the rising signal and of the deactivation crossing of the falling signal
+        self._activation_phase = math.acos(1.0 - 2.0*activation_threshold_ratio)
+        self._deactivation_phase = 2.0*math.pi - \
+            math.acos(1.0 - 2.0*deactivation_threshold_ratio)
+        self._extremum_margin_ratio = extremum_margin_ratio
+        self._flow_rate_time_constant = flow_rate_time_constant
+        self._max_fraction = max_fraction
+        self.reset()
+
+    def reset(self):
+        """Forget the phase and the flow rate, e.g. after the count was restored.
+        """
+        self._was_activated = None
+        self._extremum = 0.0
+        self._count = None
+        self._fraction = 0.0
+        self._last_fractional_count = None
+        self._last_timestamp = None
+        self._flow_rate = 0.0
+
+    def input(self, value, timestamp, count, trigger):
+        """Update the phase with the value that the trigger just processed.
+
+        Args:
+            value (float): Value that was input to the trigger.
+            timestamp (float): Monotonic time of the value in seconds.
+            count (int): Count after the value.
+            trigger (HysteresisTrigger): The trigger that counts the periods.
+        """
+        fraction = 0.0
+        if trigger.is_configured():
+            fraction = self._estimate_fraction(value, trigger)
+
+        # Keep the fractional count monotonic: noise may move the phase backwards, but never the volume
+        if count == self._count:
+            fraction = max(fraction, self._fraction)
+        self._count = count
+        self._fraction = min(fraction, self._max_fraction)
+
+        fractional_count = count + self._fraction
+        if self._last_timestamp is not None and timestamp > self._last_timestamp:
+            elapsed_time = timestamp - self._last_timestamp
+            rate = (fractional_count - self._last_fractional_count) / elapsed_time
+            # Exponential smoothing that does not depend on the sample rate
+            alpha = 1.0 - math.exp(-elapsed_time / self._flow_rate_time_constant)
+            self._flow_rate += alpha * (rate - self._flow_rate)
+        self._last_fractional_count = fractional_count
+        self._last_timestamp = timestamp
+
+    def get_fraction(self):
+        return self._fraction
+
+    def get_flow_rate(self):
+        """Returns the smoothed flow rate in periods per second.
+        """
+        return self._flow_rate
+
+    def _estimate_fraction(self, value, trigger):
+        expected_min, expected_max = trigger.get_min_max()
+        value_range = expected_max - expected_min
+        if value_range <= 0.0:
+            return 0.0
+        is_activated = trigger.is_activated()
+        if is_activated != self._was_activated:
+            self._was_activated = is_activated
+            self._extremum = value
+        margin = self._extremum_margin_ratio * value_range
+        if is_activated:
+            # Rising towards the max until the signal turned around
+            self._extremum = max(self._extremum, value)
+            is_rising = value >= self._extremum - margin
+        else:
+            # Falling towards the min until the signal turned around
+            self._extremum = min(self._extremum, value)
+            is_rising = value > self._extremum + margin
+
+        normalized_value = min(max((value - expected_min) / value_range, 0.0), 1.0)
+        phase = math.acos(1.0 - 2.0*normalized_value)
+        if not is_rising:
+            phase = 2.0*math.pi - phase
+
+        # Limit the phase to the part of the period that matches the trigger state
+        if is_activated:
+            phase = min(max(phase, self._activation_phase), self._deactivation_phase)
+        else:
+            if phase < math.pi:
+                # The rising part before the next activation belongs to the end of the period
+                phase += 2.0*math.pi
+            phase = min(max(phase, self._deactivation_phase), 2.0*math.pi + self._activation_phase)
+        return (phase - self._activation_phase) / (2.0*math.pi)
+
+
 class ScalarPeriodCounter:
-    def __init__(self, max_period_length, min_amplitude, max_amplitude, min_std, calibration_duration=timedelta(days=1).total_seconds()):
-        # activation if 80 percent of expected amplitude is reached
-        hysteresis_activation_threshold_ratio = 0.8
-        hysteresis_deactivation_threshold_ratio = 0.7  # deactivation at 70 percent
+    def __init__(self, max_period_length, min_amplitude, max_amplitude, min_std, calibration_duration=timedelta(days=1).total_seconds(),
+                 backend="python", flow_rate_time_constant=60.0, activation_threshold_ratio=0.8,
+                 deactivation_threshold_ratio=0.7, calibration_mode="window"):
+        # by default activation if 80 percent of expected amplitude is reached
+        hysteresis_activation_threshold_ratio = activation_threshold_ratio
+        hysteresis_deactivation_threshold_ratio = deactivation_threshold_ratio  # by default deactivation at 70 percent
 
         # Initialize trigger
         self._trigger = HysteresisTrigger(
@@ -135,18 +643,30 @@ class ScalarPeriodCounter:
         # Initialize period counter
         self._counter = 0
 
+        # Initialize the estimator of the phase within the current period
+        self._phase_estimator = PhaseEstimator(
+            hysteresis_activation_threshold_ratio, hysteresis_deactivation_threshold_ratio,
+            flow_rate_time_constant=flow_rate_time_constant)
+
         # Initialize min max calibrator
         self._calibrator = MinMaxCalibrator(
-            10*max_period_length, min_amplitude, max_amplitude, min_std, calibration_duration)
+            10*max_period_length, min_amplitude, max_amplitude, min_std, calibration_duration, backend,
+            calibration_mode)
+        self._calibration_progress_percentage = 0
+
+    def record_scalar(self, scalar, timestamp=None):
+        """Records a scalar and counts a period if the scalar triggers one.
 
-    def record_scalar(self, scalar):
+        Args:
+            scalar (float): Scalar to record.
+            timestamp (float): Monotonic time at which the scalar was sampled in seconds. The current time is used if None.
+        """
         # input scalar to the calibrator
-        self._calibrator.input(scalar)
+        self._calibrator.input(scalar, timestamp)
 
         # Check if calibrator is calibrated and update the trigger with the min max estimates until calibration is confirmed
-        self._calibration_progress_percentage = self._calibrator.get_calibration_progress_percentage()
-        print("Calibration progress: " +
-              str(self._calibration_progress_percentage) + " %")
+        self._set_calibration_progress_percentage(
+            self._calibrator.get_calibration_progress_percentage(timestamp))
         if self._calibrator.is_calibrated() and self._calibration_progress_percentage < 100:
             # If yes, get the min max value estimates and configure the hysteresisTrigger with them until calibration is at 100
             min, max = self._calibrator.get_expected_min_max()
@@ -156,5 +676,101 @@ class ScalarPeriodCounter:
             # a new period has started, increment period counter
             self._counter = self._counter + 1
 
+        self._phase_estimator.input(
+            scalar, time.monotonic() if timestamp is None else timestamp, self._counter, self._trigger)
+
+    def record_batch(self, scalars, timestamps=None):
+        """Records an array of scalars like consecutive record_scalar() calls, using vectorized operations.
+
+        Returns an array with the count after each scalar.
+
+        Args:
+            scalars (np.ndarray): Scalars to record.
+            timestamps (np.ndarray): Monotonic times at which the scalars were sampled in seconds. If None, all scalars
+                are considered to be sampled at the current time.
+
+        The fractional count and the flow rate are only updated by record_scalar().
+        """
+        import numpy as np
+        scalars = np.asarray(scalars, dtype=float)
+        if self._calibrator.get_calibration_mode() != "window":
+            # The adaptive calibration may confirm within the batch, which the vectorized progress cannot follow
+            counts = np.empty(len(scalars), dtype=int)
+            for index, scalar in enumerate(scalars):
+                self.record_scalar(scalar, None if timestamps is None else timestamps[index])
+                counts[index] = self._counter
+            return counts
+        is_calibrated, min_values, max_values = self._calibrator.input_batch(
+            scalars, timestamps)
+
+        if timestamps is None:
+            # The whole batch is processed at once, so the calibration progress is the same for all scalars
+            self._set_calibration_progress_percentage(
+                self._calibrator.get_calibration_progress_percentage())
+            is_calibration_confirming = np.full(
+                len(scalars), self._calibration_progress_percentage < 100)
+        else:
+            progress_percentages = self._calibrator.get_calibration_progress_percentage_batch(
+                is_calibrated, timestamps)
+            if len(progress_percentages) > 0:
+                self._set_calibration_progress_percentage(
+                    int(progress_percentages[-1]))
+            is_calibration_confirming = progress_percentages < 100
+
+        # Configure the trigger with the min max estimates of all calibrated scalars until calibration is confirmed
+        is_configuring = is_calibrated & is_calibration_confirming
+        is_triggered = self._trigger.input_batch(scalars, np.where(is_configuring, min_values, np.nan),
+                                                 np.where(is_configuring, max_values, np.nan))
+
+        counts = self._counter + np.cumsum(is_triggered, dtype=int)
+        if len(counts) > 0:
+            self._counter = int(counts[-1])
+        return counts
+
     def get_count(self):
         return self._counter
+
+    def get_calibration_progress_percentage(self):
+        return self._calibration_progress_percentage
+
+    def get_fractional_count(self):
+        """Returns the count plus the estimated fraction of the current period. It never decreases and never reaches the
+        next count before the period is counted.
+        """
+        return self._counter + self._phase_estimator.get_fraction()
+
+    def get_flow_rate(self):
+        """Returns the smoothed flow rate in periods per second.
+        """
+        return self._phase_estimator.get_flow_rate()
+
+    def get_state(self, timestamp=None):
+        """Returns the count, the calibration and the trigger state as a json serializable dict, see restore_state().
+
+        Args:
+            timestamp (float): Monotonic time of the state. The current time is used if None.
+        """
+        return {"count": int(self._counter),
+                "calibrator": self._calibrator.get_state(timestamp),
+                "trigger": self._trigger.get_state()}
+
+    def restore_state(self, state, timestamp=None, restore_calibration=True):
+        """Restore a state returned by get_state(). With a restored calibration, counting continues immediately instead
+        of waiting for the value window to fill.
+
+        Args:
+            state (dict): State to restore.
+            timestamp (float): Monotonic time to continue the calibration confirmation from. The current time is used if None.
+            restore_calibration (bool): Only restore the count if False, e.g. because the detector parameters changed.
+        """
+        self._counter = state["count"]
+        self._phase_estimator.reset()
+        if restore_calibration:
+            self._calibrator.restore_state(state["calibrator"], timestamp)
+            self._trigger.restore_state(state["trigger"])
+
+    def _set_calibration_progress_percentage(self, percentage):
+        # Only log changes of the progress to keep the per sample cost low
+        if percentage != self._calibration_progress_percentage:
+            _logger.info("Calibration progress: %d %%", percentage)
+            self._calibration_progress_percentage = percentage
@@ -0,0 +1,517 @@
+import collections
+import logging
+import math
+import statistics
+import time
+from datetime import timedelta
+import numpy as np
+from src.tick_detector import CALIBRATION_MODES
+
+_logger = logging.getLogger(__name__)
+
+
+class SlidingWindowStatisticsArray:
+    def __init__(self, window_count, maxlen):
+        """Create one sliding window over the last maxlen values per meter, for meters that are sampled together. Like
+        SlidingWindowStatistics, percentiles and the standard deviation are available on every sample without sorting
+        the windows again, but all windows are updated with a few numpy operations.
+
+        The values of each window are kept sorted in one row of a matrix. Evicting the oldest value and inserting the
+        new one shifts the values between both ranks by one column, which is done for all rows at once with masks.
+
+        Args:
+            window_count (int): Number of windows.
+            maxlen (int): Number of values in each window.
+        """
+        # Rows are padded with inf until the windows are full, the padding sorts behind all values
+        self._sorted_values = np.full((window_count, maxlen), np.inf)
+        self._values = np.full((window_count, maxlen), np.inf)
+        self._columns = np.arange(maxlen)
+        self._rows = np.arange(window_count)
+        self._write_index = 0
+        self._count = 0
+        self._mean = np.zeros(window_count)
+        self._sum_squared_deviations = np.zeros(window_count)
+
+    @property
+    def maxlen(self):
+        return self._values.shape[1]
+
+    def __len__(self):
+        return self._count
+
+    def is_full(self):
+        return self._count == self.maxlen
+
+    def append(self, values):
+        """Add one value to every window and evict the oldest values if the windows are full.
+
+        Args:
+            values (np.ndarray): One value per window.
+        """
+        evicted_values = self._values[:, self._write_index].copy()
+        self._values[:, self._write_index] = values
+        self._write_index = (self._write_index + 1) % self.maxlen
+
+        # Rank of the evicted value and rank of the new value in the remaining values of each row
+        evicted_ranks = (self._sorted_values < evicted_values[:, None]).sum(axis=1)
+        ranks = (self._sorted_values < values[:, None]).sum(axis=1) - (evicted_values < values)
+        # Drop the evicted value from each row and insert the new value at its rank
+        remaining_values = self._sorted_values[self._columns != evicted_ranks[:, None]]
+        self._sorted_values[self._columns != ranks[:, None]] = remaining_values
+        self._sorted_values[self._rows, ranks] = values
+
+        # Same Welford updates as SlidingWindowStatistics, so that both give the same results
+        if self.is_full():
+            count = self._count - 1
+            delta = evicted_values - self._mean
+            self._mean -= delta / count
+            self._sum_squared_deviations -= delta * (evicted_values - self._mean)
+        else:
+            self._count += 1
+        delta = values - self._mean
+        self._mean += delta / self._count
+        self._sum_squared_deviations += delta * (values - self._mean)
+
+    def percentile(self, percentage):
+        """Returns the percentile of each window with linear interpolation between the closest ranks, like np.percentile.
+        """
+        if self._count == 0:
+            return np.full(len(self._rows), np.nan)
+        rank = percentage / 100.0 * (self._count - 1)
+        lower_rank = int(rank)
+        lower_values = self._sorted_values[:, lower_rank]
+        if lower_rank + 1 >= self._count:
+            return lower_values.copy()
+        upper_values = self._sorted_values[:, lower_rank + 1]
+        return lower_values + (upper_values - lower_values) * (rank - lower_rank)
+
+    def std(self):
+        """Returns the population standard deviation of each window, like np.std.
+        """
+        if self._count == 0:
+            return np.full(len(self._rows), np.nan)
+        return np.sqrt(np.maximum(self._sum_squared_deviations, 0.0) / self._count)
+
+
+class OscillationTrackerArray:
+    def __init__(self, tracker_count, min_swing, max_swing, min_std, std_length, max_extremum_count=100):
+        """Create one tracker of the peaks and troughs of an oscillation per meter, see OscillationTracker. The state
+        machines of all meters advance with a few numpy operations per sample, only the confirmed extrema are appended
+        one by one.
+
+        Args:
+            tracker_count (int): Number of meters.
+            min_swing (float): Minimum difference between a peak and the previous trough or vice versa to record it.
+            max_swing (float): Maximum difference between a peak and the previous trough or vice versa to record it.
+            min_std (float): Minimum standard deviation of the values to record extrema.
+            std_length (int): Number of values the standard deviation is averaged over.
+            max_extremum_count (int): Number of most recent peaks and troughs that are kept per meter.
+        """
+        self._hysteresis = min_swing / 2.0
+        self._min_swing = min_swing
+        self._max_swing = max_swing
+        self._min_variance = min_std**2
+        self._alpha = 1.0 / max(1, std_length)
+        # The last three values of all meters for the median that removes single outliers
+        self._recent_values = np.zeros((3, tracker_count))
+        self._value_count = 0
+        self._mean = np.zeros(tracker_count)
+        self._variance = np.zeros(tracker_count)
+        # 1 while rising, 0 while falling, -1 until the first move
+        self._direction = np.full(tracker_count, -1, dtype=np.int8)
+        self._low = np.zeros(tracker_count)
+        self._high = np.zeros(tracker_count)
+        self._extremum = np.zeros(tracker_count)
+        self._last_extremum = np.zeros(tracker_count)
+        self._peaks = [collections.deque(maxlen=max_extremum_count) for tracker in range(tracker_count)]
+        self._troughs = [collections.deque(maxlen=max_extremum_count) for tracker in range(tracker_count)]
+
+    def input(self, values):
+        """Returns the indices of the meters whose value confirmed a new peak or trough that was recorded.
+        """
+        self._recent_values[self._value_count % 3] = values
+        self._value_count += 1
+        if self._value_count == 1:
+            values = values.copy()
+            self._mean[:] = values
+            self._low[:] = values
+            self._high[:] = values
+        elif self._value_count == 2:
+            # The upper of two values, like the median of the sorted recent values
+            values = np.maximum(self._recent_values[0], self._recent_values[1])
+        else:
+            first, second, third = self._recent_values
+            values = np.maximum(np.minimum(first, second), np.minimum(np.maximum(first, second), third))
+        delta = values - self._mean
+        self._mean += self._alpha * delta
+        self._variance = (1.0 - self._alpha) * (self._variance + self._alpha * delta * delta)
+
+        # Wait for the first move in either direction, the start value is only the reference for the next extremum
+        is_starting = self._direction < 0
+        self._low = np.where(is_starting, np.minimum(self._low, values), self._low)
+        self._high = np.where(is_starting, np.maximum(self._high, values), self._high)
+        starts_falling = is_starting & (values < self._high - self._hysteresis)
+        starts_rising = is_starting & ~starts_falling & (values > self._low + self._hysteresis)
+
+        # Follow the extremum until the value turned back by the hysteresis
+        is_rising = self._direction == 1
+        is_falling = self._direction == 0
+        is_extending = (is_rising & (values > self._extremum)) | (is_falling & (values < self._extremum))
+        is_peak = is_rising & ~is_extending & (values < self._extremum - self._hysteresis)
+        is_trough = is_falling & ~is_extending & (values > self._extremum + self._hysteresis)
+        is_confirmed = is_peak | is_trough
+        swings = np.abs(self._extremum - self._last_extremum)
+        is_recorded = is_confirmed & (swings > self._min_swing) & (swings < self._max_swing) & \
+            (self._variance > self._min_variance)
+        recorded_indices = np.flatnonzero(is_recorded)
+        for index in recorded_indices:
+            extrema = self._peaks[index] if is_peak[index] else self._troughs[index]
+            extrema.append(float(self._extremum[index]))
+
+        self._last_extremum = np.where(is_confirmed, self._extremum, np.where(
+            starts_falling, self._high, np.where(starts_rising, self._low, self._last_extremum)))
+        self._extremum = np.where(is_extending | is_confirmed | starts_falling | starts_rising, values, self._extremum)
+        self._direction[is_peak | starts_falling] = 0
+        self._direction[is_trough | starts_rising] = 1
+        return recorded_indices
+
+    def get_peaks(self, index):
+        return self._peaks[index]
+
+    def get_troughs(self, index):
+        return self._troughs[index]
+
+
+class ScalarPeriodCounterArray:
+    def __init__(self, meter_count, max_period_length, min_amplitude, max_amplitude, min_std,
+                 calibration_duration=timedelta(days=1).total_seconds(), flow_rate_time_constant=60.0,
+                 activation_threshold_ratio=0.8, deactivation_threshold_ratio=0.7, calibration_mode="window",
+                 extremum_margin_ratio=0.05, max_fraction=0.999):
+        """Create period counters for several meters that are sampled together. Behaves like one ScalarPeriodCounter per
+        meter, including the adaptive calibration, the fractional count and the flow rate, but keeps the calibrator,
+        trigger and phase state of all meters in arrays, so that one vectorized update step serves all meters.
+
+        Every step costs a fixed number of numpy operations, each over one value per meter or over the sorted value
+        windows, so the cost per sample barely grows with the number of meters. The fixed cost of the numpy calls is
+        about that of four ScalarPeriodCounters, see the meters benchmarks in benchmarks/benchmark_pipeline.py, so a
+        single meter is cheaper with a ScalarPeriodCounter.
+
+        Args:
+            meter_count (int): Number of meters.
+            max_period_length (int): Maximum period length in samples, see ScalarPeriodCounter.
+            min_amplitude (float): Minimum amplitude for the calibration, see MinMaxCalibrator.
+            max_amplitude (float): Maximum amplitude for the calibration, see MinMaxCalibrator.
+            min_std (float): Minimum standard deviation for the calibration, see MinMaxCalibrator.
+            calibration_duration (float): Calibration confirmation duration in seconds, see MinMaxCalibrator.
+            flow_rate_time_constant (float): Time constant of the flow rate smoothing in seconds, see PhaseEstimator.
+            activation_threshold_ratio (float): Part of the calibrated range at which a period is counted.
+            deactivation_threshold_ratio (float): Part of the calibrated range below which the next period can start.
+            calibration_mode (str): One of CALIBRATION_MODES, see MinMaxCalibrator.
+            extremum_margin_ratio (float): See PhaseEstimator.
+            max_fraction (float): See PhaseEstimator.
+        """
+        assert activation_threshold_ratio > deactivation_threshold_ratio
+        if calibration_mode not in CALIBRATION_MODES:
+            raise ValueError("Unknown calibration mode {}".format(calibration_mode))
+        # by default activation if 80 percent of expected amplitude is reached, deactivation at 70 percent
+        self._activation_threshold_ratio = activation_threshold_ratio
+        self._deactivation_threshold_ratio = deactivation_threshold_ratio
+
+        self._min_amplitude = min_amplitude
+        self._max_amplitude = max_amplitude
+        self._min_std = min_std
+        self._calibration_confirm_duration = calibration_duration
+
+        # Calibrator state, with the same defaults as MinMaxCalibrator
+        self._value_windows = None
+        self._oscillation_trackers = None
+        if calibration_mode == "window":
+            self._value_windows = SlidingWindowStatisticsArray(meter_count, 10*max_period_length)
+        else:
+            self._oscillation_trackers = OscillationTrackerArray(
+                meter_count, 2.0*min_amplitude, 2.0*max_amplitude, min_std, max_period_length)
+            self._min_oscillations = 3
+            self._lock_oscillations = 10
+            self._lock_tolerance = 0.02
+        self._current_min = np.full(meter_count, np.inf)
+        self._current_max = np.full(meter_count, -np.inf)
+        self._is_calibrated = np.zeros(meter_count, dtype=bool)
+        self._calibration_confirm_start_time = np.full(meter_count, np.nan)
+        self._calibration_progress_percentages = np.zeros(meter_count, dtype=int)
+
+        # Trigger state
+        self._activation_threshold = np.zeros(meter_count)
+        self._deactivation_threshold = np.zeros(meter_count)
+        self._is_activated = np.zeros(meter_count, dtype=bool)
+        self._is_configured = np.zeros(meter_count, dtype=bool)
+
+        self._counts = np.zeros(meter_count, dtype=np.int64)
+
+        # Phase estimator state, see PhaseEstimator
+        self._activation_phase = math.acos(1.0 - 2.0*activation_threshold_ratio)
+        self._deactivation_phase = 2.0*math.pi - math.acos(1.0 - 2.0*deactivation_threshold_ratio)
+        self._extremum_margin_ratio = extremum_margin_ratio
+        self._flow_rate_time_constant = flow_rate_time_constant
+        self._max_fraction = max_fraction
+        # -1 for meters that were not configured yet
+        self._was_activated = np.full(meter_count, -1, dtype=np.int8)
+        self._phase_extremum = np.zeros(meter_count)
+        self._phase_counts = np.full(meter_count, -1, dtype=np.int64)
+        self._fractions = np.zeros(meter_count)
+        self._last_fractional_counts = np.zeros(meter_count)
+        # All meters are sampled together, only meters that were restored miss the previous fractional count
+        self._last_timestamp = None
+        self._has_last_fractional_counts = np.zeros(meter_count, dtype=bool)
+        self._flow_rates = np.zeros(meter_count)
+        self._update_phase_model()
+
+        # The triggers are only configured again when the estimates changed, and the progress only when the next
+        # percentage is reached, which keeps the per sample cost low during the day long confirmation
+        self._is_estimate_changed = False
+        self._next_progress_time = np.inf
+
+    def get_meter_count(self):
+        return len(self._counts)
+
+    def record_scalars(self, scalars, timestamp=None):
+        """Records one scalar per meter and counts the periods that the scalars trigger.
+
+        Args:
+            scalars (np.ndarray): One scalar per meter.
+            timestamp (float): Monotonic time at which the scalars were sampled in seconds. The current time is used if None.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        scalars = np.asarray(scalars, dtype=float)
+        if self._value_windows is not None:
+            self._update_window_calibration(scalars, timestamp)
+        else:
+            self._update_oscillation_calibration(scalars, timestamp)
+        self._update_calibration_progress(timestamp)
+
+        # Configure the triggers with the min max estimates until the calibration is confirmed
+        if self._is_estimate_changed:
+            self._is_estimate_changed = False
+            is_configuring = self._is_calibrated & (self._calibration_progress_percentages < 100)
+            ranges = self._current_max[is_configuring] - self._current_min[is_configuring]
+            self._activation_threshold[is_configuring] = self._current_min[is_configuring] + \
+                self._activation_threshold_ratio*ranges
+            self._deactivation_threshold[is_configuring] = self._current_min[is_configuring] + \
+                self._deactivation_threshold_ratio*ranges
+            self._is_configured |= is_configuring
+            self._update_phase_model()
+
+        # Hysteresis: activate at the activation threshold and stay activated above the deactivation threshold
+        is_triggered = self._is_configured & ~self._is_activated & (
+            scalars >= self._activation_threshold)
+        self._is_activated = self._is_configured & (
+            is_triggered | (self._is_activated & (scalars > self._deactivation_threshold)))
+        self._counts += is_triggered
+
+        self._update_phase(scalars, timestamp)
+
+    def get_counts(self):
+        return self._counts
+
+    def get_fractional_counts(self):
+        """Returns the counts plus the estimated fractions of the current periods, see
+        ScalarPeriodCounter.get_fractional_count().
+        """
+        return self._counts + self._fractions
+
+    def get_flow_rates(self):
+        """Returns the smoothed flow rates in periods per second.
+        """
+        return self._flow_rates
+
+    def get_calibration_progress_percentages(self):
+        return self._calibration_progress_percentages
+
+    def _update_window_calibration(self, scalars, timestamp):
+        self._value_windows.append(scalars)
+        if not self._value_windows.is_full():
+            return
+        # Same conditions as MinMaxCalibrator, with the 5 and 95 percentiles to be robust against outliers
+        lower = self._value_windows.percentile(5)
+        upper = self._value_windows.percentile(95)
+        biggest_amplitude = np.abs(upper - lower)/2.0
+        is_excited = (biggest_amplitude > self._min_amplitude) & (biggest_amplitude < self._max_amplitude) & \
+            (self._value_windows.std() > self._min_std)
+        if not is_excited.any():
+            return
+        self._current_min = np.where(is_excited, np.minimum(self._current_min, lower), self._current_min)
+        self._current_max = np.where(is_excited, np.maximum(self._current_max, upper), self._current_max)
+        self._is_estimate_changed = True
+        # Start calibration confirmation of newly calibrated meters
+        newly_calibrated = is_excited & ~self._is_calibrated
+        if newly_calibrated.any():
+            self._calibration_confirm_start_time[newly_calibrated] = timestamp
+            self._is_calibrated |= is_excited
+            self._next_progress_time = -np.inf
+
+    def _update_oscillation_calibration(self, scalars, timestamp):
+        # Only meters that just recorded a peak or trough update their estimates, about twice per period
+        for index in self._oscillation_trackers.input(scalars):
+            self._update_from_oscillations(index, timestamp)
+
+    def _update_from_oscillations(self, index, timestamp):
+        # Same estimates as MinMaxCalibrator._update_from_oscillations()
+        peaks = self._oscillation_trackers.get_peaks(index)
+        troughs = self._oscillation_trackers.get_troughs(index)
+        oscillation_count = min(len(peaks), len(troughs))
+        if oscillation_count < self._min_oscillations:
+            return
+        if self._is_calibrated[index] and int(100 * (timestamp - self._calibration_confirm_start_time[index]) /
+                                              self._calibration_confirm_duration) >= 100:
+            # The estimates are locked
+            return
+
+        # Medians are robust against single peaks that were distorted by noise or outliers
+        self._current_min[index] = statistics.median(troughs)
+        self._current_max[index] = statistics.median(peaks)
+        self._is_estimate_changed = True
+        if not self._is_calibrated[index]:
+            self._is_calibrated[index] = True
+            self._calibration_confirm_start_time[index] = timestamp
+            self._next_progress_time = -np.inf
+            _logger.info("Meter %d calibrated after %d oscillations", index, oscillation_count)
+
+        if oscillation_count >= self._lock_oscillations:
+            max_standard_error = max(statistics.stdev(peaks) / math.sqrt(len(peaks)),
+                                     statistics.stdev(troughs) / math.sqrt(len(troughs)))
+            if max_standard_error < self._lock_tolerance * (self._current_max[index] - self._current_min[index]):
+                # Confirm the calibration now, it is stored and restored like a calibration confirmed after the duration
+                self._calibration_confirm_start_time[index] = timestamp - self._calibration_confirm_duration
+                self._next_progress_time = -np.inf
+                _logger.info("Meter %d calibration stable after %d oscillations", index, oscillation_count)
+
+    def _update_calibration_progress(self, timestamp):
+        # The progress only changes when the next percentage of a meter that is not confirmed yet is reached
+        if timestamp < self._next_progress_time:
+            return
+        elapsed_percentages = np.where(
+            self._is_calibrated, 100 * (timestamp - self._calibration_confirm_start_time) /
+            self._calibration_confirm_duration, 0.0)
+        percentages = np.where(self._is_calibrated, np.minimum(
+            np.maximum(elapsed_percentages.astype(int), 1), 100), 0)
+        changed = np.flatnonzero(percentages != self._calibration_progress_percentages)
+        for index in changed:
+            _logger.info("Meter %d calibration progress: %d %%", index, percentages[index])
+        self._calibration_progress_percentages = percentages
+        if len(changed) > 0:
+            # Meters that confirmed their calibration stop configuring their triggers
+            self._is_estimate_changed = True
+
+        is_confirming = self._is_calibrated & (percentages < 100)
+        self._next_progress_time = np.inf
+        if is_confirming.any():
+            # A microsecond early, so that rounding never delays a percentage
+            self._next_progress_time = np.min(
+                self._calibration_confirm_start_time[is_confirming] +
+                (np.maximum(elapsed_percentages[is_confirming].astype(int), 1) + 1) *
+                self._calibration_confirm_duration / 100) - 1e-6
+
+    def _update_phase_model(self):
+        # Same min and max as HysteresisTrigger.get_min_max(), only derived again when the triggers are configured
+        threshold_ranges = (self._activation_threshold - self._deactivation_threshold) / \
+            (self._activation_threshold_ratio - self._deactivation_threshold_ratio)
+        self._expected_min = self._activation_threshold - self._activation_threshold_ratio*threshold_ranges
+        value_ranges = (self._expected_min + threshold_ranges) - self._expected_min
+        self._is_estimated = self._is_configured & (value_ranges > 0.0)
+        self._value_ranges = np.where(self._is_estimated, value_ranges, 1.0)
+        self._margins = self._extremum_margin_ratio * self._value_ranges
+
+    def _update_phase(self, scalars, timestamp):
+        # Same model as PhaseEstimator, with the min and max the triggers were configured with
+        is_activated = self._is_activated
+        is_estimated = self._is_estimated
+
+        # Restart following the extremum when the trigger state switched
+        extremum = self._phase_extremum
+        is_switching = is_estimated & (is_activated != self._was_activated)
+        if is_switching.any():
+            self._was_activated[is_switching] = is_activated[is_switching]
+            extremum = np.where(is_switching, scalars, extremum)
+        extremum = np.where(is_activated, np.maximum(extremum, scalars), np.minimum(extremum, scalars))
+        self._phase_extremum = np.where(is_estimated, extremum, self._phase_extremum)
+        is_rising = np.where(is_activated, scalars >= extremum - self._margins, scalars > extremum + self._margins)
+
+        normalized_values = np.minimum(np.maximum((scalars - self._expected_min) / self._value_ranges, 0.0), 1.0)
+        phases = np.arccos(1.0 - 2.0*normalized_values)
+        phases = np.where(is_rising, phases, 2.0*math.pi - phases)
+        # Limit the phase to the part of the period that matches the trigger state
+        activated_phases = np.minimum(np.maximum(phases, self._activation_phase), self._deactivation_phase)
+        deactivated_phases = np.minimum(np.maximum(np.where(phases < math.pi, phases + 2.0*math.pi, phases),
+                                                   self._deactivation_phase), 2.0*math.pi + self._activation_phase)
+        phases = np.where(is_activated, activated_phases, deactivated_phases)
+        fractions = np.where(is_estimated, (phases - self._activation_phase) / (2.0*math.pi), 0.0)
+
+        # Keep the fractional counts monotonic: noise may move the phase backwards, but never the volume
+        fractions = np.where(self._counts == self._phase_counts, np.maximum(fractions, self._fractions), fractions)
+        self._phase_counts[:] = self._counts
+        self._fractions = np.minimum(fractions, self._max_fraction)
+
+        fractional_counts = self._counts + self._fractions
+        if self._last_timestamp is not None and timestamp > self._last_timestamp:
+            elapsed_time = timestamp - self._last_timestamp
+            rates = (fractional_counts - self._last_fractional_counts) / elapsed_time
+            # Exponential smoothing that does not depend on the sample rate
+            alpha = 1.0 - math.exp(-elapsed_time / self._flow_rate_time_constant)
+            self._flow_rates += np.where(self._has_last_fractional_counts, alpha * (rates - self._flow_rates), 0.0)
+        self._last_fractional_counts = fractional_counts
+        self._last_timestamp = timestamp
+        self._has_last_fractional_counts[:] = True
+
+    def get_state(self, index, timestamp=None):
+        """Returns the state of one meter in the format of ScalarPeriodCounter.get_state().
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        calibration_confirm_elapsed = None
+        if not np.isnan(self._calibration_confirm_start_time[index]):
+            calibration_confirm_elapsed = float(min(timestamp - self._calibration_confirm_start_time[index],
+                                                    self._calibration_confirm_duration))
+        return {"count": int(self._counts[index]),
+                "calibrator": {"current_min": float(self._current_min[index]),
+                               "current_max": float(self._current_max[index]),
+                               "is_calibrated": bool(self._is_calibrated[index]),
+                               "calibration_confirm_elapsed": calibration_confirm_elapsed},
+                "trigger": {"activation_threshold": float(self._activation_threshold[index]),
+                            "deactivation_threshold": float(self._deactivation_threshold[index]),
+                            "is_activated": bool(self._is_activated[index]),
+                            "is_configured": bool(self._is_configured[index])}}
+
+    def restore_state(self, index, state, timestamp=None, restore_calibration=True):
+        """Restore the state of one meter, see ScalarPeriodCounter.restore_state().
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        self._counts[index] = state["count"]
+        # Forget the phase and the flow rate, like PhaseEstimator.reset()
+        self._was_activated[index] = -1
+        self._phase_extremum[index] = 0.0
+        self._phase_counts[index] = -1
+        self._fractions[index] = 0.0
+        self._has_last_fractional_counts[index] = False
+        self._flow_rates[index] = 0.0
+        if not restore_calibration:
+            return
+        calibrator_state = state["calibrator"]
+        self._current_min[index] = calibrator_state["current_min"]
+        self._current_max[index] = calibrator_state["current_max"]
+        self._is_calibrated[index] = calibrator_state["is_calibrated"]
+        self._calibration_confirm_start_time[index] = np.nan
+        # The progress is computed again with the next sample
+        self._calibration_progress_percentages[index] = 0
+        if calibrator_state["calibration_confirm_elapsed"] is not None:
+            self._calibration_confirm_start_time[index] = timestamp - \
+                calibrator_state["calibration_confirm_elapsed"]
+        trigger_state = state["trigger"]
+        self._activation_threshold[index] = trigger_state["activation_threshold"]
+        self._deactivation_threshold[index] = trigger_state["deactivation_threshold"]
+        self._is_activated[index] = trigger_state["is_activated"]
+        self._is_configured[index] = trigger_state["is_configured"]
+        self._update_phase_model()
+        self._is_estimate_changed = True
+        self._next_progress_time = -np.inf
@@ -0,0 +1,203 @@
+import bisect
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_logger = logging.getLogger(__name__)
+
+# One native float64 unix timestamp per tick, the byte order of memoryview.cast("d")
+TICK_FORMAT = "=d"
+TICK_SIZE = struct.calcsize(TICK_FORMAT)
+# Limits the size of the answer to a bucket query, e.g. a year in 15 minute buckets
+MAX_BUCKET_COUNT = 40000
+
+
+class TickStore:
+    def __init__(self, path):
+        """Create an append-only log of tick timestamps, e.g. to query the consumption per hour or day without depending
+        on the recorder of Home Assistant.
+
+        Each tick is stored as one 8 byte timestamp, so a year of a gas meter with 0.01 m³ per tick takes about 2 MB. The
+        timestamps are sorted, so range queries bisect the memory mapped file instead of scanning it. Appends and
+        queries can run in different threads without a lock, a query only sees the ticks that were complete when it
+        started.
+
+        Args:
+            path (str): File to append the ticks to. Existing ticks are kept.
+        """
+        self._path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "ab")
+        # A tick that was only partially written when the add-on was killed is dropped
+        size = self._file.tell()
+        if size % TICK_SIZE != 0:
+            _logger.warning("Dropping a partially written tick at the end of %s", path)
+            self._file.truncate(size - size % TICK_SIZE)
+        self._last_timestamp = -math.inf
+        with self._open_view() as timestamps:
+            if len(timestamps) > 0:
+                self._last_timestamp = timestamps[-1]
+        self._last_count = None
+
+    def record_count(self, count, timestamp=None):
+        """Append one tick per count increment since the last call. The first call after the start only synchronizes to
+        the count, which may have been restored from a checkpoint. Cheap enough to be called for every sample.
+
+        Args:
+            count (int): Current tick count of the meter.
+            timestamp (float): Unix time of the ticks. The current time is used if None.
+        """
+        if self._last_count is not None and count > self._last_count:
+            self.append(time.time() if timestamp is None else timestamp, count - self._last_count)
+        self._last_count = count
+
+    def append(self, timestamp, tick_count=1):
+        """Append ticks with the same timestamp.
+
+        Args:
+            timestamp (float): Unix time of the ticks. It is raised to the last stored timestamp if the clock went back,
+                so that the log stays sorted.
+            tick_count (int): Number of ticks.
+        """
+        timestamp = max(timestamp, self._last_timestamp)
+        self._file.write(struct.pack(TICK_FORMAT, timestamp) * tick_count)
+        self._file.flush()
+        self._last_timestamp = timestamp
+
+    def get_tick_count(self, start=-math.inf, end=math.inf):
+        """Returns the number of ticks with start <= timestamp < end, 0 if the end is before the start.
+        """
+        with self._open_view() as timestamps:
+            return max(0, bisect.bisect_left(timestamps, end) - bisect.bisect_left(timestamps, start))
+
+    def get_bucket_counts(self, start, end, bucket_time):
+        """Returns the number of ticks in each bucket of bucket_time seconds from start to end, e.g. the consumption per
+        hour of a day. The last bucket ends at end even if it is shorter. Needs two bisections per bucket.
+        """
+        if not all(math.isfinite(value) for value in (start, end, bucket_time)):
+            raise ValueError("The start, the end and the bucket time have to be finite")
+        if bucket_time <= 0.0:
+            raise ValueError("The bucket time has to be positive")
+        # Checked before rounding, the quotient can still overflow to infinity for a tiny bucket time
+        bucket_count = (end - start) / bucket_time
+        if bucket_count > MAX_BUCKET_COUNT:
+            raise ValueError("At most {} buckets can be queried".format(MAX_BUCKET_COUNT))
+        bucket_count = max(0, math.ceil(bucket_count))
+        boundaries = [min(start + index * bucket_time, end) for index in range(bucket_count + 1)]
+        with self._open_view() as timestamps:
+            positions = [bisect.bisect_left(timestamps, boundary) for boundary in boundaries]
+        return [positions[index + 1] - positions[index] for index in range(bucket_count)]
+
+    def close(self):
+        self._file.close()
+
+    def _open_view(self):
+        return _TimestampView(self._path)
+
+
+class _TimestampView:
+    def __init__(self, path):
+        # Sequence of the complete timestamps in the file that bisect can search
+        self._path = path
+        self._file = None
+        self._map = None
+        self._bytes = None
+        self._timestamps = []
+
+    def __enter__(self):
+        self._file = open(self._path, "rb")
+        size = os.fstat(self._file.fileno()).st_size // TICK_SIZE * TICK_SIZE
+        if size > 0:
+            self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+            self._bytes = memoryview(self._map)
+            self._timestamps = self._bytes.cast("d")
+        return self._timestamps
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The views have to be released before the map can be closed
+        if self._map is not None:
+            self._timestamps.release()
+            self._bytes.release()
+            self._map.close()
+        self._file.close()
+
+
+class _TickStoreRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        meters = self.server.meters
+        name = query.get("meter", next(iter(meters)))
+        if name not in meters:
+            self.send_error(404, "Unknown meter")
+            return
+        tick_store, m3_per_tick = meters[name]
+        try:
+            end = float(query.get("end", time.time()))
+            start = float(query.get("start", end - 86400.0))
+            if start > end:
+                raise ValueError("The start has to be before the end")
+            if url.path == "/ticks":
+                tick_count = tick_store.get_tick_count(start, end)
+                response = {"meter": name, "start": start, "end": end, "ticks": tick_count,
+                            "volume": tick_count * m3_per_tick}
+            elif url.path == "/buckets":
+                bucket_time = float(query.get("bucket", 3600.0))
+                bucket_counts = tick_store.get_bucket_counts(start, end, bucket_time)
+                response = {"meter": name, "start": start, "end": end, "bucket": bucket_time, "ticks": bucket_counts,
+                            "volumes": [bucket_count * m3_per_tick for bucket_count in bucket_counts]}
+            else:
+                self.send_error(404)
+                return
+        except ValueError as error:
+            self.send_error(400, str(error))
+            return
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        _logger.debug(format, *args)
+
+
+class TickStoreServer:
+    def __init__(self, meters, port, host="127.0.0.1"):
+        """Create a http server in its own thread that answers consumption queries of tick stores with json:
+            /ticks?start=<unix time>&end=<unix time>&meter=<name>
+                Number of ticks and volume between start and end.
+            /buckets?start=<unix time>&end=<unix time>&bucket=<seconds>&meter=<name>
+                Number of ticks and volume per bucket, e.g. per hour with bucket=3600.
+        The end defaults to now, the start to one day before the end and the meter to the first meter.
+
+        Args:
+            meters (dict): Meter name -> (TickStore, volume per tick).
+            port (int): Port to listen on. 0 picks a free port, see get_port().
+            host (str): Address to listen on.
+        """
+        self._server = ThreadingHTTPServer((host, port), _TickStoreRequestHandler)
+        self._server.daemon_threads = True
+        self._server.meters = meters
+        self._thread = threading.Thread(target=self._server.serve_forever, name="tick_store", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        _logger.info("Serving the tick history on port %d", self.get_port())
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def get_port(self):
+        return self._server.server_address[1]
@@ -0,0 +1,62 @@
+import time
+
+
+class VolumeReporter:
+    def __init__(self, publishers, m3_per_ticks, fractional_interval=10.0, clock=time.monotonic):
+        """Create a reporter that turns meter readings into volume updates for the publishers.
+
+        Count changes are reported immediately. The fractional volume and the flow rate change with nearly every sample,
+        so they are only reported with a count change or at most once per fractional interval.
+
+        Args:
+            publishers (list): One CoalescingPublisher per meter.
+            m3_per_ticks (list): Volume per tick of each meter.
+            fractional_interval (float): Minimum time between two updates of the fractional volume and the flow rate in
+                seconds if the count did not change.
+            clock (callable): Monotonic clock returning seconds.
+        """
+        self._publishers = publishers
+        self._m3_per_ticks = m3_per_ticks
+        self._fractional_interval = fractional_interval
+        self._clock = clock
+        self._last_payloads = [None] * len(publishers)
+        self._last_update_times = [None] * len(publishers)
+
+    def update(self, readings):
+        """Report the latest readings.
+
+        Args:
+            readings (list): One dict per meter with the count and optionally the fractional_count and the flow_rate in
+                ticks per second, see RetroMeter.get_readings().
+        """
+        now = self._clock()
+        for index, reading in enumerate(readings):
+            last_payload = self._last_payloads[index]
+            is_count_changed = last_payload is None or reading["count"] != last_payload["count"]
+            if not is_count_changed and ("fractional_count" not in reading or
+                                         now - self._last_update_times[index] < self._fractional_interval):
+                continue
+
+            payload = self.create_payload(reading, self._m3_per_ticks[index])
+            if payload == last_payload:
+                continue
+            self._publishers[index].update(payload)
+            self._last_payloads[index] = payload
+            self._last_update_times[index] = now
+
+    def poll(self):
+        for publisher in self._publishers:
+            publisher.poll()
+
+    def flush(self):
+        for publisher in self._publishers:
+            publisher.flush()
+
+    @staticmethod
+    def create_payload(reading, m3_per_tick):
+        payload = {"volume": reading["count"] * m3_per_tick, "count": reading["count"]}
+        if "fractional_count" in reading:
+            # Rounded, so that an idle meter stops producing updates once the flow rate decayed
+            payload["volume_fractional"] = round(reading["fractional_count"] * m3_per_tick, 6)
+            payload["flow_rate"] = round(reading["flow_rate"] * m3_per_tick * 3600.0, 6)  # m³/h
+        return payload
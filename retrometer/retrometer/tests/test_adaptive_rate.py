@@ -0,0 +1,118 @@
+import unittest
+from unittest.mock import MagicMock
+import numpy as np
+from src.adaptive_rate import AdaptiveRateController
+from src.sampling_scheduler import SamplingScheduler
+from src.tick_detector import ScalarPeriodCounter
+
+
+class TestAdaptiveRateController(unittest.TestCase):
+    def setUp(self) -> None:
+        self.active_sample_time = 0.05
+        self.max_period_time = 1.0
+        self.scheduler = SamplingScheduler(self.active_sample_time)
+        self.magnetometer = MagicMock()
+        self.controller = AdaptiveRateController(self.active_sample_time, self.max_period_time, activity_threshold=20.0,
+                                                 idle_sample_time=10.0, idle_delay=60.0, scheduler=self.scheduler,
+                                                 magnetometer=self.magnetometer)
+        return super().setUp()
+
+    def helper_sample(self, signal, start_time, end_time):
+        """Sample a signal function like the measurement loop with the sample time of the controller and return the
+        sample times and values.
+        """
+        times = []
+        values = []
+        timestamp = start_time
+        while timestamp < end_time:
+            self.controller.apply()
+            value = signal(timestamp)
+            self.controller.input(value, timestamp)
+            times.append(timestamp)
+            values.append(value)
+            timestamp += self.controller.get_sample_time()
+        return times, values
+
+    def test_idle_rate(self):
+        # Given a controller with an idle sample time longer than allowed for the max period time
+
+        # When the signal is flat for longer than the idle delay
+        self.helper_sample(lambda timestamp: 100.0, 0.0, 70.0)
+
+        # We expect the idle rate to be limited to a quarter period and to be applied to the scheduler and the sensor
+        self.assertTrue(self.controller.is_idle())
+        self.assertEqual(self.controller.get_sample_time(), self.max_period_time / 4.0)
+        self.assertEqual(self.scheduler.get_sample_time(), self.max_period_time / 4.0)
+        self.magnetometer.set_continuous_measurement_frequency.assert_called_with(8.0)
+
+        # When the signal moves
+        self.helper_sample(lambda timestamp: 150.0, 70.0, 70.1)
+
+        # We expect the full rate immediately
+        self.assertFalse(self.controller.is_idle())
+        self.assertEqual(self.scheduler.get_sample_time(), self.active_sample_time)
+        self.magnetometer.set_continuous_measurement_frequency.assert_called_with(40.0)
+
+    def test_no_missed_ticks_at_max_flow(self):
+        # Given a meter that is calibrated at the max flow, then idle for some minutes and then runs at the max flow again
+        counter = ScalarPeriodCounter(int(self.max_period_time / self.active_sample_time), 20, 8000, 20,
+                                      calibration_duration=10.0)
+        flow_start_time = 600.0
+        periods = 50
+
+        def signal(timestamp):
+            if timestamp < 60.0:
+                return 500.0 * np.sin(2.0 * np.pi * timestamp / self.max_period_time)
+            if timestamp < flow_start_time:
+                return 0.0
+            return 500.0 * np.sin(2.0 * np.pi * (timestamp - flow_start_time) / self.max_period_time)
+
+        # When the signal is sampled with the adaptive rate and counted
+        times, values = self.helper_sample(signal, 0.0, 60.0)
+        for timestamp, value in zip(times, values):
+            counter.record_scalar(value, timestamp)
+        times, values = self.helper_sample(signal, 60.0, flow_start_time)
+        idle_sample_count = len(times)
+        for timestamp, value in zip(times, values):
+            counter.record_scalar(value, timestamp)
+        count_before_flow = counter.get_count()
+        times, values = self.helper_sample(signal, flow_start_time, flow_start_time + periods * self.max_period_time)
+        for timestamp, value in zip(times, values):
+            counter.record_scalar(value, timestamp)
+
+        # We expect far fewer samples while idle and every period of the max flow to be counted
+        self.assertLess(idle_sample_count, 0.35 * (flow_start_time - 60.0) / self.active_sample_time)
+        self.assertEqual(counter.get_count() - count_before_flow, periods)
+
+    def test_idle_rate_follows_threshold_ratios(self):
+        for activation_threshold_ratio, deactivation_threshold_ratio in [(0.8, 0.7), (0.9, 0.8), (0.6, 0.1)]:
+            with self.subTest(activation_threshold_ratio=activation_threshold_ratio,
+                              deactivation_threshold_ratio=deactivation_threshold_ratio):
+                # Given a controller for a trigger with the threshold ratios that is idle
+                self.controller = AdaptiveRateController(
+                    self.active_sample_time, self.max_period_time, activity_threshold=20.0, idle_delay=0.0,
+                    activation_threshold_ratio=activation_threshold_ratio,
+                    deactivation_threshold_ratio=deactivation_threshold_ratio)
+                self.helper_sample(lambda timestamp: 100.0, 0.0, 0.1)
+                idle_sample_time = self.controller.get_sample_time()
+
+                # When a sine at the max flow is sampled at the idle rate, starting at any phase
+                for start_time in np.linspace(0.0, self.max_period_time, 100, endpoint=False):
+                    times = start_time + np.arange(0.0, 20.0, idle_sample_time)
+                    normalized_values = (1.0 - np.cos(2.0*np.pi*times/self.max_period_time)) / 2.0
+                    # The signal is above the activation threshold around the middle and below the deactivation threshold
+                    # around the start of each period
+                    periods = (times // self.max_period_time).astype(int)
+                    shifted_periods = ((times + self.max_period_time/2.0) // self.max_period_time).astype(int)
+
+                    # We expect a sample above the activation and one below the deactivation threshold in every whole
+                    # period
+                    whole_periods = set(range(1, 20))
+                    activated_periods = set(periods[normalized_values >= activation_threshold_ratio].tolist())
+                    deactivated_periods = set(shifted_periods[normalized_values <= deactivation_threshold_ratio].tolist())
+                    self.assertLessEqual(whole_periods, activated_periods)
+                    self.assertLessEqual(whole_periods, deactivated_periods)
+
+
+if __name__ == '__main__':
+    unittest.main()
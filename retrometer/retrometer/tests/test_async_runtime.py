@@ -0,0 +1,128 @@
+import unittest
+import asyncio
+import os
+import tempfile
+import time
+import numpy as np
+from types import SimpleNamespace
+from src.async_runtime import AsyncRuntime
+from src.checkpoint import Checkpointer
+from src.fake_smbus import FakeMMC5983MABus, create_sine_waveform
+from src.magnetometer import MMC5983MA
+from src.mqtt_publisher import CoalescingPublisher, MQTT_ERR_SUCCESS, MQTT_ERR_NO_CONN
+from src.retro_meter import RetroMeter
+from src.sampling_scheduler import SamplingScheduler
+from src.volume_reporter import VolumeReporter
+
+
+class SlowFakeClient:
+    def __init__(self, publish_time):
+        """Mqtt client stand-in for a slow broker, every publish blocks and every second publish finds the connection
+        lost.
+        """
+        self.publish_time = publish_time
+        self.payloads = []
+        self._next_mid = 1
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        time.sleep(self.publish_time)
+        mid = self._next_mid
+        self._next_mid += 1
+        self.payloads.append(payload)
+        return SimpleNamespace(rc=MQTT_ERR_NO_CONN if mid % 2 == 0 else MQTT_ERR_SUCCESS, mid=mid)
+
+
+class FakeMeter:
+    def __init__(self):
+        """Meter stand-in that counts one tick every ten samples and records the time of each sensor read.
+        """
+        self.read_times = []
+        self._count = 0
+
+    def is_count_updated(self):
+        return True
+
+    def read_sample(self):
+        self.read_times.append(time.monotonic())
+        return (float(len(self.read_times)), 0.0, 0.0)
+
+    def process_sample(self, sample, timestamp=None):
+        self._count = int(sample[0]) // 10
+        return self._count
+
+    def get_readings(self):
+        return [{"count": self._count}]
+
+    def get_state(self, timestamp=None):
+        return {"count": self._count}
+
+
+class TestAsyncRuntime(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.sample_time = 0.01
+        self.meter = FakeMeter()
+        self.scheduler = SamplingScheduler(self.sample_time)
+        self.client = SlowFakeClient(publish_time=0.2)
+        self.publisher = CoalescingPublisher(self.client, "meter/gas_volume", coalesce_interval=0.0)
+        self.checkpointer = Checkpointer(os.path.join(self.temp_dir.name, "checkpoint.json"), {}, min_interval=0.0)
+        self.runtime = AsyncRuntime(self.meter, self.scheduler, VolumeReporter([self.publisher], [0.01]),
+                                    checkpointer=self.checkpointer)
+        return super().setUp()
+
+    def helper_run(self, duration):
+        async def run():
+            asyncio.get_running_loop().call_later(duration, self.runtime.stop)
+            await self.runtime.run()
+        asyncio.run(run())
+
+    def test_slow_broker_does_not_delay_sampling(self):
+        # Given a broker that needs 20 sample times per publish and a count that changes every 10 samples
+
+        # When the runtime runs for one second
+        self.helper_run(1.0)
+
+        # We expect sampling on the deadlines without gaps, although publishes blocked most of the time
+        read_intervals = np.diff(self.meter.read_times)
+        self.assertGreater(len(self.meter.read_times), 0.8 / self.sample_time)
+        self.assertLess(np.max(read_intervals), 5 * self.sample_time)
+        self.assertEqual(self.runtime.get_statistics()["dropped_samples"], 0)
+
+        # We expect the publishes to be coalesced instead of queued up
+        self.assertGreaterEqual(len(self.client.payloads), 2)
+        self.assertLess(len(self.client.payloads), len(self.meter.read_times) // 10)
+
+    def test_stop_publishes_and_saves_latest_count(self):
+        # Given a running runtime
+
+        # When it is stopped
+        self.helper_run(0.3)
+
+        # We expect the latest count to be published and stored in the checkpoint
+        final_count = len(self.meter.read_times) // 10
+        self.assertIn('"count": {}'.format(final_count), self.client.payloads[-1])
+        state, _ = self.checkpointer.load()
+        self.assertEqual(state, {"count": final_count})
+
+    def test_skips_failed_i2c_transactions(self):
+        # Given an emulated sensor where a fifth of the transactions fail after the setup
+        bus = FakeMMC5983MABus(create_sine_waveform(300.0, 0.5), seed=1)
+        meter = RetroMeter(MMC5983MA(bus, measurement_frequency=100), "x", 50, 20.0, 8000, 3.0)
+        bus.set_error_rate(0.2)
+        self.runtime = AsyncRuntime(meter, self.scheduler, VolumeReporter([self.publisher], [0.01]))
+
+        # When the runtime runs for one second
+        with self.assertLogs("src.async_runtime", "WARNING") as logs:
+            self.helper_run(1.0)
+
+        # We expect every failed transaction to skip its sample and to be counted, without stopping the acquisition
+        self.assertEqual(len(logs.records), 1)
+        statistics = self.runtime.get_statistics()
+        self.assertGreater(statistics["i2c_errors"], 0)
+        self.assertEqual(statistics["i2c_errors"], bus.get_statistics()["errors"])
+        self.assertGreater(statistics["samples"], 0.8 / self.sample_time)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+import os
+import tempfile
+from src.checkpoint import Checkpointer
+from src.tick_detector import ScalarPeriodCounter
+import numpy as np
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCheckpointer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, "checkpoint.json")
+        self.config = {"mag_axis": "x", "max_period_time": 1.0}
+        self.clock = FakeClock()
+        self.checkpointer = Checkpointer(
+            self.path, self.config, min_interval=300.0, clock=self.clock)
+
+        # A sine with a period of 1s sampled at 20Hz
+        self.times = np.arange(0.0, 60.0, 0.05)
+        self.values = 300.0*np.sin(2.0*np.pi*self.times)
+        return super().setUp()
+
+    def test_save_and_load(self):
+        # Given no checkpoint
+        self.assertIsNone(self.checkpointer.load())
+
+        # When a state is saved
+        self.checkpointer.save({"count": 3})
+
+        # We expect it to be loaded with a matching config and no temporary file to be left
+        self.assertEqual(Checkpointer(self.path, self.config).load(), ({"count": 3}, True))
+        self.assertEqual(os.listdir(self.temp_dir.name), ["checkpoint.json"])
+
+        # We expect a different config to be detected
+        self.assertEqual(Checkpointer(self.path, {"mag_axis": "y"}).load(), ({"count": 3}, False))
+
+    def test_corrupt_checkpoint_ignored(self):
+        # Given a corrupt checkpoint file
+        with open(self.path, "w") as file:
+            file.write("{\"version\": 1, \"sta")
+
+        # We expect it to be ignored
+        self.assertIsNone(self.checkpointer.load())
+
+    def test_write_interval(self):
+        # We expect the first save to be due after the minimum interval
+        self.assertFalse(self.checkpointer.is_due())
+        self.clock.now = 300.0
+        self.assertTrue(self.checkpointer.is_due())
+
+        # When a state is saved
+        self.checkpointer.save({"count": 1})
+
+        # We expect the next save not to be due before the minimum interval passed again
+        self.clock.now = 500.0
+        self.assertFalse(self.checkpointer.is_due())
+
+    def test_count_interval(self):
+        # Given a checkpointer with a count interval and a saved state
+        checkpointer = Checkpointer(self.path, self.config, min_interval=300.0, clock=self.clock, count_interval=60.0)
+        checkpointer.save({"count": 1}, [{"count": 1}])
+
+        # We expect no save before the count interval, even if the count changed
+        self.clock.now = 30.0
+        self.assertFalse(checkpointer.is_due([{"count": 2}]))
+
+        # We expect a save after the count interval only if the count changed
+        self.clock.now = 60.0
+        self.assertFalse(checkpointer.is_due([{"count": 1}]))
+        self.assertTrue(checkpointer.is_due([{"count": 2}]))
+
+        # When the changed count is saved
+        checkpointer.save({"count": 2}, [{"count": 2}])
+
+        # We expect the next save to wait for the next change or the minimum interval
+        self.clock.now = 200.0
+        self.assertFalse(checkpointer.is_due([{"count": 2}]))
+        self.clock.now = 360.0
+        self.assertTrue(checkpointer.is_due([{"count": 2}]))
+
+    def test_unchanged_state_not_written(self):
+        # Given a saved state
+        self.checkpointer.save({"count": 1})
+        modification_time = os.stat(self.path).st_mtime_ns
+        os.remove(self.path)
+
+        # When the same state is saved again
+        self.checkpointer.save({"count": 1})
+
+        # We expect no write
+        self.assertFalse(os.path.exists(self.path))
+        self.assertGreater(modification_time, 0)
+
+    def test_counting_resumes_after_restore(self):
+        # Given a counter that calibrated and counted on a sine
+        counter = ScalarPeriodCounter(20, 20, 8000, 20)
+        for timestamp, value in zip(self.times, self.values):
+            counter.record_scalar(value, timestamp)
+        self.checkpointer.save(counter.get_state(self.times[-1]))
+
+        # When a new counter is restored from the checkpoint and gets two more periods
+        state, is_config_matching = Checkpointer(self.path, self.config).load()
+        restored_counter = ScalarPeriodCounter(20, 20, 8000, 20)
+        restored_counter.restore_state(state, timestamp=1000.0)
+        for timestamp, value in zip(self.times[:40], self.values[:40]):
+            restored_counter.record_scalar(value, 1000.0 + timestamp)
+
+        # We expect counting to continue immediately instead of after ten periods
+        self.assertEqual(restored_counter.get_count(), counter.get_count() + 2)
+
+        # We expect the calibration confirmation to continue where it stopped
+        self.assertEqual(restored_counter._calibrator.get_calibration_progress_percentage(1000.0),
+                         counter._calibrator.get_calibration_progress_percentage(self.times[-1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import errno
+from src.fake_smbus import FakeMMC5983MABus, SimulatedClock, create_sine_waveform
+from src.magnetometer import MMC5983MA
+
+
+class TestFakeMMC5983MABus(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = SimulatedClock()
+        return super().setUp()
+
+    def helper_create_bus(self, waveform=None, **kwargs):
+        # Every transaction takes 0.2 ms of simulated time, so that the setup of the driver sees the first measurement
+        return FakeMMC5983MABus(waveform, latency=2e-4, clock=self.clock.monotonic, sleep=self.clock.sleep, **kwargs)
+
+    def test_encoding_matches_driver(self):
+        # Given a constant field with values that the 18 bit output can represent exactly
+        field = (123.4375, -50.0, 7000.0625)
+        bus = self.helper_create_bus(lambda timestamp: field, temperature=30.0)
+
+        # When the driver reads it with block and with single byte reads
+        burst_values = MMC5983MA(bus, use_burst_read=True).read_magnetometer()
+        bytewise_values = MMC5983MA(bus, use_burst_read=False).read_magnetometer()
+
+        # We expect the field and the temperature of the emulated sensor
+        self.assertEqual(burst_values, field)
+        self.assertEqual(bytewise_values, field)
+        self.assertAlmostEqual(MMC5983MA(bus).read_temperature(), 30.0, delta=0.8)
+
+    def test_control_writes_and_data_ready_timing(self):
+        # Given a sensor that is set up for 50 Hz with a 200 Hz bandwidth
+        bus = self.helper_create_bus(create_sine_waveform(300.0, 1.0))
+        magnetometer = MMC5983MA(bus, measurement_frequency=50, bandwidth=200, set_reset_interval=100)
+        self.assertEqual(bus.get_measurement_frequency(), 50)
+        self.assertEqual(bus.get_measurement_duration(), 4e-3)
+        self.assertTrue(bus.is_auto_set_reset_enabled())
+
+        # When the status is polled every millisecond for one second
+        start_time = self.clock.monotonic()
+        measurement_count = 0
+        while self.clock.monotonic() - start_time < 1.0:
+            if magnetometer.is_new_meas_available():
+                magnetometer.read_magnetometer()
+                measurement_count += 1
+            self.clock.sleep(1e-3)
+
+        # We expect every measurement to be reported exactly once
+        self.assertAlmostEqual(measurement_count, 50, delta=1)
+
+        # When the frequency is lowered
+        magnetometer.set_continuous_measurement_frequency(8.0)
+
+        # We expect the emulated sensor to measure slower
+        self.assertEqual(bus.get_measurement_frequency(), 10)
+
+    def test_error_injection(self):
+        # Given a bus where each transaction fails with a probability of one half
+        bus = self.helper_create_bus(error_rate=0.5, seed=0)
+
+        # When the magnetometer is read repeatedly
+        errors = []
+        for _ in range(200):
+            try:
+                bus.read_i2c_block_data(MMC5983MA.i2caddress, MMC5983MA.Xout0Reg, MMC5983MA.burstReadLength)
+            except OSError as error:
+                errors.append(error.errno)
+
+        # We expect about half of the reads to fail with remote I/O errors like from a disturbed bus, and the
+        # transactions to take the latency
+        self.assertAlmostEqual(len(errors), 100, delta=25)
+        self.assertEqual(set(errors), {errno.EREMOTEIO})
+        self.assertEqual(bus.get_statistics(), {"transactions": 200, "errors": len(errors)})
+        self.assertAlmostEqual(self.clock.monotonic(), 200 * 2e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import errno
+from unittest.mock import MagicMock, call, patch
+from src.magnetometer import MMC5983MA
+
+
+class TestMMC5983MA(unittest.TestCase):
+    def setUp(self) -> None:
+        # Register contents of a sensor with a new measurement available
+        self.registers = [0x8A, 0x3C, 0x71, 0x05, 0x12, 0xF0, 0b10011100, 0x55, 0b00000001]
+        self.bus = MagicMock()
+        self.bus.read_byte_data.side_effect = lambda address, register: self.registers[register]
+        self.bus.read_i2c_block_data.side_effect = lambda address, register, length: self.registers[register:register+length]
+
+        # Skip the sensor startup wait time
+        patcher = patch("src.magnetometer.time.sleep")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return super().setUp()
+
+    def test_burst_and_bytewise_decode_equal(self):
+        # Given one magnetometer reading with block reads and one with single byte reads
+        burst_magnetometer = MMC5983MA(self.bus, use_burst_read=True)
+        bytewise_magnetometer = MMC5983MA(self.bus, use_burst_read=False)
+
+        # When both read the magnetometer values
+        burst_values = burst_magnetometer.read_magnetometer()
+        bytewise_values = bytewise_magnetometer.read_magnetometer()
+
+        # We expect the same decoded values
+        self.assertEqual(burst_values, bytewise_values)
+        expected_x = ((0x8A << 10) + (0x3C << 2) + 0b10) * 0.0625 - 8000.0
+        expected_y = ((0x71 << 10) + (0x05 << 2) + 0b01) * 0.0625 - 8000.0
+        expected_z = ((0x12 << 10) + (0xF0 << 2) + 0b11) * 0.0625 - 8000.0
+        self.assertEqual(burst_values, (expected_x, expected_y, expected_z))
+
+    def test_burst_read_single_transaction(self):
+        # Given a magnetometer reading with block reads
+        magnetometer = MMC5983MA(self.bus, use_burst_read=True)
+        # Ignore the status polling of the setup
+        self.bus.reset_mock()
+
+        # When a status check is followed by a magnetometer read
+        self.assertTrue(magnetometer.is_new_meas_available())
+        magnetometer.read_magnetometer()
+
+        # We expect exactly one block transaction and no single byte reads
+        self.bus.read_i2c_block_data.assert_called_once()
+        self.bus.read_byte_data.assert_not_called()
+
+    def test_burst_read_fallback(self):
+        # Given a bus that does not support block reads
+        self.bus.read_i2c_block_data.side_effect = OSError(errno.EOPNOTSUPP, "Operation not supported")
+        magnetometer = MMC5983MA(self.bus, use_burst_read=True)
+
+        # When the magnetometer is read twice
+        first_values = magnetometer.read_magnetometer()
+        magnetometer.read_magnetometer()
+
+        # We expect the single byte reads to decode the values and block reads not to be tried again
+        self.assertEqual(first_values, MMC5983MA(self.bus, use_burst_read=False).read_magnetometer())
+        self.bus.read_i2c_block_data.assert_called_once()
+
+    def test_burst_read_bus_error_raised(self):
+        # Given a bus that fails with a transmission error
+        self.bus.read_i2c_block_data.side_effect = OSError(errno.EREMOTEIO, "Remote I/O error")
+        magnetometer = MMC5983MA(self.bus, use_burst_read=True)
+
+        # We expect the error to be raised instead of silently switching to single byte reads
+        with self.assertRaises(OSError):
+            magnetometer.read_magnetometer()
+
+
+    def test_set_continuous_measurement_frequency(self):
+        # Given a magnetometer measuring continuously at 100 Hz
+        magnetometer = MMC5983MA(self.bus)
+        self.bus.write_byte_data.reset_mock()
+
+        # When a frequency between the supported frequencies is requested
+        frequency = magnetometer.set_continuous_measurement_frequency(8.0)
+
+        # We expect the next higher frequency with continuous measurements kept enabled
+        self.assertEqual(frequency, 10)
+        self.bus.write_byte_data.assert_called_once_with(MMC5983MA.i2caddress, MMC5983MA.controlReg2, 0b00001010)
+
+        # We expect no i2c transaction if the frequency does not change and an error for unsupported frequencies
+        magnetometer.set_continuous_measurement_frequency(10.0)
+        self.bus.write_byte_data.assert_called_once()
+        with self.assertRaises(ValueError):
+            magnetometer.set_continuous_measurement_frequency(2000.0)
+
+    def test_setup_configuration(self):
+        # Given a sensor whose first measurement is ready at the third status poll
+        self.bus.read_byte_data.side_effect = [0b00000000, 0b00000010, 0b00000001]
+
+        # When it is set up with 200 Hz, 200 Hz bandwidth and a set operation every 100 measurements
+        MMC5983MA(self.bus, measurement_frequency=200, bandwidth=200, set_reset_interval=100)
+
+        # We expect the control registers to be written and the status to be polled until the measurement is ready
+        self.bus.write_byte_data.assert_has_calls([
+            call(MMC5983MA.i2caddress, MMC5983MA.controlReg1, 0b01),
+            call(MMC5983MA.i2caddress, MMC5983MA.controlReg0, 0b00100110),
+            call(MMC5983MA.i2caddress, MMC5983MA.controlReg2, 0b10111110)])
+        self.assertEqual(self.bus.read_byte_data.call_count, 3)
+
+    def test_frequency_limited_by_bandwidth(self):
+        # Given a magnetometer with the lowest bandwidth, whose measurements take 8 ms
+        magnetometer = MMC5983MA(self.bus, bandwidth=100)
+
+        # We expect frequencies that do not leave enough time per measurement to be rejected
+        with self.assertRaises(ValueError):
+            MMC5983MA(self.bus, measurement_frequency=200, bandwidth=100)
+        with self.assertRaises(ValueError):
+            magnetometer.set_continuous_measurement_frequency(150.0)
+        self.assertEqual(magnetometer.set_continuous_measurement_frequency(100.0), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import unittest
+import argparse
+from types import SimpleNamespace
+import measure_gas
+from src.fake_smbus import FakeMMC5983MABus, SimulatedClock, create_sine_waveform
+from src.magnetometer import MMC5983MA
+from src.metrics import MetricsRegistry, DiagnosticsPublisher
+from src.multi_retro_meter import MultiRetroMeter
+from src.mqtt_publisher import CoalescingPublisher, MQTT_ERR_SUCCESS
+from src.retro_meter import RetroMeter
+from src.sampling_scheduler import SamplingScheduler
+from src.volume_reporter import VolumeReporter
+
+
+class FakeClient:
+    def __init__(self):
+        self.payloads = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.payloads.append(payload)
+        return SimpleNamespace(rc=MQTT_ERR_SUCCESS, mid=len(self.payloads))
+
+
+class TestRunLoop(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = SimulatedClock()
+        self.client = FakeClient()
+        self.measurement_frequency = 20
+        # One tick every 2 seconds
+        self.tick_period = 2.0
+        return super().setUp()
+
+    def helper_run(self, duration, error_rate=0.0, diagnostics_publisher=None):
+        bus = FakeMMC5983MABus(create_sine_waveform(300.0, self.tick_period, noise_std=2.0, seed=0), latency=2e-4,
+                               seed=1, clock=self.clock.monotonic, sleep=self.clock.sleep)
+        sample_time = 1.0 / self.measurement_frequency
+        meter = RetroMeter(MMC5983MA(bus, measurement_frequency=self.measurement_frequency), "x",
+                           int(3.0 / sample_time), 20.0, 8000, 3.0, calibration_mode="adaptive")
+        # The setup of the sensor is not retried, so the bus is only disturbed afterwards
+        bus.set_error_rate(error_rate)
+        scheduler = SamplingScheduler(sample_time, clock=self.clock.monotonic, sleep=self.clock.sleep)
+        publisher = CoalescingPublisher(self.client, "meter/gas_volume", clock=self.clock.monotonic)
+        reporter = VolumeReporter([publisher], [0.01], clock=self.clock.monotonic)
+        start_time = self.clock.monotonic()
+        measure_gas.run_loop(meter, scheduler, reporter, diagnostics_publisher=diagnostics_publisher,
+                             is_running=lambda: self.clock.monotonic() - start_time < duration)
+        return meter, bus
+
+    def test_counts_emulated_sensor(self):
+        # Given an emulated sensor with a meter that ticks every 2 seconds
+
+        # When the loop runs for 10 simulated minutes
+        meter, _ = self.helper_run(600.0)
+
+        # We expect nearly all ticks to be counted after the calibration, and the final count to be published
+        count = meter.get_readings()[0]["count"]
+        self.assertGreater(count, 600.0 / self.tick_period - 5)
+        self.assertLessEqual(count, 600.0 / self.tick_period)
+        self.assertIn('"count": {}'.format(count), self.client.payloads[-1])
+
+    def test_publishes_diagnostics(self):
+        # Given a diagnostics publisher with an interval of one minute
+        diagnostics_client = FakeClient()
+        diagnostics_publisher = DiagnosticsPublisher(diagnostics_client, "meter/diagnostics", MetricsRegistry(),
+                                                     interval=60.0, clock=self.clock.monotonic)
+
+        # When the loop runs for 10 simulated minutes
+        meter, _ = self.helper_run(600.0, diagnostics_publisher=diagnostics_publisher)
+
+        # We expect the diagnostics to be published every minute besides the volume updates
+        self.assertAlmostEqual(len(diagnostics_client.payloads), 10, delta=1)
+        self.assertIn('"count": {}'.format(meter.get_readings()[0]["count"]), self.client.payloads[-1])
+
+    def test_survives_i2c_errors(self):
+        # Given an emulated sensor where one percent of the transactions fail
+
+        # When the loop runs
+        with self.assertLogs("retrometer", "WARNING") as logs:
+            meter, bus = self.helper_run(600.0, error_rate=0.01)
+
+        # We expect the failed samples to be skipped without losing ticks, and only the first failure to be logged
+        count = meter.get_readings()[0]["count"]
+        self.assertGreater(bus.get_statistics()["errors"], 1)
+        self.assertEqual(len(logs.records), 1)
+        self.assertGreater(count, 600.0 / self.tick_period - 5)
+        self.assertIn('"count": {}'.format(count), self.client.payloads[-1])
+
+
+class TestCreateMeter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = SimulatedClock()
+        self.args = argparse.Namespace(activationratio=0.8, deactivationratio=0.7, calibrationmode="window",
+                                       detectorbackend=None)
+        return super().setUp()
+
+    def helper_create_meter(self, meter_configs, tick_periods):
+        magnetometers = [MMC5983MA(FakeMMC5983MABus(create_sine_waveform(300.0, tick_period, axis=meter_config["axis"]),
+                                                    latency=2e-4, clock=self.clock.monotonic, sleep=self.clock.sleep),
+                                   measurement_frequency=20)
+                         for meter_config, tick_period in zip(meter_configs, tick_periods)]
+        none_per_meter = [None] * len(meter_configs)
+        return measure_gas.create_meter(self.args, meter_configs, magnetometers, 20, 20.0, 8000, 3.0, none_per_meter,
+                                        none_per_meter, none_per_meter)
+
+    def test_several_meters(self):
+        # Given two meters on different axes that tick every 1 and every 2 seconds, with the adaptive calibration
+        self.args.calibrationmode = "adaptive"
+        meter_configs = [{"name": "gas", "axis": "x"}, {"name": "water", "axis": "y"}]
+
+        # When the meter is created and sampled for 10 simulated minutes
+        meter = self.helper_create_meter(meter_configs, [1.0, 2.0])
+        scheduler = SamplingScheduler(0.05, clock=self.clock.monotonic, sleep=self.clock.sleep)
+        clients = [FakeClient(), FakeClient()]
+        publishers = [CoalescingPublisher(client, topic, clock=self.clock.monotonic)
+                      for client, topic in zip(clients, ["gas", "water"])]
+        reporter = VolumeReporter(publishers, [0.01, 0.01], clock=self.clock.monotonic)
+        measure_gas.run_loop(meter, scheduler, reporter, is_running=lambda: self.clock.monotonic() < 600.0)
+
+        # We expect one detector for both meters that counts each meter with the fractional count and the flow rate
+        self.assertIsInstance(meter, MultiRetroMeter)
+        readings = meter.get_readings()
+        self.assertAlmostEqual(readings[0]["count"], 600, delta=15)
+        self.assertAlmostEqual(readings[1]["count"], 300, delta=15)
+        self.assertAlmostEqual(readings[0]["flow_rate"], 1.0, delta=0.1)
+        self.assertAlmostEqual(readings[1]["flow_rate"], 0.5, delta=0.05)
+        self.assertIn("volume_fractional", clients[1].payloads[-1])
+
+    def test_single_meter(self):
+        # Given a single meter config
+        meter_configs = [{"name": "gas", "axis": "x"}]
+
+        # When the meter is created
+        meter = self.helper_create_meter(meter_configs, [2.0])
+
+        # We expect a scalar meter
+        self.assertIsInstance(meter, RetroMeter)
+
+
+class TestCreateMagnetometers(unittest.TestCase):
+    def test_rejects_sensors_at_the_same_address(self):
+        # Given meter configs that address the same sensor in different ways
+        conflicting_meter_configs = [
+            [{"name": "gas", "bus": 1, "mux_channel": 2}, {"name": "water", "bus": 1, "mux_channel": 2}],
+            [{"name": "gas", "bus": 1, "mux_channel": 2, "mux_address": 0x70},
+             {"name": "water", "bus": 1, "mux_channel": 2}],
+            [{"name": "gas", "bus": 1, "mux_channel": 2, "mux_address": 0x70},
+             {"name": "water", "bus": 1, "mux_channel": 3, "mux_address": 0x71}],
+            [{"name": "gas"}, {"name": "water", "bus": 1}],
+            [{"name": "gas", "bus": 1}, {"name": "water", "bus": 1, "mux_channel": 0}]]
+
+        for meter_configs in conflicting_meter_configs:
+            with self.subTest(meter_configs=meter_configs):
+                # When the magnetometers are created, we expect an error that names both meters before a bus is opened
+                with self.assertRaisesRegex(ValueError, "gas.*water|water.*gas"):
+                    measure_gas.create_magnetometers(meter_configs)
+
+    def test_accepts_distinct_sensors(self):
+        # Given meters on different channels of one multiplexer and a meter directly on another bus
+        meter_configs = [{"name": "gas", "bus": 1, "mux_channel": 0}, {"name": "water", "bus": 1, "mux_channel": 1},
+                         {"name": "heat", "bus": 2}]
+
+        # When the meter configs are checked, we expect no error
+        measure_gas.check_meter_sensors(meter_configs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import json
+import urllib.request
+from unittest.mock import MagicMock
+from src.metrics import MetricsRegistry, MetricsServer, InstrumentedBus, DiagnosticsPublisher
+from src.retro_meter import RetroMeter
+from src.multi_retro_meter import MultiRetroMeter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        self.registry = MetricsRegistry()
+        return super().setUp()
+
+    def test_render_prometheus_text(self):
+        # Given a counter, a gauge with labels and a histogram
+        self.registry.counter("test_events_total", "Events").inc(3)
+        self.registry.gauge("test_level", "Level", meter="gas").set(2.5)
+        histogram = self.registry.histogram("test_seconds", "Durations", buckets=[0.1, 1.0])
+        for value in [0.05, 0.1, 0.5, 2.0]:
+            histogram.observe(value)
+
+        # When the registry is rendered
+        lines = self.registry.render().splitlines()
+
+        # We expect the text exposition format with cumulative buckets
+        self.assertIn("# TYPE test_events_total counter", lines)
+        self.assertIn("test_events_total 3.0", lines)
+        self.assertIn('test_level{meter="gas"} 2.5', lines)
+        self.assertIn("# TYPE test_seconds histogram", lines)
+        self.assertIn('test_seconds_bucket{le="0.1"} 2.0', lines)
+        self.assertIn('test_seconds_bucket{le="1.0"} 3.0', lines)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 4.0', lines)
+        self.assertIn("test_seconds_sum 2.65", lines)
+        self.assertIn("test_seconds_count 4.0", lines)
+
+    def test_server(self):
+        # Given a metrics server on a free port with a collector
+        self.registry.add_collector(lambda: self.registry.gauge("test_collected", "Collected").set(7))
+        server = MetricsServer(self.registry, 0)
+        server.start()
+        self.addCleanup(server.stop)
+
+        # When the metrics are scraped
+        url = "http://127.0.0.1:{}/metrics".format(server.get_port())
+        with urllib.request.urlopen(url, timeout=5.0) as response:
+            body = response.read().decode("utf-8")
+
+        # We expect the collected metrics
+        self.assertIn("test_collected 7.0", body)
+
+    def test_instrumented_bus(self):
+        # Given an instrumented bus whose block reads fail
+        bus = MagicMock()
+        bus.read_byte_data.return_value = 42
+        bus.read_i2c_block_data.side_effect = OSError(5, "Input/output error")
+        instrumented_bus = InstrumentedBus(bus, self.registry, "1")
+
+        # When it is used like a bus
+        self.assertEqual(instrumented_bus.read_byte_data(0x30, 0x08), 42)
+        with self.assertRaises(OSError):
+            instrumented_bus.read_i2c_block_data(0x30, 0x00, 9)
+
+        # We expect the latency of both transactions and the error to be recorded
+        snapshot = self.registry.get_snapshot()
+        self.assertEqual(snapshot['retrometer_i2c_transaction_seconds{bus="1",operation="read_byte_data"}']["count"], 1)
+        self.assertEqual(snapshot['retrometer_i2c_transaction_seconds{bus="1",operation="read_i2c_block_data"}']["count"], 1)
+        self.assertEqual(snapshot['retrometer_i2c_errors_total{bus="1"}'], 1)
+
+    def test_retro_meter_metrics(self):
+        # Given a retro meter with metrics
+        magnetometer = MagicMock()
+        magnetometer.read_magnetometer.return_value = (1.0, 2.0, 3.0)
+        meter = RetroMeter(magnetometer, "x", 20, 20, 8000, 20, metrics=self.registry, name="water")
+
+        # When it processes samples
+        for timestamp in range(5):
+            meter.update_and_get_meter_ticks(float(timestamp))
+
+        # We expect the detector cost and state per meter
+        snapshot = self.registry.get_snapshot()
+        self.assertEqual(snapshot['retrometer_detector_seconds{meter="water"}']["count"], 5)
+        self.assertEqual(snapshot['retrometer_count{meter="water"}'], 0)
+        self.assertEqual(snapshot['retrometer_calibration_progress_percent{meter="water"}'], 0)
+
+    def test_multi_retro_meter_metrics(self):
+        # Given a multi retro meter with metrics
+        magnetometers = [MagicMock(), MagicMock()]
+        for magnetometer in magnetometers:
+            magnetometer.read_magnetometer.return_value = (1.0, 2.0, 3.0)
+        meter = MultiRetroMeter(magnetometers, ["x", "y"], 20, 20, 8000, 20, metrics=self.registry,
+                                names=["gas", "water"])
+
+        # When it processes samples
+        for timestamp in range(5):
+            meter.update_and_get_meter_ticks(float(timestamp))
+
+        # We expect the cost of the shared detector step and the state per meter
+        snapshot = self.registry.get_snapshot()
+        self.assertEqual(snapshot['retrometer_detector_seconds{meter="all"}']["count"], 5)
+        self.assertEqual(snapshot['retrometer_count{meter="water"}'], 0)
+        self.assertEqual(snapshot['retrometer_calibration_progress_percent{meter="gas"}'], 0)
+
+    def test_diagnostics_publisher(self):
+        # Given a diagnostics publisher with an interval of one minute
+        client = MagicMock()
+        clock = FakeClock()
+        self.registry.counter("test_events_total", "Events").inc()
+        publisher = DiagnosticsPublisher(client, "meter/diagnostics", self.registry, interval=60.0, clock=clock)
+
+        # When it is polled before and after the interval
+        publisher.poll()
+        clock.now = 60.0
+        publisher.poll()
+
+        # We expect one publish of the snapshot
+        client.publish.assert_called_once()
+        topic, payload = client.publish.call_args.args
+        self.assertEqual(topic, "meter/diagnostics")
+        self.assertEqual(json.loads(payload), {"test_events_total": 1.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
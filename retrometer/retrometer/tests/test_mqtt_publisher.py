@@ -0,0 +1,211 @@
+import unittest
+import json
+import os
+import tempfile
+import threading
+from types import SimpleNamespace
+from src.mqtt_publisher import CoalescingPublisher, MQTT_ERR_SUCCESS, MQTT_ERR_NO_CONN
+
+
+class FakeClient:
+    def __init__(self):
+        """Mqtt client stand-in that records publishes and acknowledges them on request.
+        """
+        self.published = []
+        self.rc = MQTT_ERR_SUCCESS
+        self._next_mid = 1
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        mid = self._next_mid
+        self._next_mid += 1
+        self.published.append(SimpleNamespace(
+            topic=topic, payload=json.loads(payload), qos=qos, retain=retain, mid=mid, rc=self.rc))
+        return SimpleNamespace(rc=self.rc, mid=mid)
+
+
+class AcknowledgingClient(FakeClient):
+    def __init__(self):
+        """Mqtt client stand-in that acknowledges the previous publish from its network thread while the next one is
+        published. Like paho, it holds its mutex while calling on_publish and takes it in publish().
+        """
+        super().__init__()
+        self.on_publish = None
+        self.is_deadlocked = False
+        self._mutex = threading.Lock()
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if self.published:
+            is_acknowledging = threading.Event()
+            threading.Thread(target=self._acknowledge, args=(self.published[-1].mid, is_acknowledging)).start()
+            is_acknowledging.wait()
+        # Paho would wait forever
+        if not self._mutex.acquire(timeout=1.0):
+            self.is_deadlocked = True
+            return SimpleNamespace(rc=15, mid=None)
+        try:
+            return super().publish(topic, payload, qos, retain)
+        finally:
+            self._mutex.release()
+
+    def _acknowledge(self, mid, is_acknowledging):
+        with self._mutex:
+            is_acknowledging.set()
+            self.on_publish(self, None, mid)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCoalescingPublisher(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.queue_path = os.path.join(self.temp_dir.name, "queue.json")
+        self.client = FakeClient()
+        self.clock = FakeClock()
+        self.publisher = self.helper_create_publisher()
+        return super().setUp()
+
+    def helper_create_publisher(self):
+        return CoalescingPublisher(self.client, "meter/gas_volume", coalesce_interval=1.0, queue_path=self.queue_path,
+                                   max_queue_length=3, persist_interval=0.0, clock=self.clock)
+
+    def helper_acknowledge_all(self):
+        for message in self.client.published:
+            self.publisher.on_publish(self.client, None, message.mid)
+
+    def test_coalesces_updates(self):
+        # When ten updates arrive within one coalesce interval
+        for count in range(10):
+            self.publisher.update({"count": count})
+            self.clock.now += 0.05
+
+        # We expect the first update to be published immediately and the others to wait for the interval
+        self.assertEqual([message.payload["count"] for message in self.client.published], [0])
+
+        # When the interval passed
+        self.clock.now = 1.0
+        self.publisher.poll()
+
+        # We expect only the latest update to be published, retained and with qos 1
+        self.assertEqual([message.payload["count"] for message in self.client.published], [0, 9])
+        self.assertTrue(all(message.retain and message.qos == 1 for message in self.client.published))
+
+    def test_unacknowledged_updates_survive_restart(self):
+        # Given a broker that does not acknowledge the publishes
+        for count in range(2):
+            self.publisher.update({"count": count})
+            self.clock.now += 1.0
+
+        # When the publisher is restarted
+        self.client = FakeClient()
+        self.publisher = self.helper_create_publisher()
+        self.publisher.poll()
+
+        # We expect the unacknowledged updates to be published again in order
+        self.assertEqual([message.payload["count"] for message in self.client.published], [0, 1])
+
+        # When they are acknowledged
+        self.helper_acknowledge_all()
+        self.publisher.poll()
+
+        # We expect an empty queue and no queue file
+        self.assertEqual(self.publisher.get_queue_length(), 0)
+        self.assertFalse(os.path.exists(self.queue_path))
+
+    def test_acknowledged_updates_not_persisted(self):
+        # Given a publisher that persists the queue at most every 10 seconds
+        self.publisher = CoalescingPublisher(self.client, "meter/gas_volume", coalesce_interval=1.0,
+                                             queue_path=self.queue_path, persist_interval=10.0, clock=self.clock)
+
+        # When a connected broker acknowledges every update within a second for a minute
+        for count in range(60):
+            self.publisher.update({"count": count})
+            # We expect the queue file to never be written
+            self.assertFalse(os.path.exists(self.queue_path))
+            self.clock.now += 0.5
+            self.helper_acknowledge_all()
+            self.clock.now += 0.5
+
+        # When the broker stops acknowledging for longer than the persist interval
+        self.client.rc = MQTT_ERR_NO_CONN
+        for count in range(60, 72):
+            self.publisher.update({"count": count})
+            self.clock.now += 1.0
+
+        # We expect the unacknowledged updates to be persisted
+        with open(self.queue_path) as file:
+            self.assertEqual(len(json.load(file)["payloads"]), 11)
+
+        # When they are acknowledged after reconnecting
+        self.helper_acknowledge_all()
+        self.clock.now += 10.0
+        self.publisher.poll()
+
+        # We expect the queue file to be removed
+        self.assertFalse(os.path.exists(self.queue_path))
+
+    def test_failed_publish_retried(self):
+        # Given a client that fails to publish
+        self.client.rc = 15  # MQTT_ERR_QUEUE_SIZE
+        self.publisher.update({"count": 1})
+
+        # When the client works again
+        self.client.rc = MQTT_ERR_SUCCESS
+        self.publisher.poll()
+
+        # We expect the update to be published again
+        self.assertEqual([message.payload["count"] for message in self.client.published], [1, 1])
+
+    def test_disconnected_publish_not_duplicated(self):
+        # Given a disconnected client that queues the message itself
+        self.client.rc = MQTT_ERR_NO_CONN
+        self.publisher.update({"count": 1})
+
+        # When polled again
+        self.publisher.poll()
+
+        # We expect no duplicate publish while the message is pending
+        self.assertEqual(len(self.client.published), 1)
+        self.assertEqual(self.publisher.get_queue_length(), 1)
+
+    def test_bounded_queue(self):
+        # When more updates than the queue length are not acknowledged
+        for count in range(5):
+            self.publisher.update({"count": count})
+            self.clock.now += 1.0
+
+        # We expect the oldest updates to be dropped
+        self.assertEqual(self.publisher.get_queue_length(), 3)
+        self.assertEqual(self.publisher.get_dropped_count(), 2)
+        with open(self.queue_path) as file:
+            self.assertEqual([json.loads(payload)["count"] for payload in json.load(file)["payloads"]], [2, 3, 4])
+
+    def test_acknowledged_while_publishing(self):
+        # Given a client that acknowledges an update from its network thread while the next update is published
+        self.client = AcknowledgingClient()
+        self.publisher = self.helper_create_publisher()
+        self.client.on_publish = self.publisher.on_publish
+
+        # When two updates are published
+        self.publisher.update({"count": 1})
+        self.clock.now += 1.0
+        self.publisher.update({"count": 2})
+
+        # We expect the network thread to not wait for the sampling loop
+        self.assertFalse(self.client.is_deadlocked)
+        self.assertEqual([message.payload["count"] for message in self.client.published], [1, 2])
+
+        # When polled again
+        self.publisher.poll()
+
+        # We expect only the second update to wait for its acknowledgement
+        self.assertEqual(self.publisher.get_queue_length(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
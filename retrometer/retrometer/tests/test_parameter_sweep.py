@@ -0,0 +1,73 @@
+import unittest
+import io
+import math
+import os
+import tempfile
+import numpy as np
+from src.parameter_sweep import create_grid, create_random, run_sweep, write_table
+from src.sample_recorder import SampleRecorder, list_recordings
+
+
+class TestParameterSweep(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.sample_time = 0.05
+        return super().setUp()
+
+    def helper_record_trace(self, name, amplitude, period, duration):
+        """Record a noisy sine on the x axis and return its recording files and the number of ticks.
+        """
+        directory = os.path.join(self.temp_dir.name, name)
+        recorder = SampleRecorder(directory, self.sample_time, {"sensor": "MMC5983MA", "mag_axis": "x"})
+        np.random.seed(0)
+        timestamps = np.arange(0.0, duration, self.sample_time)
+        values = amplitude * np.sin(2.0 * np.pi * timestamps / period) + np.random.normal(0.0, 5.0, len(timestamps))
+        for timestamp, value in zip(timestamps, values):
+            recorder.record(timestamp, value, 0.0, 0.0)
+        recorder.close()
+        return list_recordings(directory), int(duration // period)
+
+    def test_sweep_ranks_by_count_error(self):
+        # Given two traces with known ticks
+        trace_specs = [self.helper_record_trace("slow", 300.0, 4.0, 200.0),
+                       self.helper_record_trace("fast", 150.0, 1.0, 100.0)]
+
+        # When a grid with a minimum amplitude above the smaller sine is searched in two processes
+        candidates = create_grid({"max_period_time": [4.0, 5.0], "min_amplitude": [20.0, 200.0], "min_std": [20.0],
+                                  "activation_threshold_ratio": [0.8, 0.6], "deactivation_threshold_ratio": [0.7]})
+        results = run_sweep(candidates, trace_specs, max_workers=2)
+
+        # We expect the invalid ratio combination to be skipped and the parameters with the shortest calibration that
+        # count both traces to rank first. Only the ticks during the calibration are missed.
+        self.assertEqual(len(results), 4)
+        self.assertEqual((results[0]["max_period_time"], results[0]["min_amplitude"]), (4.0, 20.0))
+        self.assertEqual(results[0]["count_error"], 50)
+        self.assertAlmostEqual(results[0]["time_to_first_count"], 40.3, delta=1.0)
+        self.assertEqual((results[1]["max_period_time"], results[1]["min_amplitude"]), (5.0, 20.0))
+        self.assertEqual([result["time_to_first_count"] for result in results[2:]], [math.inf, math.inf])
+
+        # We expect a table with the add-on option names
+        table = io.StringIO()
+        write_table(results, table)
+        lines = table.getvalue().splitlines()
+        self.assertEqual(lines[0], "rank,maxperiodtime,minamplitude,minstd,activationratio,deactivationratio,"
+                                   "count_error,max_count_error,time_to_first_count")
+        self.assertTrue(lines[1].startswith("1,4,20,20,0.8,0.7,50,40,"))
+
+    def test_random_candidates(self):
+        # Given ranges of the hysteresis ratios that overlap
+
+        # When random parameter sets are drawn
+        candidates = create_random({"activation_threshold_ratio": [0.6, 0.9],
+                                    "deactivation_threshold_ratio": [0.5, 0.7]}, 100, seed=1)
+
+        # We expect valid parameter sets within the ranges
+        self.assertEqual(len(candidates), 100)
+        for candidate in candidates:
+            self.assertGreater(candidate["activation_threshold_ratio"], candidate["deactivation_threshold_ratio"])
+            self.assertTrue(0.6 <= candidate["activation_threshold_ratio"] <= 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import os
+import tempfile
+import time
+import json
+import struct
+from src.sample_recorder import SampleRecorder, open_recording, list_recordings
+from src.retro_meter import RetroMeter
+from src.tick_detector import ScalarPeriodCounter
+import numpy as np
+
+
+class TestSampleRecorder(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.sample_time = 0.05
+        self.sensor_config = {"sensor": "MMC5983MA", "mag_axis": "y", "max_period_time": 1.0,
+                              "min_amplitude": 20, "max_amplitude": 8000, "min_std": 20}
+        # Room for the header and 1000 samples per file
+        sample_size = np.dtype(SampleRecorder.sample_dtype).itemsize
+        self.recorder = SampleRecorder(self.temp_dir.name, self.sample_time, self.sensor_config,
+                                       max_file_size=SampleRecorder.header_length + 1000*sample_size)
+
+        # A sine on the y axis with a period of 1s
+        self.timestamps = 1700000000.0 + np.arange(2500)*self.sample_time
+        self.y_values = 300.0*np.sin(2.0*np.pi*self.timestamps)
+        return super().setUp()
+
+    def helper_record(self):
+        for timestamp, y in zip(self.timestamps, self.y_values):
+            self.recorder.record(timestamp, 10.0, y, -5.0)
+        self.recorder.close()
+
+    def test_record_and_open(self):
+        # Given a recorder that recorded more samples than fit into one file
+        self.helper_record()
+
+        # When the recordings are opened
+        paths = list_recordings(self.temp_dir.name)
+        recordings = [open_recording(path) for path in paths]
+
+        # We expect the samples to be rotated over three files with the sensor config in each header
+        self.assertEqual(len(paths), 3)
+        for sample_time, sensor_config, samples in recordings:
+            self.assertEqual(sample_time, self.sample_time)
+            self.assertEqual(sensor_config, self.sensor_config)
+
+        # We expect all samples in the recorded order
+        samples = np.concatenate([samples for _, _, samples in recordings])
+        np.testing.assert_array_equal(samples["timestamp"], self.timestamps)
+        np.testing.assert_allclose(samples["y"], self.y_values, atol=1e-3)
+        np.testing.assert_array_equal(samples["x"], 10.0)
+        np.testing.assert_array_equal(samples["z"], -5.0)
+
+    def test_header_start_times(self):
+        # Given a recorder that recorded samples
+        unix_time, timestamp = time.time(), time.monotonic()
+        self.helper_record()
+
+        # When the header of the first recording is read
+        path = list_recordings(self.temp_dir.name)[0]
+        _, _, _, start_unix_time, start_timestamp = SampleRecorder.read_header(path)
+
+        # We expect the wall clock and monotonic time of the file start to relate the timestamps to the unix time
+        self.assertAlmostEqual(start_unix_time, unix_time, delta=1.0)
+        self.assertAlmostEqual(start_timestamp, timestamp, delta=1.0)
+
+    def test_open_version_1_recording(self):
+        # Given a recording in the version 1 format without the start times
+        header_format = SampleRecorder.header_formats[1]
+        config = json.dumps(self.sensor_config).encode("utf-8")
+        header = struct.pack(header_format, SampleRecorder.file_magic, 1, SampleRecorder.header_length,
+                             self.sample_time) + config
+        samples = np.zeros(3, dtype=SampleRecorder.sample_dtype)
+        samples["timestamp"] = self.timestamps[:3]
+        path = os.path.join(self.temp_dir.name, "version_1" + SampleRecorder.file_extension)
+        with open(path, "wb") as file:
+            file.write(header.ljust(SampleRecorder.header_length, b"\0") + samples.tobytes())
+
+        # When it is opened
+        sample_time, sensor_config, opened_samples = open_recording(path)
+        start_times = SampleRecorder.read_header(path)[3:]
+
+        # We expect the config and samples, and no start times
+        self.assertEqual(sample_time, self.sample_time)
+        self.assertEqual(sensor_config, self.sensor_config)
+        np.testing.assert_array_equal(opened_samples["timestamp"], self.timestamps[:3])
+        self.assertEqual(start_times, (0.0, 0.0))
+
+    def test_max_file_count(self):
+        # Given a recorder that keeps at most two files
+        self.recorder = SampleRecorder(self.temp_dir.name, self.sample_time, self.sensor_config,
+                                       max_file_size=SampleRecorder.header_length + 1000*20, max_file_count=2)
+
+        # When it records samples for three files
+        self.helper_record()
+
+        # We expect the oldest file to be deleted
+        self.assertEqual(len(list_recordings(self.temp_dir.name)), 2)
+
+    def test_partial_sample_ignored(self):
+        # Given a recording with a partially written last sample
+        self.helper_record()
+        path = list_recordings(self.temp_dir.name)[-1]
+        with open(path, "ab") as file:
+            file.write(b"\x01\x02\x03")
+
+        # When it is opened
+        _, _, samples = open_recording(path)
+
+        # We expect only the complete samples
+        self.assertEqual(len(samples), 500)
+
+    def test_replay_matches_live_counting(self):
+        # Given a recording of the samples
+        self.helper_record()
+
+        # When the recordings are replayed through a retro meter
+        meter = RetroMeter(None, "y", 20, 20, 8000, 20)
+        for path in list_recordings(self.temp_dir.name):
+            _, _, samples = open_recording(path)
+            counts = meter.replay_samples(samples)
+
+        # We expect the same count as recording the values sample by sample
+        counter = ScalarPeriodCounter(20, 20, 8000, 20)
+        for value in self.y_values.astype(np.float32):
+            counter.record_scalar(value)
+        self.assertGreater(counter.get_count(), 0)
+        self.assertEqual(counts[-1], counter.get_count())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+from src.sampling_scheduler import SamplingScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        """Clock that only advances when sleeping or when work is simulated.
+        """
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, duration):
+        assert duration >= 0.0
+        self.now += duration
+
+
+class TestSamplingScheduler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.sample_time = 0.05
+        self.scheduler = SamplingScheduler(
+            self.sample_time, clock=self.clock, sleep=self.clock.sleep)
+        return super().setUp()
+
+    def test_fixed_rate_despite_work(self):
+        # Given a loop that works 20ms after each sample
+        timestamps = []
+        for sample in range(100):
+            timestamps.append(self.scheduler.wait_for_next_sample(lambda: True))
+            self.clock.now += 0.02
+
+        # We expect samples exactly on the deadlines instead of every 70ms
+        for index, timestamp in enumerate(timestamps):
+            self.assertAlmostEqual(timestamp, 100.0 + index*self.sample_time)
+        statistics = self.scheduler.get_statistics()
+        self.assertEqual(statistics["samples"], 100)
+        self.assertEqual(statistics["overruns"], 0)
+        self.assertEqual(statistics["missed_samples"], 0)
+
+    def test_overrun_skips_missed_deadlines(self):
+        # Given a first sample
+        self.scheduler.wait_for_next_sample(lambda: True)
+
+        # When the work after it takes 2.5 sample times
+        self.clock.now += 2.5*self.sample_time
+        timestamp = self.scheduler.wait_for_next_sample(lambda: True)
+
+        # We expect the overrun and the deadlines that passed completely to be reported
+        statistics = self.scheduler.get_statistics()
+        self.assertEqual(statistics["overruns"], 1)
+        self.assertEqual(statistics["missed_samples"], 1)
+        self.assertAlmostEqual(statistics["max_lateness"], 1.5*self.sample_time)
+        self.assertAlmostEqual(timestamp, 100.0 + 2.5*self.sample_time)
+
+        # We expect the following sample to be on the original deadline grid again
+        timestamp = self.scheduler.wait_for_next_sample(lambda: True)
+        self.assertAlmostEqual(timestamp, 100.0 + 3*self.sample_time)
+
+    def test_set_sample_time(self):
+        # Given a scheduler that sampled at a slow rate
+        self.scheduler.set_sample_time(0.25)
+        self.scheduler.wait_for_next_sample(lambda: True)
+
+        # When the sample time is shortened right after a sample
+        self.scheduler.set_sample_time(self.sample_time)
+        timestamp = self.scheduler.wait_for_next_sample(lambda: True)
+
+        # We expect the next sample one new sample time after the last one instead of one old sample time
+        self.assertAlmostEqual(timestamp, 100.0 + self.sample_time)
+
+    def test_adapts_to_data_ready_phase(self):
+        # Given a sensor that gets ready 10ms after each of our deadlines
+        def is_data_ready():
+            return (self.clock.now - 100.0) % self.sample_time >= 0.01 - 1e-9
+
+        # When we sample for a while
+        for sample in range(20):
+            self.scheduler.wait_for_next_sample(is_data_ready)
+
+        # We expect only the first sample to wait for the data ready flag
+        statistics = self.scheduler.get_statistics()
+        self.assertEqual(statistics["samples"], 20)
+        self.assertEqual(statistics["data_not_ready"], 1)
+        self.assertEqual(statistics["missed_samples"], 0)
+
+    def test_missed_sample_without_data(self):
+        # Given a sensor that never gets ready
+        # When we wait for a sample
+        timestamp = self.scheduler.wait_for_next_sample(lambda: False)
+
+        # We expect the sample to be missed after waiting at most half a sample time
+        self.assertIsNone(timestamp)
+        self.assertEqual(self.scheduler.get_statistics()["missed_samples"], 1)
+        self.assertLessEqual(self.clock.now - 100.0, 0.5*self.sample_time + 1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
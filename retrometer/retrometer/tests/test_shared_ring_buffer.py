@@ -0,0 +1,97 @@
+import unittest
+import multiprocessing
+from multiprocessing import shared_memory
+from src.shared_ring_buffer import SharedRingBuffer, _HEADER_SIZE, _SLOT_SIZE
+
+
+def helper_produce(name, record_count):
+    # Runs in a producer process that puts consecutive records as fast as possible
+    ring_buffer = SharedRingBuffer(name=name)
+    index = 0
+    while index < record_count:
+        if ring_buffer.put(float(index), float(index), 1.0, 2.0):
+            index += 1
+    ring_buffer.close()
+
+
+class TestSharedRingBuffer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.ring_buffer = SharedRingBuffer(4)
+        self.addCleanup(self.ring_buffer.close)
+        return super().setUp()
+
+    def test_put_and_get_batch(self):
+        # Given a consumer that attached to the ring buffer by name
+        consumer = SharedRingBuffer(name=self.ring_buffer.get_name())
+        self.addCleanup(consumer.close)
+
+        # When more records are put than fit
+        is_put = [self.ring_buffer.put(float(index), 1.0, 2.0, 3.0) for index in range(6)]
+
+        # We expect the records that did not fit to be dropped and counted
+        self.assertEqual(is_put, [True, True, True, True, False, False])
+        self.assertEqual(consumer.get_overflow_count(), 2)
+        self.assertEqual(consumer.get_pending_count(), 4)
+
+        # We expect batches in the order of the records, also across the end of the buffer
+        self.assertEqual([record[0] for record in consumer.get_batch(3)], [0.0, 1.0, 2.0])
+        self.assertTrue(self.ring_buffer.put(6.0, 1.0, 2.0, 3.0))
+        self.assertEqual(consumer.get_batch(), [(3.0, 1.0, 2.0, 3.0), (6.0, 1.0, 2.0, 3.0)])
+        self.assertEqual(consumer.get_pending_count(), 0)
+
+    def test_record_not_visible_yet(self):
+        # Given a raw view of the slots, to emulate writes that other cores do not see yet
+        raw_memory = shared_memory.SharedMemory(name=self.ring_buffer.get_name())
+        self.addCleanup(raw_memory.close)
+
+        def get_slot(index):
+            return bytes(raw_memory.buf[_HEADER_SIZE + index * _SLOT_SIZE:_HEADER_SIZE + (index + 1) * _SLOT_SIZE])
+
+        def set_slot(index, slot):
+            raw_memory.buf[_HEADER_SIZE + index * _SLOT_SIZE:_HEADER_SIZE + (index + 1) * _SLOT_SIZE] = slot
+
+        # When the write index is visible, but one byte of the second record is not
+        for index in range(3):
+            self.ring_buffer.put(float(index), 1.0, 2.0, 3.0)
+        second_slot = get_slot(1)
+        set_slot(1, second_slot[:20] + bytes([second_slot[20] ^ 0xff]) + second_slot[21:])
+
+        # We expect the records to be read up to the incomplete one, and the rest once it is visible
+        self.assertEqual([record[0] for record in self.ring_buffer.get_batch()], [0.0])
+        self.assertEqual(self.ring_buffer.get_pending_count(), 2)
+        set_slot(1, second_slot)
+        self.assertEqual([record[0] for record in self.ring_buffer.get_batch()], [1.0, 2.0])
+
+        # When a slot is written again, but it still shows the record of the previous round
+        first_slot = get_slot(0)
+        for index in range(3, 5):
+            self.ring_buffer.put(float(index), 1.0, 2.0, 3.0)
+        new_first_slot = get_slot(0)
+        set_slot(0, first_slot)
+
+        # We expect the old record to not be read again
+        self.assertEqual([record[0] for record in self.ring_buffer.get_batch()], [3.0])
+        set_slot(0, new_first_slot)
+        self.assertEqual([record[0] for record in self.ring_buffer.get_batch()], [4.0])
+
+    def test_producer_process(self):
+        # Given a producer process that puts more records than the buffer holds and retries when it is full
+        ring_buffer = SharedRingBuffer(64)
+        self.addCleanup(ring_buffer.close)
+        record_count = 5000
+        producer = multiprocessing.get_context("spawn").Process(
+            target=helper_produce, args=(ring_buffer.get_name(), record_count))
+        producer.start()
+
+        # When the records are drained in batches
+        records = []
+        while len(records) < record_count and (producer.is_alive() or ring_buffer.get_pending_count() > 0):
+            records.extend(ring_buffer.get_batch(16))
+        producer.join()
+
+        # We expect every record exactly once and in order
+        self.assertEqual([record[1] for record in records], [float(index) for index in range(record_count)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import collections
+from src.sliding_window import SlidingWindowStatistics, NumpyWindowStatistics, IndexableSkiplist
+import numpy as np
+
+
+class TestSlidingWindowStatistics(unittest.TestCase):
+    def setUp(self) -> None:
+        self.window_length = 200
+        self.window = SlidingWindowStatistics(self.window_length)
+        self.random = np.random.default_rng(42)
+        return super().setUp()
+
+    def test_skiplist_sorted_access(self):
+        # Given a skiplist filled with random values including duplicates
+        skiplist = IndexableSkiplist(50)
+        values = list(self.random.integers(0, 10, 50).astype(float))
+        for value in values:
+            skiplist.insert(value)
+
+        # When some of the values are removed again
+        for value in values[:20]:
+            skiplist.remove(value)
+
+        # We expect the remaining values to be accessible in sorted order
+        expected = sorted(values[20:])
+        self.assertEqual(len(skiplist), len(expected))
+        self.assertEqual([skiplist[rank] for rank in range(len(skiplist))], expected)
+
+    def test_matches_numpy(self):
+        # Given a sine with noise and outliers that is much longer than the window
+        values = 300.0 * np.sin(np.linspace(0, 40*np.pi, 3000))
+        values = self.random.normal(values, 10.0)
+        values[[5, 400, 1234, 2500]] *= 100.0
+
+        # When the values are appended one by one
+        reference_window = collections.deque(maxlen=self.window_length)
+        for value in values:
+            self.window.append(value)
+            reference_window.append(value)
+
+            # We expect the same statistics as numpy computes on the whole window
+            self.assertAlmostEqual(self.window.percentile(5),
+                                   np.percentile(reference_window, 5), delta=1e-6)
+            self.assertAlmostEqual(self.window.percentile(95),
+                                   np.percentile(reference_window, 95), delta=1e-6)
+            self.assertAlmostEqual(self.window.mean(),
+                                   np.mean(reference_window), delta=1e-6)
+            self.assertAlmostEqual(self.window.std(),
+                                   np.std(reference_window), delta=1e-6)
+
+    def test_numpy_window_matches(self):
+        # Given a numpy window of the same length
+        numpy_window = NumpyWindowStatistics(self.window_length)
+        values = self.random.normal(0.0, 100.0, 1000)
+
+        # When both windows get the same values
+        self.window.extend(values[:10])
+        numpy_window.extend(values[:10])
+        for value in values[10:]:
+            self.window.append(value)
+            numpy_window.append(value)
+
+        # We expect the same values in the same order and the same statistics
+        self.assertEqual(list(numpy_window), list(self.window))
+        for percentage in [5, 50, 95]:
+            self.assertAlmostEqual(numpy_window.percentile(percentage), self.window.percentile(percentage), delta=1e-6)
+        self.assertAlmostEqual(numpy_window.std(), self.window.std(), delta=1e-6)
+
+    def test_is_full(self):
+        # Given an empty window
+        self.assertFalse(self.window.is_full())
+
+        # When it got exactly as many values as its length
+        for value in range(self.window_length):
+            self.window.append(float(value))
+
+        # We expect it to be full and to keep its length when more values arrive
+        self.assertTrue(self.window.is_full())
+        self.window.append(1.0)
+        self.assertEqual(len(self.window), self.window_length)
+
+
+if __name__ == '__main__':
+    unittest.main()
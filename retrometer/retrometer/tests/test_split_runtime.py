@@ -0,0 +1,140 @@
+import unittest
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from src.checkpoint import Checkpointer
+from src.fake_smbus import FakeMMC5983MABus, create_sine_waveform
+from src.magnetometer import MMC5983MA
+from src.mqtt_publisher import CoalescingPublisher, MQTT_ERR_SUCCESS
+from src.split_runtime import SplitProcessRuntime
+from src.volume_reporter import VolumeReporter
+
+
+class FakeMagnetometer:
+    def __init__(self):
+        """Magnetometer stand-in that always has a new measurement, x counts the measurements.
+        """
+        self._measurement_count = 0
+
+    def is_new_meas_available(self):
+        return True
+
+    def read_magnetometer(self):
+        self._measurement_count += 1
+        return (float(self._measurement_count), 0.0, 0.0)
+
+
+def create_unreliable_magnetometer():
+    """Create an emulated sensor where a fifth of the transactions fail after the setup, in the acquisition process.
+    """
+    bus = FakeMMC5983MABus(create_sine_waveform(300.0, 0.5), seed=1)
+    magnetometer = MMC5983MA(bus, measurement_frequency=100)
+    bus.set_error_rate(0.2)
+    return magnetometer
+
+
+class FakeClient:
+    def __init__(self):
+        self.payloads = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.payloads.append(payload)
+        return SimpleNamespace(rc=MQTT_ERR_SUCCESS, mid=len(self.payloads))
+
+
+class SlowFakeMeter:
+    def __init__(self, slow_sample_interval, slow_sample_time):
+        """Meter stand-in that counts one tick every ten samples and stalls on every slow_sample_interval-th sample,
+        like a garbage collection pause.
+        """
+        self.samples = []
+        self._slow_sample_interval = slow_sample_interval
+        self._slow_sample_time = slow_sample_time
+
+    def process_sample(self, sample, timestamp=None):
+        self.samples.append(sample)
+        if len(self.samples) % self._slow_sample_interval == 0:
+            time.sleep(self._slow_sample_time)
+        return len(self.samples) // 10
+
+    def get_readings(self):
+        return [{"count": len(self.samples) // 10}]
+
+    def get_state(self, timestamp=None):
+        return {"count": len(self.samples) // 10}
+
+
+class TestSplitProcessRuntime(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.sample_time = 0.002
+        # Stalls of 25 sample times every 100 samples
+        self.meter = SlowFakeMeter(100, 25 * self.sample_time)
+        self.client = FakeClient()
+        self.checkpointer = Checkpointer(os.path.join(self.temp_dir.name, "checkpoint.json"), {}, min_interval=0.0)
+        self.runtime = SplitProcessRuntime(self.meter, VolumeReporter([CoalescingPublisher(self.client, "meter/gas_volume",
+                                                                                           coalesce_interval=0.0)],
+                                                                      [0.01]),
+                                           FakeMagnetometer, self.sample_time, checkpointer=self.checkpointer)
+        return super().setUp()
+
+    def test_stalls_do_not_drop_samples(self):
+        # Given a meter that stalls regularly for longer than a sample time
+
+        # When the runtime runs for one second
+        threading.Timer(1.0, self.runtime.stop).start()
+        self.runtime.run()
+
+        # We expect every acquired sample to be counted in order, the backlog after stalls drained in batches
+        statistics = self.runtime.get_statistics()
+        self.assertEqual([sample[0] for sample in self.meter.samples],
+                         [float(index + 1) for index in range(len(self.meter.samples))])
+        self.assertEqual(statistics["overflows"], 0)
+        self.assertGreater(statistics["samples"], 0.3 / self.sample_time)
+        self.assertEqual(statistics["samples"], len(self.meter.samples))
+        self.assertGreater(statistics["max_batch_fill"], 10)
+        self.assertLess(statistics["batches"], statistics["samples"])
+        self.assertGreater(statistics["max_lag"], 20 * self.sample_time)
+
+        # We expect the final count to be published and stored in the checkpoint
+        final_count = len(self.meter.samples) // 10
+        self.assertIn('"count": {}'.format(final_count), self.client.payloads[-1])
+        state, _ = self.checkpointer.load()
+        self.assertEqual(state, {"count": final_count})
+
+    def test_ring_buffer_overflow_counted(self):
+        # Given a ring buffer that can not hold the samples of a stall
+        self.runtime = SplitProcessRuntime(self.meter, VolumeReporter([CoalescingPublisher(self.client, "meter/gas_volume")],
+                                                                      [0.01]),
+                                           FakeMagnetometer, self.sample_time, capacity=8)
+
+        # When the runtime runs
+        threading.Timer(1.0, self.runtime.stop).start()
+        self.runtime.run()
+
+        # We expect the dropped samples to be counted and to be missing from the counted samples
+        statistics = self.runtime.get_statistics()
+        self.assertGreater(statistics["overflows"], 0)
+        self.assertGreater(self.meter.samples[-1][0], len(self.meter.samples))
+
+    def test_skips_failed_i2c_transactions(self):
+        # Given an emulated sensor where a fifth of the transactions fail
+        self.runtime = SplitProcessRuntime(self.meter, VolumeReporter([CoalescingPublisher(self.client, "meter/gas_volume")],
+                                                                      [0.01]),
+                                           create_unreliable_magnetometer, 0.01)
+
+        # When the runtime runs for one second
+        threading.Timer(1.0, self.runtime.stop).start()
+        self.runtime.run()
+
+        # We expect the failed transactions to be counted without stopping the acquisition process
+        statistics = self.runtime.get_statistics()
+        self.assertGreater(statistics["i2c_errors"], 0)
+        self.assertGreater(statistics["samples"], 0.5 / 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
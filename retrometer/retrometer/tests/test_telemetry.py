@@ -0,0 +1,62 @@
+import unittest
+import logging
+from src.telemetry import Telemetry
+from src.tick_detector import ScalarPeriodCounter
+import numpy as np
+
+
+class TestTelemetry(unittest.TestCase):
+    def setUp(self) -> None:
+        self.logger = logging.getLogger("test_telemetry")
+        self.telemetry = Telemetry(
+            sample_buffer_length=5, summary_interval=10.0, logger=self.logger)
+        return super().setUp()
+
+    def test_logs_count_changes_and_summaries_only(self):
+        # When 100 samples at 20Hz with two count changes are recorded
+        with self.assertLogs(self.logger, level=logging.DEBUG) as logs:
+            for index in range(100):
+                self.telemetry.record_sample(
+                    index*0.05, 0 if index < 50 else 1, 1.0, 2.0, 3.0)
+
+        # We expect one message per count change and no summary before the summary interval passed
+        self.assertEqual(logs.output, ["DEBUG:test_telemetry:Count: 0", "DEBUG:test_telemetry:Count: 1"])
+
+        # When the summary interval passed
+        with self.assertLogs(self.logger, level=logging.INFO) as logs:
+            self.telemetry.record_sample(10.0, 1, 1.0, 2.0, 3.0)
+
+        # We expect a summary
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("101 samples", logs.output[0])
+
+    def test_ring_buffer_dump(self):
+        # When more samples than the buffer length are recorded
+        for index in range(8):
+            self.telemetry.record_sample(float(index), 0, 1.0, 2.0, 3.0)
+
+        # We expect only the most recent samples to be kept and dumped
+        self.assertEqual([sample[0] for sample in self.telemetry.get_recent_samples()],
+                         [3.0, 4.0, 5.0, 6.0, 7.0])
+        with self.assertLogs(self.logger, level=logging.INFO) as logs:
+            self.telemetry.dump()
+        self.assertEqual(len(logs.output), 6)
+
+    def test_calibration_progress_logged_on_change(self):
+        # Given a scalar period counter
+        counter = ScalarPeriodCounter(20, 20, 8000, 20, calibration_duration=100.0)
+
+        # When it records a sine for 50s
+        times = np.arange(0.0, 50.0, 0.05)
+        with self.assertLogs("src.tick_detector", level=logging.INFO) as logs:
+            for timestamp in times:
+                counter.record_scalar(
+                    300.0*np.sin(2.0*np.pi*timestamp), timestamp)
+
+        # We expect the calibration progress only to be logged when it changes
+        self.assertLess(len(logs.output), 60)
+        self.assertIn("Calibration progress: 1 %", logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
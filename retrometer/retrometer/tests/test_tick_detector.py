@@ -8,14 +8,14 @@ class TestScalarPeriodCounter(unittest.TestCase):
     def setUp(self) -> None:
         sample_time = 0.05
         max_period_time = 5.0  # seconds
-        max_period_length = int(max_period_time/sample_time)
-        min_amplitude = 20
-        max_amplitude = 8000
-        min_std = 20
+        self.max_period_length = int(max_period_time/sample_time)
+        self.min_amplitude = 20
+        self.max_amplitude = 8000
+        self.min_std = 20
 
         # Setup counter
         self.counter = ScalarPeriodCounter(
-            max_period_length, min_amplitude, max_amplitude, min_std)
+            self.max_period_length, self.min_amplitude, self.max_amplitude, self.min_std)
 
         return super().setUp()
 
@@ -45,10 +45,10 @@ class TestScalarPeriodCounter(unittest.TestCase):
         # We expect a count of 2 because it only starts counting when its buffer is full and that has been configured to 10 times the max period
         self.assertEqual(self.counter.get_count(), 2)
 
-    def test_sines_with_noise_and_outliers(self):
-        # Given a scalar period counter configured with the above parameters
-
-        # When it gets excited with a sine, then nothing+a bit of noise and then a sine again
+    def helper_generate_sines_with_noise_and_outliers(self):
+        """Creates a sine, then nothing+a bit of noise, then a sine again and a slower sine with outliers and noise.
+        The expected count is 12 + 12 + 10 = 34.
+        """
         times0, values0 = self.helper_generate_sine(
             amplitude=5, period=.2, end_time=200.0, sample_time=0.05)
         times1, values1 = self.helper_generate_sine(
@@ -76,6 +76,14 @@ class TestScalarPeriodCounter(unittest.TestCase):
         # Add a bit of noise
         values = np.random.normal(values, 10.0)
 
+        return times, values
+
+    def test_sines_with_noise_and_outliers(self):
+        # Given a scalar period counter configured with the above parameters
+
+        # When it gets excited with a sine, then nothing+a bit of noise and then a sine again
+        times, values = self.helper_generate_sines_with_noise_and_outliers()
+
         counts = []
         calib_min = []
         calib_max = []
@@ -100,6 +108,147 @@ class TestScalarPeriodCounter(unittest.TestCase):
         # We expect a count of 12 + 12 + 10 = 34
         self.assertEqual(self.counter.get_count(), 34)
 
+    def test_record_batch_matches_record_scalar(self):
+        # Given a second scalar period counter configured like the first one
+        batch_counter = ScalarPeriodCounter(
+            self.max_period_length, self.min_amplitude, self.max_amplitude, self.min_std)
+
+        # When the first one records the scalars one by one and the second one in batches of different sizes,
+        # followed by single scalars again
+        np.random.seed(0)
+        times, values = self.helper_generate_sines_with_noise_and_outliers()
+        counts = []
+        for value in values:
+            self.counter.record_scalar(value)
+            counts.append(self.counter.get_count())
+
+        batch_counts = []
+        batch_ends = [7, 150, 3000, 3001, 9000, len(values) - 500]
+        batch_start = 0
+        for batch_end in batch_ends:
+            batch_counts.extend(batch_counter.record_batch(
+                values[batch_start:batch_end]))
+            batch_start = batch_end
+        for value in values[batch_start:]:
+            batch_counter.record_scalar(value)
+            batch_counts.append(batch_counter.get_count())
+
+        # We expect the same count after each scalar
+        np.testing.assert_array_equal(batch_counts, counts)
+        self.assertEqual(batch_counter.get_count(), 34)
+
+        # We expect the same calibration state
+        self.assertAlmostEqual(batch_counter._calibrator._current_min,
+                               self.counter._calibrator._current_min, delta=1e-6)
+        self.assertAlmostEqual(batch_counter._calibrator._current_max,
+                               self.counter._calibrator._current_max, delta=1e-6)
+
+    def test_record_batch_with_timestamps(self):
+        # Given two scalar period counters that confirm their calibration after 400s
+        counter = ScalarPeriodCounter(self.max_period_length, self.min_amplitude, self.max_amplitude, self.min_std,
+                                      calibration_duration=400.0)
+        batch_counter = ScalarPeriodCounter(self.max_period_length, self.min_amplitude, self.max_amplitude,
+                                            self.min_std, calibration_duration=400.0)
+
+        # When the first one records the timestamped scalars one by one and the second one in two batches
+        np.random.seed(0)
+        times, values = self.helper_generate_sines_with_noise_and_outliers()
+        counts = []
+        for timestamp, value in zip(times, values):
+            counter.record_scalar(value, timestamp)
+            counts.append(counter.get_count())
+        batch_counts = np.concatenate([batch_counter.record_batch(values[:5000], times[:5000]),
+                                       batch_counter.record_batch(values[5000:], times[5000:])])
+
+        # We expect the same count after each scalar and a confirmed calibration
+        np.testing.assert_array_equal(batch_counts, counts)
+        self.assertEqual(batch_counter._calibration_progress_percentage, 100)
+
+    def test_backends_identical_counts(self):
+        # Given one scalar period counter per detector backend
+        counters = {backend: ScalarPeriodCounter(self.max_period_length, self.min_amplitude, self.max_amplitude,
+                                                 self.min_std, backend=backend) for backend in ["python", "numpy"]}
+
+        # When both record the sine and the sines with noise and outliers
+        np.random.seed(0)
+        _, sine_values = self.helper_generate_sine(amplitude=300, period=5.0, end_time=60.0, sample_time=0.05)
+        _, noisy_values = self.helper_generate_sines_with_noise_and_outliers()
+        counts = {backend: [] for backend in counters}
+        for value in np.concatenate((sine_values, noisy_values)):
+            for backend, counter in counters.items():
+                counter.record_scalar(value)
+                counts[backend].append(counter.get_count())
+
+        # We expect the same count after each scalar
+        self.assertEqual(counts["python"], counts["numpy"])
+        self.assertGreater(counts["python"][-1], 34)
+
+    def test_fractional_count_and_flow_rate(self):
+        # Given a noisy sine with a period of 4 s
+        np.random.seed(0)
+        period = 4.0
+        times, values = self.helper_generate_sine(amplitude=300, period=period, end_time=300.0, sample_time=0.05)
+        values += np.random.normal(0.0, 10.0, len(values))
+
+        # When it is recorded
+        counts = []
+        fractional_counts = []
+        for timestamp, value in zip(times, values):
+            self.counter.record_scalar(value, timestamp)
+            counts.append(self.counter.get_count())
+            fractional_counts.append(self.counter.get_fractional_count())
+
+        # We expect a monotonic fractional count between the count and the next count
+        counts = np.array(counts)
+        fractional_counts = np.array(fractional_counts)
+        self.assertTrue(np.all(np.diff(fractional_counts) >= 0.0))
+        self.assertTrue(np.all(fractional_counts >= counts))
+        self.assertTrue(np.all(fractional_counts < counts + 1))
+        self.assertGreater(counts[-1], 60)
+
+        # We expect the fraction to follow the phase and the flow rate to match the sine
+        counted = counts > 0
+        phases = (times[counted] - times[counted][0]) / period
+        deviations = (fractional_counts[counted] - counts[counted][0]) - phases
+        self.assertLess(np.max(np.abs(deviations - np.median(deviations))), 0.15)
+        self.assertAlmostEqual(self.counter.get_flow_rate(), 1.0 / period, delta=0.02)
+
+    def test_adaptive_calibration_counts_earlier(self):
+        # Given a noisy sine with a period of 2.5 s
+        np.random.seed(0)
+        times, values = self.helper_generate_sine(amplitude=300, period=2.5, end_time=60.0, sample_time=0.05)
+        values += np.random.normal(0.0, 10.0, len(values))
+
+        # When it is counted with the window and the adaptive calibration
+        first_count_times = {}
+        counts = {}
+        for calibration_mode in ["window", "adaptive"]:
+            counter = ScalarPeriodCounter(self.max_period_length, self.min_amplitude, self.max_amplitude, self.min_std,
+                                          calibration_mode=calibration_mode)
+            mode_counts = counter.record_batch(values, times)
+            first_count_times[calibration_mode] = times[np.argmax(mode_counts > 0)]
+            counts[calibration_mode] = mode_counts[-1]
+
+        # We expect the window calibration to wait for ten max periods and the adaptive calibration for a few periods
+        self.assertGreaterEqual(first_count_times["window"], 50.0)
+        self.assertLess(first_count_times["adaptive"], 10.0)
+        # and the adaptive calibration to count every period after its first count
+        self.assertAlmostEqual(counts["adaptive"], (60.0 - first_count_times["adaptive"]) / 2.5 + 1, delta=1)
+
+    def test_adaptive_calibration_ignores_noise(self):
+        # Given a scalar period counter with the adaptive calibration
+        counter = ScalarPeriodCounter(self.max_period_length, self.min_amplitude, self.max_amplitude, self.min_std,
+                                      calibration_mode="adaptive")
+
+        # When it gets excited with a sine, then nothing+a bit of noise and then a sine again
+        times, values = self.helper_generate_sines_with_noise_and_outliers()
+        for timestamp, value in zip(times, values):
+            counter.record_scalar(value, timestamp)
+
+        # We expect the periods of the sines except the first periods that are needed for the calibration
+        self.assertGreaterEqual(counter.get_count(), 30)
+        self.assertLessEqual(counter.get_count(), 34)
+
     def test_calibration_confirmation_considered(self):
         # Given a scalar period counter with a magic mock as a calibrator that returns that calibration is not yet confirmed
         self.counter._calibrator = MagicMock()
@@ -0,0 +1,133 @@
+import unittest
+from src.tick_detector import ScalarPeriodCounter
+from src.sliding_window import SlidingWindowStatistics
+from src.tick_detector_array import ScalarPeriodCounterArray, SlidingWindowStatisticsArray
+from src.multi_retro_meter import MultiRetroMeter
+from src.i2c_multiplexer import TCA9548A
+from unittest.mock import MagicMock
+import numpy as np
+
+
+class TestSlidingWindowStatisticsArray(unittest.TestCase):
+    def test_matches_sliding_window_statistics(self):
+        # Given one array of windows and one scalar window per column, with repeated values
+        np.random.seed(0)
+        values = np.round(np.random.normal(0.0, 100.0, (500, 4)))
+        window_array = SlidingWindowStatisticsArray(4, 50)
+        windows = [SlidingWindowStatistics(50) for column in range(4)]
+
+        for row in values:
+            # When a value is appended to every window
+            window_array.append(row)
+            for window, value in zip(windows, row):
+                window.append(value)
+
+            # We expect the same percentiles and standard deviations, while filling and while evicting
+            for percentage in [0, 5, 50, 95, 100]:
+                np.testing.assert_array_equal(window_array.percentile(percentage),
+                                              [window.percentile(percentage) for window in windows])
+            np.testing.assert_array_equal(window_array.std(), [window.std() for window in windows])
+
+
+class TestScalarPeriodCounterArray(unittest.TestCase):
+    def setUp(self) -> None:
+        self.max_period_length = 20
+        self.min_amplitude = 20
+        self.max_amplitude = 8000
+        self.min_std = 20
+
+        # Three meters sampled at 20Hz: a fast sine with outliers, a slow sine with noise and an idle meter
+        np.random.seed(0)
+        self.times = np.arange(0.0, 120.0, 0.05)
+        fast_sine = 300.0*np.sin(2.0*np.pi*self.times/0.8)
+        fast_sine[[100, 900, 1500]] *= 50.0
+        slow_sine = np.random.normal(
+            100.0 + 250.0*np.sin(2.0*np.pi*self.times/1.0), 10.0)
+        idle = np.random.normal(-50.0, 2.0, len(self.times))
+        self.values = np.stack([fast_sine, slow_sine, idle], axis=1)
+        return super().setUp()
+
+    def test_matches_scalar_period_counters(self):
+        for calibration_mode in ["window", "adaptive"]:
+            with self.subTest(calibration_mode=calibration_mode):
+                # Given one array counter for all meters and one scalar counter per meter with a short calibration
+                # duration
+                array_counter = ScalarPeriodCounterArray(3, self.max_period_length, self.min_amplitude,
+                                                         self.max_amplitude, self.min_std, calibration_duration=60.0,
+                                                         calibration_mode=calibration_mode)
+                scalar_counters = [ScalarPeriodCounter(self.max_period_length, self.min_amplitude, self.max_amplitude,
+                                                       self.min_std, calibration_duration=60.0,
+                                                       calibration_mode=calibration_mode) for meter in range(3)]
+
+                # When all samples are recorded
+                for timestamp, scalars in zip(self.times, self.values):
+                    array_counter.record_scalars(scalars, timestamp)
+                    for counter, scalar in zip(scalar_counters, scalars):
+                        counter.record_scalar(scalar, timestamp)
+
+                    # We expect the same counts, calibration progress, fractional counts and flow rates after every
+                    # sample
+                    np.testing.assert_array_equal(array_counter.get_counts(),
+                                                  [counter.get_count() for counter in scalar_counters])
+                    np.testing.assert_array_equal(array_counter.get_calibration_progress_percentages(),
+                                                  [counter.get_calibration_progress_percentage()
+                                                   for counter in scalar_counters])
+                    np.testing.assert_allclose(array_counter.get_fractional_counts(),
+                                               [counter.get_fractional_count() for counter in scalar_counters],
+                                               rtol=0, atol=1e-9)
+                    np.testing.assert_allclose(array_counter.get_flow_rates(),
+                                               [counter.get_flow_rate() for counter in scalar_counters],
+                                               rtol=0, atol=1e-9)
+
+                # We expect counts for the moving meters only and the same states
+                self.assertGreater(array_counter.get_counts()[0], 0)
+                self.assertGreater(array_counter.get_counts()[1], 0)
+                self.assertEqual(array_counter.get_counts()[2], 0)
+                self.assertGreater(array_counter.get_flow_rates()[1], 0.0)
+                for index, counter in enumerate(scalar_counters):
+                    self.assertEqual(array_counter.get_state(index, self.times[-1]),
+                                     counter.get_state(self.times[-1]))
+
+    def test_restore_state(self):
+        # Given a state of a calibrated scalar counter
+        counter = ScalarPeriodCounter(self.max_period_length, self.min_amplitude, self.max_amplitude, self.min_std)
+        for timestamp, scalar in zip(self.times, self.values[:, 0]):
+            counter.record_scalar(scalar, timestamp)
+        state = counter.get_state(self.times[-1])
+
+        # When it is restored for the second meter of an array counter
+        array_counter = ScalarPeriodCounterArray(3, self.max_period_length, self.min_amplitude, self.max_amplitude,
+                                                 self.min_std)
+        array_counter.restore_state(1, state, self.times[-1])
+
+        # We expect the same state for that meter only
+        self.assertEqual(array_counter.get_state(1, self.times[-1]), state)
+        self.assertEqual(array_counter.get_counts()[0], 0)
+
+
+class TestMultiRetroMeter(unittest.TestCase):
+    def test_multiplexed_magnetometers(self):
+        # Given two magnetometers behind one multiplexer and a multi retro meter counting on different axes
+        bus = MagicMock()
+        bus.read_byte_data.return_value = 100
+        multiplexer = TCA9548A(bus)
+        channel_buses = [multiplexer.get_channel_bus(0), multiplexer.get_channel_bus(3)]
+        magnetometers = [MagicMock(), MagicMock()]
+        magnetometers[0].read_magnetometer.side_effect = lambda: (
+            channel_buses[0].read_byte_data(0x30, 0), 0.0, 0.0)
+        magnetometers[1].read_magnetometer.side_effect = lambda: (
+            0.0, 0.0, channel_buses[1].read_byte_data(0x30, 0))
+        meter = MultiRetroMeter(magnetometers, ["x", "z"], 20, 20, 8000, 20)
+
+        # When it is updated twice
+        meter.update_and_get_meter_ticks(0.0)
+        counts = meter.update_and_get_meter_ticks(0.05)
+
+        # We expect one count per meter and the multiplexer to switch the channel before each sensor read
+        self.assertEqual(counts, [0, 0])
+        self.assertEqual([call.args for call in bus.write_byte.call_args_list],
+                         [(0x70, 0b00000001), (0x70, 0b00001000)] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
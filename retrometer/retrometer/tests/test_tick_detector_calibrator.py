@@ -1,7 +1,8 @@
 import unittest
 from src.tick_detector import MinMaxCalibrator
 import numpy as np
-import time
+from types import SimpleNamespace
+from unittest import mock
 
 
 class TestMinMaxCalibrator(unittest.TestCase):
@@ -31,46 +32,83 @@ class TestMinMaxCalibrator(unittest.TestCase):
         return time_vec, np.multiply(amplitude, np.sin(np.multiply(2.0*np.pi/period, time_vec)))
 
     def test_sine_min_max(self):
+        # Given min max calibrator configured with the above parameters and a clock that only advances when we say so
+        clock = SimpleNamespace(now=0.0)
+        with mock.patch("time.monotonic", lambda: clock.now):
+
+            # When it gets excited with a sine wave like this
+            times, values = self.helper_generate_sine(
+                amplitude=300, period=5.0, end_time=60.0, sample_time=0.05)
+
+            # We expect progress to be 0% before excitation starts
+            self.assertEqual(
+                self.calibrator.get_calibration_progress_percentage(), 0)
+
+            for value in values:
+                self.calibrator.input(value)
+
+            # We expect progress at more than 1% just after sufficient excitation was available
+            clock.now = 0.2
+            self.assertGreater(
+                self.calibrator.get_calibration_progress_percentage(), 1)
+
+            # We expect the min max values to be correctly estimated
+            estimated_min_value = np.percentile(values, 5)
+            estimated_max_value = np.percentile(values, 95)
+            self.assertAlmostEqual(self.calibrator.get_expected_min_max()[0],
+                                   estimated_min_value, delta=2)
+            self.assertAlmostEqual(self.calibrator.get_expected_min_max()[1],
+                                   estimated_max_value, delta=2)
+
+            # We expect around 50 percent progress after 5 seconds since we configured 10s calibration confirmation time
+            for timepoint in range(1, 6):
+                clock.now = timepoint + 0.2
+                self.calibrator.input(30.0)
+            self.assertGreater(
+                self.calibrator.get_calibration_progress_percentage(), 50)
+
+            # We expect 100% progress after 11s, which is 1s beyond calibration confirmation time
+            for timepoint in range(6, 12):
+                clock.now = timepoint + 0.2
+                self.calibrator.input(30.0)
+            self.assertEqual(
+                self.calibrator.get_calibration_progress_percentage(), 100)
+
+    def test_sample_timestamps(self):
         # Given min max calibrator configured with the above parameters
 
-        # When it gets excited with a sine wave like this
+        # When it gets excited with a sine wave with timestamps of the samples
         times, values = self.helper_generate_sine(
             amplitude=300, period=5.0, end_time=60.0, sample_time=0.05)
-
-        # We expect progress to be 0% before excitation starts
-        self.assertEqual(
-            self.calibrator.get_calibration_progress_percentage(), 0)
-
-        for value in values:
-            self.calibrator.input(value)
-
-        # We expect progress at more than 1% just after sufficient excitation was available
-        self.assertGreater(
-            self.calibrator.get_calibration_progress_percentage(), 1)
-
-        # We expect the min max values to be correctly estimated
-        estimated_min_value = np.percentile(values, 5)
-        estimated_max_value = np.percentile(values, 95)
-        self.assertAlmostEqual(self.calibrator.get_expected_min_max()[0],
-                               estimated_min_value, delta=2)
-        self.assertAlmostEqual(self.calibrator.get_expected_min_max()[1],
-                               estimated_max_value, delta=2)
-
-        # We expect around 50 percent progress after 5 seconds since we configured 10s calibration confirmation time
-        for timepoint in range(0, 5):
-            self.calibrator.input(30.0)
-            print(self.calibrator.get_calibration_progress_percentage())
-            time.sleep(1)
-        self.assertGreater(
-            self.calibrator.get_calibration_progress_percentage(), 50)
-
-        # We expect 100% progress after 11s, which is 1s beyond calibration confirmation time
-        for timepoint in range(0, 6):
-            self.calibrator.input(30.0)
-            print(self.calibrator.get_calibration_progress_percentage())
-            time.sleep(1)
-        self.assertEqual(
-            self.calibrator.get_calibration_progress_percentage(), 100)
+        for timestamp, value in zip(times, values):
+            self.calibrator.input(value, timestamp)
+
+        # We expect the calibration confirmation to start with the timestamp of the first sufficiently excited sample
+        self.assertEqual(self.calibrator.get_calibration_progress_percentage(
+            times[9] + 5.0), 50)
+        self.assertEqual(self.calibrator.get_calibration_progress_percentage(
+            times[9] + 10.0), 100)
+
+    def test_adaptive_calibration_confirmed_when_stable(self):
+        # Given min max calibrators with the adaptive calibration and a long calibration confirmation
+        calibrator = MinMaxCalibrator(1000, 20, 8000, 20, calibration_confirm_duration=3600.0,
+                                      calibration_mode="adaptive")
+
+        # When it gets excited with a noisy sine wave
+        np.random.seed(0)
+        times, values = self.helper_generate_sine(
+            amplitude=300, period=2.0, end_time=60.0, sample_time=0.05)
+        values += np.random.normal(0.0, 10.0, len(values))
+        for timestamp, value in zip(times, values):
+            calibrator.input(value, timestamp)
+
+        # We expect the calibration to be confirmed long before the confirmation duration, with the peaks as min and max
+        self.assertEqual(calibrator.get_calibration_progress_percentage(times[-1]), 100)
+        current_min, current_max = calibrator.get_expected_min_max()
+        self.assertAlmostEqual(current_min, -300.0, delta=20.0)
+        self.assertAlmostEqual(current_max, 300.0, delta=20.0)
+        # and the confirmed calibration to be stored like one confirmed after the duration
+        self.assertEqual(calibrator.get_state(times[-1])["calibration_confirm_elapsed"], 3600.0)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,128 @@
+import unittest
+import json
+import os
+import tempfile
+import urllib.error
+import urllib.request
+import numpy as np
+from src.tick_store import TickStore, TickStoreServer
+
+
+class TestTickStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, "ticks.bin")
+        self.store = TickStore(self.path)
+        self.addCleanup(self.store.close)
+        return super().setUp()
+
+    def test_range_and_bucket_queries(self):
+        # Given a year of random ticks
+        np.random.seed(0)
+        timestamps = np.sort(np.random.uniform(0.0, 365 * 86400.0, 100000))
+        for timestamp in timestamps:
+            self.store.append(float(timestamp))
+
+        # When ranges and daily buckets are queried
+        tick_count = self.store.get_tick_count(10 * 86400.0, 40.5 * 86400.0)
+        bucket_counts = self.store.get_bucket_counts(0.0, 365 * 86400.0, 86400.0)
+
+        # We expect the same counts as a full scan, in 8 bytes per tick
+        self.assertEqual(tick_count, np.count_nonzero((timestamps >= 10 * 86400.0) & (timestamps < 40.5 * 86400.0)))
+        np.testing.assert_array_equal(bucket_counts, np.histogram(timestamps, bins=365, range=(0.0, 365 * 86400.0))[0])
+        self.assertEqual(self.store.get_tick_count(), len(timestamps))
+        self.assertEqual(os.path.getsize(self.path), 8 * len(timestamps))
+
+    def test_inverted_range(self):
+        # Given a store with ticks
+        for timestamp in [100.0, 200.0, 300.0]:
+            self.store.append(timestamp)
+
+        # When a range is queried with the start after the end
+        tick_count = self.store.get_tick_count(250.0, 50.0)
+
+        # We expect no ticks instead of a negative count
+        self.assertEqual(tick_count, 0)
+
+    def test_invalid_bucket_queries(self):
+        # Given a store with a tick
+        self.store.append(1.0)
+
+        # When buckets are queried over an infinite range, with too many or with non-finite buckets
+        # We expect the queries to be rejected without computing the buckets
+        for start, end, bucket_time in [(0.0, float("inf"), 3600.0), (float("-inf"), 1.0, 3600.0),
+                                        (0.0, 1.0, float("nan")), (0.0, 86400.0, 1e-320), (-1e308, 1e308, 1.0),
+                                        (0.0, 86400.0, 1.0)]:
+            with self.assertRaises(ValueError):
+                self.store.get_bucket_counts(start, end, bucket_time)
+
+    def test_record_count(self):
+        # Given a store that is synchronized to a count restored from a checkpoint
+        self.store.record_count(100, 1.0)
+
+        # When the count increases, also by several ticks at once, and the clock goes back
+        self.store.record_count(101, 2.0)
+        self.store.record_count(101, 3.0)
+        self.store.record_count(103, 4.0)
+        self.store.record_count(104, 3.5)
+
+        # We expect one sorted timestamp per tick
+        self.assertEqual(self.store.get_tick_count(), 4)
+        self.assertEqual(self.store.get_bucket_counts(0.0, 5.0, 1.0), [0, 0, 1, 0, 3])
+
+    def test_reopen_drops_partial_tick(self):
+        # Given a store that was killed while writing a tick
+        self.store.append(1.0)
+        self.store.append(2.0)
+        self.store.close()
+        with open(self.path, "ab") as file:
+            file.write(b"\x00\x01\x02")
+
+        # When it is opened again and more ticks are appended
+        with self.assertLogs("src.tick_store", "WARNING"):
+            store = TickStore(self.path)
+        self.addCleanup(store.close)
+        store.append(3.0)
+
+        # We expect the complete ticks to be kept
+        self.assertEqual(store.get_bucket_counts(0.0, 4.0, 1.0), [0, 1, 1, 1])
+
+    def test_server(self):
+        # Given a server for a store with ticks in two hours
+        for timestamp in [100.0, 200.0, 3700.0]:
+            self.store.append(timestamp)
+        server = TickStoreServer({"gas": (self.store, 0.01)}, 0)
+        server.start()
+        self.addCleanup(server.stop)
+
+        # When the volume per hour is queried
+        url = "http://127.0.0.1:{}/buckets?start=0&end=7200&bucket=3600".format(server.get_port())
+        with urllib.request.urlopen(url, timeout=5.0) as response:
+            result = json.loads(response.read())
+
+        # We expect the ticks and volumes per hour
+        self.assertEqual(result["ticks"], [2, 1])
+        self.assertEqual(result["volumes"], [0.02, 0.01])
+
+        # When buckets are queried until an infinite end
+        url = "http://127.0.0.1:{}/buckets?end=inf".format(server.get_port())
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen(url, timeout=5.0)
+        context.exception.close()
+
+        # We expect a bad request
+        self.assertEqual(context.exception.code, 400)
+
+        # When ticks are queried with the start after the end
+        url = "http://127.0.0.1:{}/ticks?start=3600&end=0".format(server.get_port())
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen(url, timeout=5.0)
+        context.exception.close()
+
+        # We expect a bad request
+        self.assertEqual(context.exception.code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import MagicMock
+from src.volume_reporter import VolumeReporter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestVolumeReporter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.publisher = MagicMock()
+        self.clock = FakeClock()
+        self.reporter = VolumeReporter([self.publisher], [0.01], fractional_interval=10.0, clock=self.clock)
+        return super().setUp()
+
+    def helper_update(self, time, count, fractional_count, flow_rate):
+        self.clock.now = time
+        self.reporter.update([{"count": count, "fractional_count": fractional_count, "flow_rate": flow_rate}])
+
+    def helper_get_payloads(self):
+        return [call.args[0] for call in self.publisher.update.call_args_list]
+
+    def test_fractional_updates_throttled(self):
+        # Given a reporter with a fractional interval of 10 s
+
+        # When the fractional count changes every second and the count changes once
+        for time in range(26):
+            fractional_count = 10.0 + time / 15.0
+            self.helper_update(float(time), int(fractional_count), fractional_count, 1.0 / 15.0)
+
+        # We expect the first reading, one throttled fractional update, the count change immediately and the next
+        # throttled fractional update
+        payloads = self.helper_get_payloads()
+        self.assertEqual([payload["count"] for payload in payloads], [10, 10, 11, 11])
+        self.assertEqual(payloads[0], {"volume": 0.1, "count": 10, "volume_fractional": 0.1, "flow_rate": 2.4})
+        self.assertAlmostEqual(payloads[1]["volume_fractional"], 0.1 + 0.01 * 10 / 15.0, places=6)
+        self.assertEqual(payloads[2]["volume_fractional"], 0.11)
+
+    def test_idle_meter_stops_updates(self):
+        # Given a reporter that reported a reading
+
+        # When the reading does not change any more
+        for time in range(0, 100, 5):
+            self.helper_update(float(time), 10, 10.5, 0.0)
+
+        # We expect a single update
+        self.publisher.update.assert_called_once()
+
+    def test_count_only_readings(self):
+        # Given readings without a fractional count, like the ones of several meters
+
+        # When the count changes
+        for time, count in enumerate([1, 1, 2, 2]):
+            self.clock.now = time * 100.0
+            self.reporter.update([{"count": count}])
+
+        # We expect one update per count without fractional volume
+        self.assertEqual(self.helper_get_payloads(), [{"volume": 0.01, "count": 1}, {"volume": 0.02, "count": 2}])
+
+
+if __name__ == '__main__':
+    unittest.main()
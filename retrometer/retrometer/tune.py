@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+import os
+import sys
+from src.parameter_sweep import create_grid, create_random, run_sweep, write_table
+from src.sample_recorder import list_recordings
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Searches the tick detector parameters that count recorded traces best. Each parameter takes a list '
+        'of values for a grid search, or the range of its values for a random search. The results are ranked by the '
+        'count error and then by the time to the first count.')
+    parser.add_argument(
+        '--trace', nargs='+', action='append', required=True, metavar=('TICKS', 'RECORDING'),
+        help='number of ticks the meter advanced during the trace, followed by its recording files or directories')
+    parser.add_argument('--axis', choices=['x', 'y', 'z'],
+                        help='magnetometer axis to count on, defaults to the axis in the recordings')
+    parser.add_argument('--maxperiodtime', type=float, nargs='+', default=[1.0],
+                        help='maximum period time of one tick in seconds')
+    parser.add_argument('--minamplitude', type=float, nargs='+', default=[20.0])
+    parser.add_argument('--minstd', type=float, nargs='+', default=[50.0])
+    parser.add_argument('--activationratio', type=float, nargs='+', default=[0.8],
+                        help='part of the calibrated range at which a tick is counted')
+    parser.add_argument('--deactivationratio', type=float, nargs='+', default=[0.7],
+                        help='part of the calibrated range below which the next tick can start')
+    parser.add_argument('--random', type=int,
+                        help='number of random parameter sets instead of the full grid')
+    parser.add_argument('--seed', type=int, help='seed of the random search')
+    parser.add_argument('--workers', type=int, help='number of processes, defaults to the number of cores')
+    parser.add_argument('--output', help='csv file to write the ranked results to, defaults to stdout')
+    args = parser.parse_args()
+
+    trace_specs = []
+    for trace in args.trace:
+        if len(trace) < 2:
+            parser.error("--trace needs the number of ticks and at least one recording")
+        paths = []
+        for recording in trace[1:]:
+            if os.path.isdir(recording):
+                paths.extend(list_recordings(recording))
+            else:
+                paths.append(recording)
+        trace_specs.append((paths, int(trace[0])))
+
+    parameter_values = {"max_period_time": args.maxperiodtime, "min_amplitude": args.minamplitude,
+                        "min_std": args.minstd, "activation_threshold_ratio": args.activationratio,
+                        "deactivation_threshold_ratio": args.deactivationratio}
+    if args.random:
+        candidates = create_random(parameter_values, args.random, args.seed)
+    else:
+        candidates = create_grid(parameter_values)
+    if len(candidates) == 0:
+        parser.error("no parameter set with an activation ratio above the deactivation ratio")
+    print("Evaluating {} parameter sets on {} traces".format(len(candidates), len(trace_specs)), file=sys.stderr)
+
+    results = run_sweep(candidates, trace_specs, args.axis, args.workers)
+    if args.output:
+        with open(args.output, "w", newline="") as file:
+            write_table(results, file)
+    else:
+        write_table(results, sys.stdout)
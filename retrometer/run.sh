@@ -7,6 +7,15 @@ declare mqttuser
 declare mqttpasswd
 declare mqtttopic
 declare m3pertick
+declare recordargs
+declare meters
+declare runtime
+declare rateargs
+declare metricsargs
+declare fractionalinterval
+declare sensorargs
+declare tickargs
+declare detectorargs
 
 
 ## Get the 'mqttuser' key from the user config options.
@@ -14,5 +23,29 @@ mqttuser=$(bashio::config 'mqttuser')
 mqttpasswd=$(bashio::config 'mqttpasswd')
 mqtttopic=$(bashio::config 'mqtttopic')
 m3pertick=$(bashio::config 'm3pertick')
+recordargs=""
+if bashio::config.true 'recordsamples'; then
+    recordargs="--recorddir /data/recordings"
+fi
+runtime=$(bashio::config 'runtime')
+fractionalinterval=$(bashio::config 'fractionalinterval')
+tickargs=""
+if bashio::config.true 'tickhistory'; then
+    tickargs="--tickstore /data/ticks.bin --tickstoreport 9465 --tickstorehost 0.0.0.0"
+fi
+detectorargs="--maxperiodtime $(bashio::config 'maxperiodtime') --minamplitude $(bashio::config 'minamplitude') --minstd $(bashio::config 'minstd') --activationratio $(bashio::config 'activationratio') --deactivationratio $(bashio::config 'deactivationratio') --calibrationmode $(bashio::config 'calibrationmode')"
+sensorargs="--measurementfrequency $(bashio::config 'measurementfrequency') --bandwidth $(bashio::config 'bandwidth') --setresetinterval $(bashio::config 'setresetinterval')"
+rateargs=""
+if bashio::config.true 'adaptiverate'; then
+    rateargs="--adaptiverate"
+fi
+metricsargs=""
+if bashio::config.true 'metrics'; then
+    metricsargs="--metricsport 9464 --metricshost 0.0.0.0"
+fi
+if bashio::config.has_value 'diagnosticstopic'; then
+    metricsargs="${metricsargs} --diagnosticstopic $(bashio::config 'diagnosticstopic')"
+fi
+meters=$(jq -c '.meters // []' /data/options.json)
 
-python3 /retrometer/measure_gas.py --mqttuser ${mqttuser} --mqttpasswd ${mqttpasswd} --mqtttopic ${mqtttopic} --m3pertick ${m3pertick} -v
+python3 /retrometer/measure_gas.py --mqttuser ${mqttuser} --mqttpasswd ${mqttpasswd} --mqtttopic ${mqtttopic} --m3pertick ${m3pertick} --publishqueue /data/publish_queue.json --checkpointpath /data/checkpoint.json ${recordargs} ${rateargs} ${metricsargs} ${tickargs} ${sensorargs} ${detectorargs} --fractionalinterval ${fractionalinterval} --meters "${meters}" --runtime ${runtime}